@@ -0,0 +1,8 @@
+# diagnostats - the bits of PC Check that don't need a window
+
+from .scheduler import Scheduler, Result
+from .snapshot import Snapshot, SECTIONS
+from .engine import Collector
+from .events import EventChannel, CancelToken, Cancelled
+
+__version__ = "1.4"
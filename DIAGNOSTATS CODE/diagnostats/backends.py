@@ -0,0 +1,261 @@
+# backends.py - the OS specific bits, one class per OS
+#
+# Nearly everything goes through psutil, which already works everywhere.
+# What's left (the Windows edition, admin rights, opening a saved file)
+# lives here, so nothing else has to look at sys.platform. current() picks
+# the backend for this machine the first time it's asked; use() swaps in
+# another one for a while, e.g. a ReplayBackend for repeatable benchmarks.
+
+import os
+import platform
+import subprocess
+import sys
+from contextlib import contextmanager
+
+from .tracing import tracer
+
+
+class Backend:
+    """Whatever OS this is, doing the best it can without OS specific calls."""
+    name = 'generic'
+    psutil = None  # a stand-in for psutil (fakes.py), None for the real one
+
+    def host(self):
+        return platform.node()
+
+    def os_name(self):
+        return f"{platform.system()} {platform.release()}"
+
+    def os_version(self):
+        return platform.version()
+
+    def edition(self):
+        return None
+
+    def is_admin(self):
+        # True/False, or None if we can't tell
+        geteuid = getattr(os, 'geteuid', None)
+        return geteuid() == 0 if geteuid else None
+
+    def open_file(self, path):
+        # Hand the file to whatever the desktop opens it with
+        opener = 'open' if sys.platform == 'darwin' else 'xdg-open'
+        subprocess.Popen([opener, path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def tick(self):
+        # A scan (or a monitor refresh) is about to start
+        pass
+
+    def security(self):
+        # What the security checks ask (security.py)
+        from .security import Queries
+        return Queries()
+
+
+class WindowsBackend(Backend):
+    name = 'windows'
+
+    def edition(self):
+        # e.g. "Windows 10 Pro", from the registry
+        try:
+            import winreg
+            key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
+                                 r"SOFTWARE\Microsoft\Windows NT\CurrentVersion")
+            edition = winreg.QueryValueEx(key, "ProductName")[0]
+            winreg.CloseKey(key)
+            return edition
+        except Exception as e:
+            tracer.swallowed('winreg ProductName', e)
+            return None
+
+    def is_admin(self):
+        try:
+            import ctypes
+            return ctypes.windll.shell32.IsUserAnAdmin() != 0
+        except Exception as e:
+            tracer.swallowed('IsUserAnAdmin', e)
+            return None
+
+    def open_file(self, path):
+        os.startfile(path)
+
+    def security(self):
+        from .security import WindowsQueries
+        return WindowsQueries()
+
+
+class LinuxBackend(Backend):
+    name = 'linux'
+    OS_RELEASE = ('/etc/os-release', '/usr/lib/os-release')
+
+    def edition(self):
+        # e.g. "Ubuntu 22.04.3 LTS"
+        for path in self.OS_RELEASE:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    info = parse_os_release(f.read())
+            except OSError as e:
+                tracer.swallowed(f'read {path}', e)
+                continue
+            name = info.get('PRETTY_NAME') or " ".join(filter(None, (info.get('NAME'), info.get('VERSION'))))
+            return name or None
+        return None
+
+    def security(self):
+        from .security import LinuxQueries
+        return LinuxQueries()
+
+
+class ReplayBackend(Backend):
+    """Plays back recorded Snapshots as if this were the machine they were
+    taken on, see fakes.ReplayPsutil. Good for benchmarks that have to be
+    repeatable, with as many processes and mounts as the recording has."""
+    name = 'replay'
+
+    def __init__(self, snapshots, speed=None, loop=True):
+        from .fakes import ReplayPsutil
+        self.psutil = ReplayPsutil(snapshots, speed=speed, loop=loop)
+
+    def _sys(self):
+        return self.psutil.frame.sys
+
+    def host(self):
+        return self.psutil.frame.host or super().host()
+
+    def os_name(self):
+        return self._sys().os if self._sys() else None
+
+    def os_version(self):
+        return self._sys().version if self._sys() else None
+
+    def edition(self):
+        return self._sys().edition if self._sys() else None
+
+    def is_admin(self):
+        return None  # not recorded
+
+    def open_file(self, path):
+        pass  # nobody's watching
+
+    def tick(self):
+        self.psutil.tick()
+
+    def security(self):
+        # Whatever the recording says, as of the snapshot being shown
+        from .security import RecordedQueries
+        return RecordedQueries(lambda: (self.psutil.frame.extra or {}).get('security'))
+
+
+class FakeBackend(Backend):
+    """A made up machine of any size, see fakes.FakePsutil."""
+    name = 'fake'
+
+    def __init__(self, fake, queries=None):
+        self.psutil = fake
+        self.queries = queries  # security.FakeQueries() unless given
+
+    def host(self):
+        return 'fakehost'
+
+    def security(self):
+        from .security import FakeQueries
+        return self.queries or FakeQueries()
+
+    def is_admin(self):
+        return True
+
+    def open_file(self, path):
+        pass
+
+
+def parse_os_release(text):
+    """KEY=value lines (values maybe quoted) -> dict."""
+    out = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#') or '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+            value = value[1:-1]
+        out[key.strip()] = value
+    return out
+
+
+def for_platform(plat=None):
+    plat = plat or sys.platform
+    if plat.startswith('win'):
+        return WindowsBackend()
+    if plat.startswith('linux'):
+        return LinuxBackend()
+    return Backend()
+
+
+_current = None
+
+
+def current():
+    global _current
+    if _current is None:
+        _current = for_platform()
+    return _current
+
+
+@contextmanager
+def use(backend):
+    """Run as if on backend for a while (its fake psutil included)."""
+    global _current
+    from . import fakes
+
+    old = _current
+    _current = backend
+    try:
+        if backend.psutil is not None:
+            with fakes.installed(backend.psutil):
+                yield backend
+        else:
+            yield backend
+    finally:
+        _current = old
+
+
+def load_recording(path):
+    """Snapshots out of a recording: a .jsonl file of snapshot dicts (what
+    record() writes), or one exported scan / a list of them as .json."""
+    import json
+    from .snapshot import Snapshot
+
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            data = [json.loads(line) for line in f if line.strip()]
+        else:
+            data = json.load(f)
+    if isinstance(data, dict):
+        data = [data]
+    return [Snapshot.from_dict(d) for d in data]
+
+
+def record(path, count=10, interval=2.0, progress=None):
+    """Write count full scans, interval seconds apart, to path (jsonl) for
+    ReplayBackend. Every process goes in, not just the top few."""
+    import json
+    import time
+    from . import collectors, security
+    from .engine import Collector
+
+    # The security checks answer in the background, give them a chance first
+    security.get_security_info()
+    security.wait(60.0)
+    collector = Collector()
+    collector.jobs['procs'] = tracer.traced('procs', lambda: collectors.get_proc_info(sys.maxsize, uss=False))
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            if i:
+                time.sleep(interval)
+            collector.kept.clear()  # static sections too, each line stands alone
+            snap = collector.scan()
+            f.write(json.dumps(snap.to_dict(), separators=(',', ':'), default=str) + "\n")
+            if progress:
+                progress(i + 1, snap)
+    collector.close()
@@ -0,0 +1,285 @@
+# bench.py - how much does a scan actually cost?
+#
+# Times every collector plus the tab/report text building, against this
+# machine, fakes.FakePsutil or a recording (backends.ReplayBackend), and
+# can save the numbers as a JSON baseline to compare later versions against.
+
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from . import __version__, backends, collectors, formatting
+from .cache import cache
+from .scheduler import Result
+from .snapshot import Snapshot
+
+try:
+    import resource
+    has_resource = True
+except ImportError:  # not on Windows
+    has_resource = False
+
+# Collectors straight out of collectors.py
+COLLECTOR_CASES = ('get_sys_info', 'get_hardware_info', 'get_disk_info', 'get_disk_io',
+                   'get_proc_info', 'get_net_info')
+RENDER_CASES = ('render', 'report')
+CASES = COLLECTOR_CASES + RENDER_CASES
+
+# Launch to first frame of the window, in a fresh python each time.
+# Not in CASES since it's about the app rather than a scan (bench --startup)
+STARTUP_TARGET_MS = 200
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Child side of startup(): builds the window, draws it once, says when.
+# update_idletasks() draws without running the app's deferred after() work
+STARTUP_SCRIPT = """
+import sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, {app_dir!r})
+import diagnostic_tool as app
+t1 = time.perf_counter()
+root = None
+if app.has_tk:
+    try:
+        root = app.Tk()
+    except Exception:
+        pass  # no display, so imports are all we can time
+if root is not None:
+    app.DiagTool(root)
+    root.update_idletasks()
+print('frame' if root is not None else 'imported', (t1 - t0) * 1000, (time.perf_counter() - t0) * 1000, flush=True)
+if root is not None:
+    root.destroy()
+"""
+
+
+def percentile(sorted_vals, pct):
+    if not sorted_vals:
+        return None
+    k = (len(sorted_vals) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def peak_rss_kb():
+    # Highest RSS this whole process has had, not any one case's - the OS
+    # only keeps the one high-water mark
+    if not has_resource:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss  # macOS says bytes, Linux KB
+
+
+def measure(fn, repeat=20, warmup=2, setup=None):
+    """Time fn() repeat times, then run it once more under tracemalloc.
+
+    setup (if given) runs untimed before every call.
+    """
+    for _ in range(warmup):
+        if setup:
+            setup()
+        fn()
+
+    times = []
+    gc.collect()
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    # Allocations get their own run, tracemalloc slows everything down
+    if setup:
+        setup()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times.sort()
+    return {
+        'runs': repeat,
+        'p50_ms': percentile(times, 50) * 1000,
+        'p99_ms': percentile(times, 99) * 1000,
+        'mean_ms': sum(times) / len(times) * 1000,
+        'min_ms': times[0] * 1000,
+        'alloc_peak_kb': (peak - before) / 1024,
+        'alloc_kept_kb': (current - before) / 1024,
+    }
+
+
+def _snapshot():
+    # One full scan's worth of data for the render cases
+    results = {}
+    for name, fn in (('sys', collectors.get_sys_info), ('hw', collectors.get_hardware_info),
+                     ('disks', collectors.get_disk_info), ('diskio', collectors.get_disk_io),
+                     ('procs', collectors.get_proc_info),
+                     ('net', collectors.get_net_info)):
+        start = time.perf_counter()
+        value = fn()
+        results[name] = Result(name, value, None, time.perf_counter() - start, False)
+    return Snapshot.from_results(results)
+
+
+def render_all(snap):
+    # What the GUI builds for its tabs after a scan
+    formatting.overview_text(snap.sys, snap.hw, snap.timings)
+    formatting.hardware_text(snap.hw)
+    formatting.storage_text(snap.disks, snap.diskio)
+    formatting.procs_text(snap.procs)
+    formatting.network_text(snap.net)
+    formatting.summary_text(snap)
+
+
+def run(cases=CASES, repeat=20, fake=None, progress=None, cached=False):
+    """Run the benchmark and return a dict ready to be saved as JSON.
+
+    fake is a FakePsutil to run against, or None for the current backend
+    (this machine, or a recording under backends.use()). Collectors are
+    timed with a cold metric cache unless cached is set.
+    """
+    def setup():
+        backends.current().tick()  # a replay moves on between runs
+        if not cached:
+            cache.invalidate()
+
+    results = {}
+    with ExitStack() as stack:
+        if fake is not None:
+            stack.enter_context(backends.use(backends.FakeBackend(fake)))
+
+        snap = _snapshot() if any(c in RENDER_CASES for c in cases) else None
+
+        for case in cases:
+            if progress:
+                progress(case)
+            if case == 'startup':
+                results[case] = startup(repeat)
+                continue
+            if case in COLLECTOR_CASES:
+                fn = getattr(collectors, case)
+            elif case == 'render':
+                fn = lambda: render_all(snap)
+            elif case == 'report':
+                fn = lambda: formatting.report_text(snap)
+            else:
+                raise ValueError(f"Unknown case {case!r}")
+            results[case] = measure(fn, repeat=repeat,
+                                    setup=setup if case in COLLECTOR_CASES else None)
+        backend = backends.current().name
+
+    meta = {
+        'version': __version__,
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'taken': time.time(),
+        'repeat': repeat,
+        'fake': None,
+        'backend': backend,
+        'cached': cached,
+        # For the run as a whole, see peak_rss_kb(); per case there's alloc_peak_kb
+        'process_rss_peak_kb': peak_rss_kb(),
+    }
+    if fake is not None:
+        meta['fake'] = {'procs': len(fake._procs), 'mounts': len(fake._mounts)}
+
+    return {'meta': meta, 'results': results}
+
+
+def startup(repeat=10):
+    """Time from starting python to the window's first frame.
+
+    Each run is a new interpreter, so nothing is already imported or
+    cached. Without a display only the imports can be timed, which the
+    result says ('frame' is False).
+    """
+    script = STARTUP_SCRIPT.format(app_dir=APP_DIR)
+    times, imports = [], []
+    frame = True
+    for _ in range(repeat):
+        start = time.perf_counter()
+        child = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL, universal_newlines=True)
+        line = child.stdout.readline()
+        times.append(time.perf_counter() - start)
+        child.communicate()
+        parts = line.split()
+        if len(parts) != 3:
+            raise RuntimeError(f"startup run failed (exit code {child.returncode})")
+        frame = frame and parts[0] == 'frame'
+        imports.append(float(parts[1]))
+
+    times.sort()
+    imports.sort()
+    return {
+        'runs': repeat,
+        'p50_ms': percentile(times, 50) * 1000,
+        'p99_ms': percentile(times, 99) * 1000,
+        'mean_ms': sum(times) / len(times) * 1000,
+        'min_ms': times[0] * 1000,
+        'import_p50_ms': percentile(imports, 50),
+        'frame': frame,
+        'alloc_peak_kb': None,
+        'alloc_kept_kb': None,
+    }
+
+
+def startup_text(r, target=STARTUP_TARGET_MS):
+    what = "first frame" if r['frame'] else "app imported (no display, window not timed)"
+    verdict = "OK" if r['p50_ms'] <= target else "TOO SLOW"
+    return (f"Launch to {what}: p50 {r['p50_ms']:.1f} ms, p99 {r['p99_ms']:.1f} ms "
+            f"over {r['runs']} runs ({r['import_p50_ms']:.1f} ms of it importing)\n"
+            f"Target {target} ms: {verdict}")
+
+
+def compare(current, baseline, tolerance=0.25):
+    """Rows of (case, old p50, new p50, ratio, regressed) for cases in both runs."""
+    rows = []
+    for case, new in current['results'].items():
+        old = baseline.get('results', {}).get(case)
+        if not old:
+            continue
+        ratio = new['p50_ms'] / old['p50_ms'] if old['p50_ms'] else float('inf')
+        rows.append((case, old['p50_ms'], new['p50_ms'], ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def results_text(data):
+    lines = [f"{'case':20} {'p50 ms':>10} {'p99 ms':>10} {'alloc KB':>10}"]
+    lines.append("-" * 53)
+    for case, r in data['results'].items():
+        alloc = f"{r['alloc_peak_kb']:.1f}" if r['alloc_peak_kb'] is not None else '-'
+        lines.append(f"{case:20} {r['p50_ms']:10.3f} {r['p99_ms']:10.3f} {alloc:>10}")
+    rss = data['meta'].get('process_rss_peak_kb')
+    if rss is not None:
+        lines.append(f"\nPeak RSS of the whole run (all cases): {rss} KB")
+    return "\n".join(lines)
+
+
+def compare_text(rows, tolerance):
+    lines = [f"{'case':20} {'old p50':>10} {'new p50':>10} {'ratio':>7}"]
+    lines.append("-" * 50)
+    for case, old, new, ratio, bad in rows:
+        flag = f"  <-- slower than +{tolerance:.0%}" if bad else ""
+        lines.append(f"{case:20} {old:10.3f} {new:10.3f} {ratio:7.2f}{flag}")
+    return "\n".join(lines)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save(data, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
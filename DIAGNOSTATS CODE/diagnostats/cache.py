@@ -0,0 +1,163 @@
+# cache.py - stop asking the OS the same thing twice
+#
+# Each metric gets its own time-to-live: things that can't change while
+# we're running (Windows edition, core counts, boot time) are kept forever,
+# disk usage for a few seconds, and live counters never. The really slow
+# ones (security.py) go through get_async(), which never waits.
+
+import threading
+import time
+
+FOREVER = float('inf')
+NEVER = 0
+
+# How long each cached metric stays good, in seconds
+TTLS = {
+    'edition': FOREVER,
+    'os_version': FOREVER,
+    'boot_time': FOREVER,
+    'cpu_count': FOREVER,
+    'cpu_physical': FOREVER,
+    'mem_total': FOREVER,
+    'disks': 5.0,
+    'services': 60.0,
+    # WMI/service/update queries, seconds each - refreshed in the background
+    'security.antivirus': 3600.0,
+    'security.firewall': 600.0,
+    'security.updates': 3600.0,
+    'security.accounts': 3600.0,
+    'security.services': 300.0,
+}
+
+# A background load that failed isn't tried again for this long
+RETRY = 60.0
+
+
+class MetricCache:
+    """Per-key TTL cache with hit/miss counts.
+
+    get() calls the loader on a miss and remembers the answer for the key's
+    TTL. A TTL of NEVER still counts the miss but doesn't keep the value.
+    """
+
+    def __init__(self, ttls=None):
+        self.ttls = dict(TTLS if ttls is None else ttls)
+        self._values = {}  # key -> (value, loaded at)
+        self._hits = {}
+        self._misses = {}
+        self._loading = {}  # key -> background Thread, for get_async
+        self._failed = {}  # key -> (error, when), ditto
+        self._lock = threading.Lock()
+
+    def get(self, key, loader, ttl=None):
+        if ttl is None:
+            ttl = self.ttls.get(key, NEVER)
+        now = time.monotonic()
+
+        with self._lock:
+            hit = self._values.get(key)
+            if hit is not None and now - hit[1] < ttl:
+                self._hits[key] = self._hits.get(key, 0) + 1
+                return hit[0]
+            self._misses[key] = self._misses.get(key, 0) + 1
+
+        # Load outside the lock so a slow loader doesn't hold up other keys
+        value = loader()
+        if ttl > 0:
+            with self._lock:
+                self._values[key] = (value, time.monotonic())
+        return value
+
+    def get_async(self, key, loader, ttl=None, default=None):
+        """Like get(), but a miss never waits: the loader is started on a
+        background thread and whatever was there before (or default) comes
+        back straight away. Stale values are served until the new one is in."""
+        if ttl is None:
+            ttl = self.ttls.get(key, NEVER)
+        now = time.monotonic()
+
+        with self._lock:
+            hit = self._values.get(key)
+            if hit is not None and now - hit[1] < ttl:
+                self._hits[key] = self._hits.get(key, 0) + 1
+                return hit[0]
+            self._misses[key] = self._misses.get(key, 0) + 1
+            failed = self._failed.get(key)
+            if key not in self._loading and not (failed and now - failed[1] < RETRY):
+                t = self._loading[key] = threading.Thread(target=self._load, args=(key, loader),
+                                                          name=f"cache {key}")
+                t.daemon = True
+                t.start()
+        return hit[0] if hit is not None else default
+
+    def _load(self, key, loader):
+        # If key was invalidated while this ran, the answer is out of date
+        # before it's in, so it's dropped
+        try:
+            value, error = loader(), None
+        except Exception as e:
+            value, error = None, e
+        with self._lock:
+            if self._loading.get(key) is not threading.current_thread():
+                return
+            del self._loading[key]
+            if error is not None:
+                self._failed[key] = (error, time.monotonic())
+            else:
+                self._values[key] = (value, time.monotonic())
+                self._failed.pop(key, None)
+
+    def error(self, key):
+        """Why the last background load of key failed (None if it didn't)."""
+        with self._lock:
+            failed = self._failed.get(key)
+        return failed[0] if failed else None
+
+    def wait(self, keys, timeout=None):
+        """Block until background loads of keys are done (True) or timeout passes."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for key in keys:
+            with self._lock:
+                t = self._loading.get(key)
+            if t is not None:
+                t.join(None if deadline is None else max(0, deadline - time.monotonic()))
+                if t.is_alive():
+                    return False
+        return True
+
+    def invalidate(self, key=None):
+        """Forget key, or everything if no key is given."""
+        with self._lock:
+            if key is None:
+                self._values.clear()
+                self._failed.clear()
+                self._loading.clear()
+            else:
+                self._values.pop(key, None)
+                self._failed.pop(key, None)
+                self._loading.pop(key, None)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            keys = set(self._hits) | set(self._misses)
+            out = {}
+            for key in sorted(keys):
+                entry = self._values.get(key)
+                out[key] = {
+                    'hits': self._hits.get(key, 0),
+                    'misses': self._misses.get(key, 0),
+                    'ttl': self.ttls.get(key, NEVER),
+                    'age': now - entry[1] if entry else None,
+                    'loading': key in self._loading,
+                }
+            return out
+
+    def reset_stats(self):
+        with self._lock:
+            self._hits.clear()
+            self._misses.clear()
+
+
+# Shared by scans, quick buttons and reports
+cache = MetricCache()
@@ -0,0 +1,609 @@
+# cli.py - command line front end, e.g. python -m diagnostats scan --format json
+
+import argparse
+import json
+import sys
+import time
+from contextlib import ExitStack
+
+from . import backends, formatting, report, rules
+from .engine import Collector
+from .sampler import Sampler, GAUGES, COUNTERS
+from .snapshot import Snapshot, SECTIONS
+from .scheduler import Scheduler
+from .plugins import registry
+from .procs import SORT_KEYS, SUMMED
+from .cache import cache
+from .tracing import tracer, profile_scan
+from .history import History, DEFAULT_PATH as DEFAULT_HISTORY
+
+
+def cmd_scan(args):
+    sections = args.only.split(',') if args.only else None
+    if args.all:
+        sections = [s.name for s in registry.all() if not registry.missing(s)]
+    isolate = args.isolate.split(',') if args.isolate else ()
+    unknown = [s for s in (sections or []) + list(isolate) if s not in registry]
+    if unknown:
+        print(f"Unknown section(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    scheduler = Scheduler(timeout=args.timeout) if args.timeout else None
+    collector = Collector(scheduler=scheduler, isolate=isolate)
+    if args.no_cache:
+        cache.invalidate()
+
+    if args.profile:
+        # One scan, one thread, under cProfile + tracemalloc
+        snap, prof, summary = profile_scan(collector, sections)
+        prof.dump_stats(args.profile)
+        print(summary, file=sys.stderr)
+        print(f"Profile saved to {args.profile}", file=sys.stderr)
+        _print_snapshot(args, snap)
+    elif args.format in report.FORMATS:
+        # Streamed: each section goes out as soon as its collector is done
+        writer = _writer(args)
+        snap = collector.scan(sections, on_result=writer.on_result)
+        writer.write('timings', snap.timings, ts=snap.taken)
+        if args.output:
+            writer.close()
+    else:
+        snap = collector.scan(sections)
+        _print_snapshot(args, snap)
+
+    if args.history:
+        store = History(args.history)
+        store.add_snapshot(snap)
+        store.close()
+
+    if args.trace:
+        print(formatting.diagnostics_text(tracer.report(), cache.stats()), file=sys.stderr)
+
+    collector.close()
+    return 1 if snap.errors and len(snap.errors) == len(snap.timings) else 0
+
+
+def _print_snapshot(args, snap):
+    if args.format in report.FORMATS:
+        writer = _writer(args)
+        writer.write_snapshot(snap)
+        if args.output:
+            writer.close()
+        return
+
+    if args.format == 'json':
+        text = json.dumps(snap.to_dict(), indent=2 if args.pretty else None, default=str) + "\n"
+    else:
+        text = formatting.report_text(snap)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+
+def _writer(args):
+    # Rotating file if we got --output, stdout otherwise
+    if args.output:
+        return report.open_writer(args.output, args.format, args.max_bytes, args.backups)
+    return report.WRITERS[args.format](sys.stdout.buffer)
+
+
+def cmd_sample(args):
+    sampler = Sampler(interval=args.interval, capacity=args.capacity)
+    names = GAUGES + COUNTERS
+
+    writer = None
+    if args.output:
+        writer = report.open_writer(args.output, args.format, args.max_bytes, args.backups)
+        sampler.add_listener(writer.on_sample)
+
+    store = None
+    if args.history:
+        store = History(args.history)
+        sampler.add_listener(store.on_sample)
+
+    ruleset = None
+    if args.alerts or args.rules:
+        ruleset = rules.RuleSet(rules.load(args.rules) if args.rules else rules.DEFAULT_RULES)
+    firing = set()
+
+    if not args.quiet:
+        print("  ".join(f"{n:>14}" for n in names))
+
+    done = 0
+    try:
+        while not args.count or done < args.count:
+            sampler.sample_once()
+            if not args.quiet:
+                row = []
+                for n in names:
+                    v = sampler.latest(n)
+                    row.append(f"{v:14.1f}" if v is not None else f"{'-':>14}")
+                print("  ".join(row), flush=True)
+            if ruleset is not None:
+                firing = _report_alerts(ruleset, sampler, firing)
+            done += 1
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if writer:
+            writer.close()
+        if store:
+            store.close()
+
+    if args.quiet:
+        return 0
+
+    print()
+    for n in names:
+        st = sampler.stats(n)
+        if st['count']:
+            print(f"{n:14} min {st['min']:.1f}  max {st['max']:.1f}  mean {st['mean']:.1f}")
+    return 0
+
+
+def cmd_history(args):
+    store = History(args.db, host=args.host)
+    try:
+        if args.action == 'metrics':
+            for name in store.metrics():
+                print(name)
+        elif args.action == 'hosts':
+            for name in store.hosts():
+                print(name)
+        elif args.action == 'snapshots':
+            for snap_id, ts, errors in store.snapshots(limit=args.points):
+                when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+                print(f"{snap_id:6}  {when}" + (f"  ({errors} failed)" if errors else ""))
+        elif args.action == 'maintain':
+            print(store.maintain())
+            print(store.stats())
+        else:
+            if not args.metric:
+                print("show needs --metric (see 'history metrics')", file=sys.stderr)
+                return 2
+            span = rules.seconds(args.since)
+            end = time.time()
+            print(f"{'time':19}  {'mean':>12} {'min':>12} {'max':>12}")
+            for ts, mean, lo, hi in store.query(args.metric, end - span, end, step=span / args.points):
+                when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+                print(f"{when}  {mean:12.2f} {lo:12.2f} {hi:12.2f}")
+    finally:
+        store.close()
+    return 0
+
+
+def _load_snapshot(spec, args):
+    """A Snapshot from a command line argument:
+    now          scan right now
+    last         newest scan in the history database
+    #12          scan number 12 in the history database (see 'history snapshots')
+    host:NAME    newest scan from NAME in the history database
+    FILE         a file saved with 'scan --format json'
+    """
+    if spec == 'now':
+        return Collector().scan()
+    if spec == 'last' or spec.startswith('#') or spec.startswith('host:'):
+        store = History(args.db)
+        try:
+            if spec == 'last':
+                snap = store.latest_snapshot()
+            elif spec.startswith('#'):
+                snap = store.snapshot(int(spec[1:]))
+            else:
+                snap = store.latest_snapshot(host=spec[5:])
+        finally:
+            store.close()
+        if snap is None:
+            raise ValueError(f"no stored scan matches {spec!r}")
+        return snap
+    with open(spec, encoding='utf-8') as f:
+        return Snapshot.from_dict(json.load(f))
+
+
+def cmd_diff(args):
+    from .diff import diff
+
+    try:
+        old = _load_snapshot(args.old, args)
+        new = _load_snapshot(args.new, args)
+    except (OSError, ValueError) as e:
+        print(f"Can't load snapshot: {e}", file=sys.stderr)
+        return 2
+
+    d = diff(old, new)
+    if args.json:
+        print(json.dumps(d.to_dict(), indent=2, default=str))
+    else:
+        sys.stdout.write(formatting.diff_text(d, args.limit))
+    return 1 if d else 0
+
+
+def _report_alerts(ruleset, sampler, firing):
+    # Only mention alerts when they start and stop, not on every tick
+    alerts = rules.worst(ruleset.evaluate(rules.HistorySource(sampler.series)))
+    now = {(a.rule.name, a.subject): a for a in alerts}
+    for key in now.keys() - firing:
+        a = now[key]
+        print(f"[{a.level.upper()}] {a.text()}", file=sys.stderr, flush=True)
+    for name, subject in firing - now.keys():
+        print(f"[OK] {name} cleared on {subject}", file=sys.stderr, flush=True)
+    return set(now)
+
+
+def cmd_bench(args):
+    from . import bench, fakes
+
+    if args.startup:
+        cases = ('startup',)
+    else:
+        cases = args.only.split(',') if args.only else bench.CASES
+    unknown = [c for c in cases if c not in bench.CASES + ('startup',)]
+    if unknown:
+        print(f"Unknown case(s): {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    fake = fakes.FakePsutil(procs=args.procs, mounts=args.mounts, hung=args.hung) if args.fake else None
+    where = f"fake host ({args.procs} procs, {args.mounts} mounts, {args.hung} hung)" if fake else "this machine"
+    if args.replay:
+        where = f"recording {args.replay}"
+    print(f"Benchmarking against {where}, {args.repeat} runs each", file=sys.stderr)
+
+    data = bench.run(cases, repeat=args.repeat, fake=fake, cached=args.cached,
+                     progress=lambda c: print(f"  {c}...", file=sys.stderr))
+    print(bench.results_text(data))
+    startup = data['results'].get('startup')
+    if startup:
+        print()
+        print(bench.startup_text(startup))
+
+    if args.save:
+        bench.save(data, args.save)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        rows = bench.compare(data, bench.load(args.compare), args.tolerance)
+        print()
+        print(bench.compare_text(rows, args.tolerance))
+        if any(r[-1] for r in rows):
+            return 1
+    if startup and startup['p50_ms'] > bench.STARTUP_TARGET_MS:
+        return 1
+    return 0
+
+
+def cmd_agent(args):
+    from . import fleet
+
+    print(f"Sending a snapshot to {args.connect} every {args.interval:g}s", file=sys.stderr)
+    try:
+        fleet.run(fleet.run_agent(args.connect, args.interval, args.count or None, args.host))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_aggregate(args):
+    from . import fleet
+
+    print(f"Aggregating on {args.listen} (Ctrl+C to stop)", file=sys.stderr)
+    agg = fleet.serve(args.listen)
+    if agg.rejected:
+        print(f"Ignored {agg.rejected} malformed message(s)", file=sys.stderr)
+    return 0
+
+
+def cmd_security(args):
+    from . import security
+    from .records import plain
+
+    # The queries only run in the background, so start them and wait here
+    security.get_security_info()
+    if not security.wait(args.timeout):
+        print(f"Some checks still hadn't answered after {args.timeout:g}s", file=sys.stderr)
+    checks = security.get_security_info()
+    if args.json:
+        print(json.dumps(plain(checks), indent=2, default=str))
+    else:
+        sys.stdout.write(security.security_text(checks))
+    return 1 if any(c.status == 'problem' for c in checks) else 0
+
+
+def cmd_plugins(args):
+    specs = registry.all()
+    if args.json:
+        rows = [{'name': s.name, 'title': s.title, 'cost': s.cost, 'interval': s.interval,
+                 'requires': list(s.requires), 'platforms': list(s.platforms), 'source': s.source,
+                 'missing': registry.missing(s)} for s in specs]
+        print(json.dumps({'collectors': rows, 'errors': registry.errors}, indent=2))
+        return 0
+
+    print(f"{'Name':16} {'Cost':10} {'Every':>7}  {'Title':24} From")
+    for s in specs:
+        every = f"{s.interval:g}s" if s.interval else "-"
+        print(f"{s.name:16} {s.cost:10} {every:>7}  {s.title[:24]:24} {s.source or 'built in'}")
+        for why in registry.missing(s):
+            print(f"{'':16} not run here: {why}")
+    for where, err in registry.errors.items():
+        print(f"Couldn't load {where}: {err}", file=sys.stderr)
+    return 1 if registry.errors else 0
+
+
+def cmd_procs(args):
+    from . import collectors
+    from .records import plain
+
+    if args.by and args.sort not in SUMMED:
+        print(f"Groups can be sorted by {', '.join(SUMMED)}", file=sys.stderr)
+        return 2
+
+    # CPU% and I/O rates need two looks
+    collectors.process_table().refresh()
+    time.sleep(args.interval)
+    if args.by:
+        rows = collectors.get_proc_groups(args.n, args.by, args.sort)
+    else:
+        rows = collectors.get_proc_info(args.n, args.sort)
+
+    if args.json:
+        print(json.dumps(plain(rows), indent=2))
+    elif args.by:
+        sys.stdout.write(formatting.proc_groups_text(rows, args.by, args.sort))
+    else:
+        sys.stdout.write(formatting.procs_text(rows, args.sort))
+    return 0
+
+
+def cmd_monitor(args):
+    from . import monitor
+
+    mon = monitor.Monitor(interval=args.interval, top=args.n, sort=args.sort)
+    host = backends.current().host()
+    if args.once:
+        # Rates need two looks
+        mon.tick()
+        time.sleep(min(mon.interval, 1.0))
+        print("\n".join(monitor.monitor_lines(mon.tick(), host)))
+        return 0
+
+    try:
+        import curses  # noqa: F401 (not there on Windows without windows-curses)
+    except ImportError:
+        curses = None
+    try:
+        if curses is not None and sys.stdout.isatty():
+            monitor.run_curses(mon, host)
+        else:
+            # Plain terminal: clear and reprint
+            while True:
+                frame = mon.tick()
+                start = time.perf_counter()
+                out = "\n".join(monitor.monitor_lines(frame, host))
+                sys.stdout.write(("\033[2J\033[H" if sys.stdout.isatty() else "\n") + out + "\n")
+                sys.stdout.flush()
+                mon.frame_ms = (time.perf_counter() - start) * 1000
+                time.sleep(mon.interval)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def cmd_fleet(args):
+    from . import fleet
+
+    q = args.query.replace('-', '_')
+    params = {'hosts': {}, 'stale': {'seconds': args.seconds},
+              'disks_over': {'percent': args.percent},
+              'top_procs': {'n': args.n, 'key': args.key},
+              'snapshot': {'host': args.host}}.get(q, {})
+    try:
+        result = fleet.query(args.connect, q, **params)
+    except (OSError, ValueError) as e:
+        print(f"Query failed: {e}", file=sys.stderr)
+        return 1
+
+    if args.json or q == 'snapshot':
+        print(json.dumps(result, indent=2, default=str))
+    elif q == 'hosts':
+        for h in result:
+            print(f"{h['host']:30} last seen {h['age']:6.0f}s ago   fullest disk {h['max_disk']:.1f}%")
+    elif q == 'disks_over':
+        for d in result:
+            print(f"{d['host']:30} {d['mount']:30} {d['percent']:.1f}%")
+    elif q == 'top_procs':
+        for p in result:
+            print(f"{p['host']:24} {p['pid']:>7} {p['name'][:30]:30} {p['rss'] / 1024 ** 2:10.1f} MB")
+    else:
+        for h in result:
+            print(h)
+    return 0
+
+
+def cmd_record(args):
+    where = "this machine"
+    stack = ExitStack()
+    if args.fake:
+        from .fakes import FakePsutil
+        stack.enter_context(backends.use(backends.FakeBackend(
+            FakePsutil(procs=args.procs, mounts=args.mounts))))
+        where = f"a fake machine ({args.procs} procs, {args.mounts} mounts)"
+    print(f"Recording {args.count} scans of {where} to {args.output}", file=sys.stderr)
+
+    def progress(i, snap):
+        print(f"  {i}/{args.count}: {len(snap.procs)} processes, {len(snap.disks)} mounts", file=sys.stderr)
+
+    with stack:
+        backends.record(args.output, args.count, args.interval, progress=progress)
+    return 0
+
+
+def _replaying(args):
+    # --replay FILE: everything runs against a recording instead of this machine
+    stack = ExitStack()
+    if getattr(args, 'replay', None):
+        snaps = backends.load_recording(args.replay)
+        stack.enter_context(backends.use(backends.ReplayBackend(snaps, speed=args.speed)))
+    return stack
+
+
+def _replay_args(parser):
+    parser.add_argument('--replay', metavar='FILE',
+                        help="play back a recording (see record) instead of looking at this machine")
+    parser.add_argument('--speed', type=float,
+                        help="replay at this many times the recorded pace (default: next snapshot every scan)")
+
+
+def _rotation_args(parser):
+    parser.add_argument('--max-bytes', type=int, default=report.DEFAULT_MAX_BYTES,
+                        help="roll the output file over at this size")
+    parser.add_argument('--backups', type=int, default=report.DEFAULT_BACKUPS,
+                        help="rolled over files to keep")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='diagnostats', description="PC Check without the window")
+    sub = parser.add_subparsers(dest='command')
+
+    scan = sub.add_parser('scan', help="run a full scan and print it")
+    scan.add_argument('--format', choices=['json', 'text'] + list(report.FORMATS), default='text',
+                      help="jsonl/csv/bin stream each section as soon as it's ready")
+    scan.add_argument('--output', '-o', help="write here instead of stdout (jsonl/csv/bin append and rotate)")
+    scan.add_argument('--only', help="comma separated sections (" + ",".join(SECTIONS) +
+                                     " or any plugin, see the plugins command)")
+    scan.add_argument('--all', action='store_true', help="include the expensive plugin checks too")
+    scan.add_argument('--timeout', type=float, help="per-collector timeout in seconds")
+    scan.add_argument('--isolate', nargs='?', const='sys,procs', metavar='SECTIONS',
+                      help="run these collectors in worker processes that get killed if they hang "
+                           "(default sys,procs)")
+    scan.add_argument('--pretty', action='store_true', help="indent the json")
+    scan.add_argument('--no-cache', action='store_true', help="drop cached metrics before scanning")
+    scan.add_argument('--trace', action='store_true', help="print per-collector timings and psutil calls to stderr")
+    scan.add_argument('--profile', metavar='FILE', help="run the scan under cProfile/tracemalloc and save the profile")
+    scan.add_argument('--history', nargs='?', const=DEFAULT_HISTORY, metavar='DB',
+                      help="also store the scan in the history database")
+    _rotation_args(scan)
+    _replay_args(scan)
+    scan.set_defaults(func=cmd_scan)
+
+    sample = sub.add_parser('sample', help="keep sampling cpu/memory/disk/network")
+    sample.add_argument('--interval', type=float, default=1.0, help="seconds between samples")
+    sample.add_argument('--count', type=int, default=0, help="stop after this many (0 = run until Ctrl+C)")
+    sample.add_argument('--capacity', type=int, default=3600, help="samples kept per metric")
+    sample.add_argument('--output', '-o', help="also log every sample to this file")
+    sample.add_argument('--format', choices=report.FORMATS, help="log format (default from the file extension)")
+    sample.add_argument('--quiet', '-q', action='store_true', help="don't print samples")
+    sample.add_argument('--alerts', action='store_true', help="check the default alert rules every sample")
+    sample.add_argument('--rules',
+                        help="check the rules in this file instead (one per line, e.g. 'mem.percent > 90 for 5m')")
+    sample.add_argument('--history', nargs='?', const=DEFAULT_HISTORY, metavar='DB',
+                        help="record per-minute averages in the history database")
+    _rotation_args(sample)
+    sample.set_defaults(func=cmd_sample)
+
+    hist = sub.add_parser('history', help="look at what scan/sample --history recorded")
+    hist.add_argument('action', choices=['show', 'metrics', 'hosts', 'snapshots', 'maintain'])
+    hist.add_argument('--metric', '-m', help="show: which metric (e.g. mem.percent)")
+    hist.add_argument('--since', default='24h', help="show: how far back (e.g. 1h, 7d)")
+    hist.add_argument('--points', type=int, default=48, help="show: rows to squash the range into")
+    hist.add_argument('--db', default=DEFAULT_HISTORY, help="history database")
+    hist.add_argument('--host', help="which machine (default: this one)")
+    hist.set_defaults(func=cmd_history)
+
+    bench = sub.add_parser('bench', help="time every collector and the text rendering")
+    bench.add_argument('--fake', action='store_true', help="use a made up machine instead of this one")
+    bench.add_argument('--procs', type=int, default=10000, help="processes on the fake machine")
+    bench.add_argument('--mounts', type=int, default=200, help="mounts on the fake machine")
+    bench.add_argument('--hung', type=int, default=0, help="mounts on the fake machine that never answer")
+    bench.add_argument('--repeat', type=int, default=20, help="timed runs per case")
+    bench.add_argument('--only', help="comma separated cases")
+    bench.add_argument('--startup', action='store_true',
+                       help="time launching the app to its first frame instead (target 200 ms)")
+    bench.add_argument('--cached', action='store_true', help="let the metric cache stay warm between runs")
+    bench.add_argument('--save', help="write results here as a JSON baseline")
+    bench.add_argument('--compare', help="baseline JSON to compare against (exit 1 on regressions)")
+    bench.add_argument('--tolerance', type=float, default=0.25, help="allowed p50 slowdown before flagging")
+    _replay_args(bench)
+    bench.set_defaults(func=cmd_bench)
+
+    rec = sub.add_parser('record', help="save full scans (every process) to replay later with --replay")
+    rec.add_argument('output', help="file to write (jsonl)")
+    rec.add_argument('--count', type=int, default=10, help="how many scans")
+    rec.add_argument('--interval', type=float, default=2.0, help="seconds between scans")
+    rec.add_argument('--fake', action='store_true', help="record a made up machine instead of this one")
+    rec.add_argument('--procs', type=int, default=10000, help="processes on the fake machine")
+    rec.add_argument('--mounts', type=int, default=200, help="mounts on the fake machine")
+    rec.set_defaults(func=cmd_record)
+
+    agent = sub.add_parser('agent', help="keep sending snapshots of this machine to an aggregator")
+    agent.add_argument('--connect', '-c', required=True, help="aggregator address (host:port or unix:///path)")
+    agent.add_argument('--interval', type=float, default=10.0, help="seconds between snapshots")
+    agent.add_argument('--count', type=int, default=0, help="stop after this many (0 = run until Ctrl+C)")
+    agent.add_argument('--host', help="name to report as (default: this machine's name)")
+    agent.set_defaults(func=cmd_agent)
+
+    agg = sub.add_parser('aggregate', help="collect snapshots from agents and answer fleet queries")
+    agg.add_argument('--listen', '-l', default='0.0.0.0:9650', help="host:port or unix:///path to listen on")
+    agg.set_defaults(func=cmd_aggregate)
+
+    fl = sub.add_parser('fleet', help="ask an aggregator about every machine it knows")
+    fl.add_argument('query', choices=['hosts', 'disks-over', 'top-procs', 'stale', 'snapshot'])
+    fl.add_argument('--connect', '-c', default='127.0.0.1:9650', help="aggregator address")
+    fl.add_argument('--percent', type=float, default=90.0, help="disks-over: usage threshold")
+    fl.add_argument('--n', type=int, default=20, help="top-procs: how many")
+    fl.add_argument('--key', choices=['rss', 'mem', 'cpu'], default='rss', help="top-procs: sort by")
+    fl.add_argument('--seconds', type=float, default=300.0, help="stale: not heard from in this long")
+    fl.add_argument('--host', help="snapshot: which machine")
+    fl.add_argument('--json', action='store_true', help="print the raw answer as json")
+    fl.set_defaults(func=cmd_fleet)
+
+    sec = sub.add_parser('security',
+                         help="antivirus, firewall, updates, accounts and services (waits for the slow ones)")
+    sec.add_argument('--timeout', type=float, default=60.0, help="seconds to wait for the slow queries")
+    sec.add_argument('--json', action='store_true', help="print the checks as json")
+    _replay_args(sec)
+    sec.set_defaults(func=cmd_security)
+
+    plg = sub.add_parser('plugins', help="list the collectors a scan can run, plugins included")
+    plg.add_argument('--json', action='store_true', help="print the list as json")
+    plg.set_defaults(func=cmd_plugins)
+
+    pr = sub.add_parser('procs', help="the busiest processes, sorted however you like")
+    pr.add_argument('--sort', choices=SORT_KEYS, default='mem', help="column to sort by")
+    pr.add_argument('--by', choices=['name', 'service'], help="add processes up per program or service")
+    pr.add_argument('--n', type=int, default=20, help="how many rows")
+    pr.add_argument('--interval', type=float, default=0.5, help="seconds between the two looks (for CPU%% and I/O)")
+    pr.add_argument('--json', action='store_true', help="print the rows as json")
+    pr.set_defaults(func=cmd_procs)
+
+    mon = sub.add_parser('monitor', help="live view of CPU, memory, disks, network and processes")
+    mon.add_argument('--interval', type=float, default=2.0, help="seconds between refreshes")
+    mon.add_argument('--n', type=int, default=10, help="processes shown")
+    mon.add_argument('--sort', choices=SORT_KEYS, default='cpu', help="process column to sort by")
+    mon.add_argument('--once', action='store_true', help="print one screen and exit")
+    _replay_args(mon)
+    mon.set_defaults(func=cmd_monitor)
+
+    dff = sub.add_parser('diff', help="what changed between two scans (or two machines)")
+    dff.add_argument('old', help="now, last, #ID or host:NAME from history, or a 'scan --format json' file")
+    dff.add_argument('new', nargs='?', default='now', help="same choices as old (default: now)")
+    dff.add_argument('--db', default=DEFAULT_HISTORY, help="history database for last/#ID/host:NAME")
+    dff.add_argument('--limit', type=int, default=15, help="rows shown per list of changes")
+    dff.add_argument('--json', action='store_true', help="print the diff as json")
+    dff.set_defaults(func=cmd_diff)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, 'func', None):
+        parser.print_help()
+        return 2
+    if getattr(args, 'replay', None) and (getattr(args, 'isolate', None) or getattr(args, 'fake', False)):
+        parser.error("--replay can't be used with --isolate or --fake")
+    with _replaying(args):
+        return args.func(args)
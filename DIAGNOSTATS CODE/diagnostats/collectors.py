@@ -0,0 +1,237 @@
+# collectors.py - the actual system checks, no GUI needed
+
+import sys
+import platform
+import socket
+
+from . import backends
+from .cache import cache
+from .lazy import available, LazyModule
+from .rates import CounterDelta
+from .records import SysInfo, HwInfo, DiskIO, Nic
+from .tracing import tracer
+
+# Don't crash if psutil's missing, and don't import it until the first
+# check actually needs it (it's the slowest import we have).
+# It's wrapped so the tracer can see every call we make into it
+has_psutil = available('psutil')
+if has_psutil:
+    psutil = tracer.wrap(LazyModule('psutil'))
+else:
+    print("Note: psutil not found, some features limited", file=sys.stderr)
+
+
+def warm_up():
+    # Pay for the psutil import now (e.g. on a background thread while the
+    # window is idle) rather than in the middle of the first scan
+    if has_psutil:
+        cache.get('boot_time', psutil.boot_time)
+    # and get the slow security queries going (they carry on in the background)
+    from .security import get_security_info
+    get_security_info()
+
+
+def get_basic_info():
+    # Just OS and hostname, cheap enough for startup
+    backend = backends.current()
+    return {
+        'os': backend.os_name(),
+        'host': backend.host(),
+        'arch': platform.machine(),
+    }
+
+
+def is_admin():
+    # True/False, or None if we can't tell on this OS
+    return backends.current().is_admin()
+
+
+def get_sys_info():
+    # None of this changes while we're running, so it's all cached
+    backend = backends.current()
+    boot = cache.get('boot_time', psutil.boot_time) if has_psutil else None
+    return SysInfo(
+        os=backend.os_name(),
+        version=cache.get('os_version', backend.os_version),
+        edition=cache.get('edition', backend.edition),
+        boot_time=boot,
+        python=platform.python_version(),
+    )
+
+
+def get_hardware_info():
+    if not has_psutil:
+        raise RuntimeError("Need psutil for hardware info")
+
+    # CPU speed isn't available everywhere (some VMs, some ARM boards)
+    try:
+        freq = psutil.cpu_freq()
+    except Exception as e:
+        tracer.swallowed('cpu_freq', e)
+        freq = None
+
+    mem = psutil.virtual_memory()
+    swap = psutil.swap_memory()
+    return HwInfo(
+        cpu_cores=cache.get('cpu_count', lambda: psutil.cpu_count(logical=True)),
+        cpu_physical=cache.get('cpu_physical', lambda: psutil.cpu_count(logical=False)),
+        cpu_percent=psutil.cpu_percent(interval=0.5),
+        cpu_mhz=freq.current if freq else None,
+        mem_total=mem.total,
+        mem_used=mem.used,
+        mem_percent=mem.percent,
+        swap_total=swap.total,
+        swap_used=swap.used,
+        swap_percent=swap.percent,
+    )
+
+
+def get_disk_info():
+    if not has_psutil:
+        raise RuntimeError("Need psutil for disk info")
+
+    # Usage barely moves in a few seconds, and disk_usage can be slow
+    return cache.get('disks', _read_disks)
+
+
+def _read_disks():
+    # Each mount is checked in parallel with its own deadline, so one hung
+    # network share can't hold up the rest (see mounts.py)
+    return mount_prober().probe(psutil.disk_partitions())
+
+
+_prober = None
+
+
+def mount_prober():
+    global _prober
+    if _prober is None:
+        from .mounts import MountProber
+        _prober = MountProber()
+    return _prober
+
+
+_disk_io = CounterDelta()
+
+
+def get_disk_io():
+    # Per-device activity since the last scan (or over a quick 0.25s look)
+    if not has_psutil:
+        raise RuntimeError("Need psutil for disk activity")
+
+    deltas = _disk_io.sample(lambda: psutil.disk_io_counters(perdisk=True) or {})
+    out = []
+    for device, (dt, d) in sorted(deltas.items()):
+        reads, writes = d['read_count'], d['write_count']
+        busy = d.get('busy_time')
+        out.append(DiskIO(
+            device=device,
+            read_iops=reads / dt,
+            write_iops=writes / dt,
+            read_bps=d['read_bytes'] / dt,
+            write_bps=d['write_bytes'] / dt,
+            read_ms=d['read_time'] / reads if reads else 0.0,
+            write_ms=d['write_time'] / writes if writes else 0.0,
+            busy=min(100.0, busy / (dt * 10)) if busy is not None else None,  # ms busy per second -> %
+            interval=dt,
+        ))
+    return out
+
+
+def get_proc_info(count=15, key='mem', uss=True):
+    if not has_psutil:
+        raise RuntimeError("Need psutil for process list")
+
+    # The table remembers processes between scans, so this only has to
+    # catch up on what changed - and it can tell us CPU% and I/O per process
+    table = process_table()
+    table.refresh()
+    return [e.record(table.uss(e) if uss else None) for e in table.top(count, key)]
+
+
+def get_proc_groups(count=15, by='name', key='rss'):
+    # Same table, added up per program (or Windows service)
+    if not has_psutil:
+        raise RuntimeError("Need psutil for process list")
+    table = process_table()
+    table.refresh()
+    return table.rollup(by, count, key)
+
+
+_table = None
+
+
+def process_table(create=True):
+    # One shared table per process, made on first use (None if create is
+    # False and nothing has needed one yet)
+    global _table
+    if _table is None and create:
+        from .procs import ProcessTable
+        _table = ProcessTable()
+    return _table
+
+
+# Module level state that carries over between scans
+STATEFUL = ('_table', '_prober', '_disk_io', '_net_io')
+
+
+def reset_state():
+    """Forget everything remembered between scans (process table, rates...)."""
+    global _table, _prober, _disk_io, _net_io
+    _table = _prober = None
+    _disk_io = CounterDelta()
+    _net_io = CounterDelta()
+
+
+_net_io = CounterDelta()
+
+
+def get_net_info():
+    # Every adapter with its addresses, link state and current traffic.
+    # Deliberately no DNS lookups - they can hang for seconds on a bad setup
+    if not has_psutil:
+        raise RuntimeError("Need psutil for network info")
+
+    deltas = _net_io.sample(lambda: psutil.net_io_counters(pernic=True) or {})
+    totals = _net_io.last
+    addrs = psutil.net_if_addrs()
+    stats = psutil.net_if_stats()
+
+    out = []
+    for name in sorted(totals):
+        c = totals[name]
+        st = stats.get(name)
+        mac, ipv4, ipv6 = None, [], []
+        for a in addrs.get(name, ()):
+            if a.family == socket.AF_INET:
+                ipv4.append(a.address)
+            elif a.family == socket.AF_INET6:
+                ipv6.append(a.address)
+            elif a.family == psutil.AF_LINK:
+                mac = a.address
+
+        dt, d = deltas.get(name, (None, None))
+        if d is None:  # adapter appeared since the last look
+            d = dict.fromkeys(c._fields, 0)
+        per = dt or 1.0
+        out.append(Nic(
+            name=name,
+            is_up=st.isup if st else None,
+            speed=(st.speed or None) if st else None,
+            mtu=st.mtu if st else None,
+            mac=mac,
+            ipv4=ipv4,
+            ipv6=ipv6,
+            bytes_sent=c.bytes_sent,
+            bytes_recv=c.bytes_recv,
+            sent_bps=d['bytes_sent'] / per,
+            recv_bps=d['bytes_recv'] / per,
+            packets_sent_ps=d['packets_sent'] / per,
+            packets_recv_ps=d['packets_recv'] / per,
+            errin=d['errin'],
+            errout=d['errout'],
+            dropin=d['dropin'],
+            dropout=d['dropout'],
+            interval=dt,
+        ))
+    return out
@@ -0,0 +1,103 @@
+# diff.py - what changed between two scans (or two machines)
+#
+# List sections are matched up by key (mount, device, pid+name, adapter)
+# through a dict, so it's one pass over each side however many processes
+# there are. Single records (sys, hw) are compared field by field.
+
+from collections import namedtuple
+from numbers import Number
+
+from .snapshot import SECTIONS, LIST_SECTIONS
+
+# How the rows of each list section are matched up
+KEYS = {
+    'disks': lambda d: d.mount,
+    'diskio': lambda d: d.device,
+    'procs': lambda p: (p.pid, p.name),  # pids get reused, names make it stick
+    'net': lambda n: n.name,
+}
+
+# Fields that always differ and don't mean anything by themselves
+IGNORE = {
+    'diskio': ('interval',),
+    'net': ('interval',),
+    # These move on every look at a running process
+    'procs': ('cpu', 'cpu_time', 'read_bytes', 'write_bytes', 'io_bps', 'uss'),
+}
+
+FieldChange = namedtuple('FieldChange', 'field old new delta')  # delta is None for non-numbers
+Changed = namedtuple('Changed', 'key old new changes')
+SectionDiff = namedtuple('SectionDiff', 'added removed changed')
+
+
+class SnapshotDiff(namedtuple('SnapshotDiff', 'old new sections')):
+    """sections maps each section name to a SectionDiff.
+
+    For sys/hw, changed holds at most one Changed (the record itself).
+    """
+    __slots__ = ()
+
+    def __bool__(self):
+        return any(s.added or s.removed or s.changed for s in self.sections.values())
+
+    def to_dict(self):
+        def row(r):
+            return r._asdict() if hasattr(r, '_asdict') else r
+        out = {'old': {'host': self.old.host, 'taken': self.old.taken},
+               'new': {'host': self.new.host, 'taken': self.new.taken}}
+        for name, s in self.sections.items():
+            out[name] = {
+                'added': [row(r) for r in s.added],
+                'removed': [row(r) for r in s.removed],
+                'changed': [{'key': c.key, 'changes': [ch._asdict() for ch in c.changes]} for c in s.changed],
+            }
+        return out
+
+
+def _number(v):
+    return isinstance(v, Number) and not isinstance(v, bool)
+
+
+def compare(old, new, ignore=()):
+    """[FieldChange] for every field that differs between two records."""
+    out = []
+    for field, a, b in zip(new._fields, old, new):
+        if a == b or field in ignore:
+            continue
+        delta = b - a if _number(a) and _number(b) else None
+        out.append(FieldChange(field, a, b, delta))
+    return out
+
+
+def diff_list(old, new, key, ignore=()):
+    """Match two lists of records by key and sort them into added/removed/changed."""
+    before = {key(r): r for r in old}
+    added, changed = [], []
+    for r in new:
+        k = key(r)
+        prev = before.pop(k, None)
+        if prev is None:
+            added.append(r)
+            continue
+        changes = compare(prev, r, ignore)
+        if changes:
+            changed.append(Changed(k, prev, r, changes))
+    # Whatever wasn't claimed by the new side is gone
+    return SectionDiff(added, list(before.values()), changed)
+
+
+def diff(old, new):
+    """SnapshotDiff between two Snapshots (old first)."""
+    sections = {}
+    for name in SECTIONS:
+        a, b = getattr(old, name), getattr(new, name)
+        ignore = IGNORE.get(name, ())
+        if name in LIST_SECTIONS:
+            sections[name] = diff_list(a or [], b or [], KEYS[name], ignore)
+        elif a is None or b is None:
+            # Only one side has it (e.g. a partial scan) - nothing to compare
+            sections[name] = SectionDiff([], [], [])
+        else:
+            changes = compare(a, b, ignore)
+            sections[name] = SectionDiff([], [], [Changed(name, a, b, changes)] if changes else [])
+    return SnapshotDiff(old, new, sections)
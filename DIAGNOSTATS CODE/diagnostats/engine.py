@@ -0,0 +1,100 @@
+# engine.py - runs the collectors and hands back a Snapshot, no Tk anywhere
+
+import time
+
+from . import backends, plugins
+from .scheduler import Scheduler, Result
+from .snapshot import Snapshot
+from .tracing import tracer
+
+
+class Collector:
+    """Headless front end for a scan.
+
+    The GUI, the command line and anything else that wants numbers all go
+    through this, so a scan only ever costs the psutil calls.
+    """
+
+    def __init__(self, scheduler=None, timeouts=None, isolate=(), registry=None):
+        """isolate names sections to run in worker processes (see isolate.py)
+        so a collector stuck in native code can be killed. registry is where
+        the collectors come from (plugins.registry unless told otherwise)."""
+        self.scheduler = scheduler or Scheduler()
+        self.timeouts = timeouts or {}
+        self.registry = registry or plugins.registry
+        self.isolate = tuple(isolate)
+        self.kept = {}  # name -> (Result, when) for static/interval collectors
+        self._jobs = None
+
+        self.runner = None
+        if isolate:
+            from .isolate import IsolatedRunner
+            # A little inside the scheduler's deadline, so the worker is
+            # killed before the scheduler gives up on the thread waiting for it
+            limit = lambda n: self.timeouts.get(n, self.scheduler.timeout) * 0.9
+            self.runner = IsolatedRunner(timeouts={n: limit(n) for n in isolate})
+
+    @property
+    def jobs(self):
+        # Built on first use, so looking for plugins doesn't hold up startup.
+        # Each collector runs inside a tracer span named after its section
+        if self._jobs is None:
+            jobs = {s.name: tracer.traced(s.name, s.func) for s in self.registry.all()}
+            for name in self.isolate:
+                jobs[name] = tracer.traced(name, self.runner.job(name))
+            self._jobs = jobs
+        return self._jobs
+
+    def close(self):
+        # Stops any worker processes, the collector still works afterwards
+        if self.runner is not None:
+            self.runner.close()
+
+    def scan(self, sections=None, on_result=None, cancel=None):
+        """Run a scan and return a Snapshot.
+
+        sections limits which collectors run (default is everything that
+        isn't expensive, see plugins.py), on_result gets each scheduler
+        Result as soon as it comes in and cancel is an optional CancelToken
+        to abort the scan early. Answers that are still good (static ones,
+        or younger than their interval) are handed back without running.
+        """
+        names = sections or self.registry.defaults()
+        backends.current().tick()  # a replay moves on to its next snapshot
+        jobs, ready = self.plan(names)
+        for res in ready.values():
+            if on_result is not None:
+                on_result(res)
+
+        taken = time.time()
+        results = self.scheduler.run(jobs, on_result=on_result, timeouts=self.timeouts, cancel=cancel)
+        for name, res in results.items():
+            spec = self.registry.get(name)
+            if res.error is None and (spec.cost == 'static' or spec.interval):
+                self.kept[name] = (res, taken)
+        ready.update(results)
+        return Snapshot.from_results(ready, taken=taken)
+
+    def plan(self, names):
+        """({name: job} to run, {name: Result} already known) for a scan of names."""
+        now = time.time()
+        jobs, ready = {}, {}
+        for name in names:
+            spec = self.registry.get(name)
+            missing = self.registry.missing(spec)
+            if missing:
+                ready[name] = Result(name, None, RuntimeError(", ".join(missing)), 0.0, False)
+                continue
+            kept = self.kept.get(name)
+            if kept and (spec.cost == 'static' or now - kept[1] < spec.interval):
+                ready[name] = kept[0]._replace(elapsed=0.0)
+                continue
+            jobs[name] = self.jobs[name]
+        return jobs, ready
+
+    # Quick looks that don't need a whole scan
+    def system(self):
+        return self.jobs['sys']()
+
+    def disks(self):
+        return self.jobs['disks']()
@@ -0,0 +1,69 @@
+# events.py - hands scan progress from worker threads to whoever's drawing it
+#
+# Tk must only be touched from its own thread, so the scan thread never
+# calls into it. It posts events here and the main loop drains them in
+# batches with after().
+
+import queue
+import threading
+from collections import namedtuple
+
+Event = namedtuple('Event', 'kind payload')
+
+
+class Cancelled(Exception):
+    pass
+
+
+class CancelToken:
+    """Shared flag that says "stop what you're doing"."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn()
+
+    def on_cancel(self, fn):
+        # fn runs as soon as cancel() is called (straight away if it already was)
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return
+        fn()
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled("cancelled")
+
+
+class EventChannel:
+    """Thread-safe producer/consumer queue of Events."""
+
+    def __init__(self):
+        self._q = queue.Queue()
+
+    def post(self, kind, payload=None):
+        self._q.put(Event(kind, payload))
+
+    def drain(self, max_items=200):
+        """Everything waiting (up to max_items), without blocking."""
+        out = []
+        while len(out) < max_items:
+            try:
+                out.append(self._q.get_nowait())
+            except queue.Empty:
+                break
+        return out
@@ -0,0 +1,506 @@
+# fakes.py - pretend psutils for benchmarks, with as many processes and mounts as you like
+#
+# Only covers the parts of psutil that diagnostats actually calls.
+# FakePsutil makes its numbers up with a seeded random generator, so runs
+# are repeatable; ReplayPsutil plays back scans recorded on a real machine
+# (see backends.record()).
+
+import bisect
+import random
+import socket
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from . import collectors
+from .cache import cache
+from .tracing import tracer
+
+# Same shapes psutil hands back
+svmem = namedtuple('svmem', 'total available percent used free')
+sswap = namedtuple('sswap', 'total used free percent sin sout')
+scpufreq = namedtuple('scpufreq', 'current min max')
+sdiskpart = namedtuple('sdiskpart', 'device mountpoint fstype opts')
+sdiskusage = namedtuple('sdiskusage', 'total used free percent')
+sdiskio = namedtuple('sdiskio', 'read_count write_count read_bytes write_bytes read_time write_time busy_time')
+sdiskio_win = namedtuple('sdiskio', 'read_count write_count read_bytes write_bytes read_time write_time')
+snetio = namedtuple('snetio', 'bytes_sent bytes_recv packets_sent packets_recv errin errout dropin dropout')
+snicaddr = namedtuple('snicaddr', 'family address netmask broadcast ptp')
+snicstats = namedtuple('snicstats', 'isup duplex speed mtu flags')
+pmem = namedtuple('pmem', 'rss vms')
+pfullmem = namedtuple('pfullmem', 'rss vms uss')
+pcputimes = namedtuple('pcputimes', 'user system')
+pio = namedtuple('pio', 'read_count write_count read_bytes write_bytes')
+
+GB = 1024 ** 3
+
+
+class Error(Exception):
+    pass
+
+
+class NoSuchProcess(Error):
+    def __init__(self, pid=None, name=None, msg=None):
+        super().__init__(msg or f"process no longer exists (pid={pid})")
+        self.pid = pid
+
+
+class ZombieProcess(NoSuchProcess):
+    pass
+
+
+class AccessDenied(Error):
+    pass
+
+
+class TimeoutExpired(Error):
+    pass
+
+
+class _OneShot:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeProcess:
+    def __init__(self, ps, pid):
+        self._ps = ps
+        self.pid = pid
+        if pid not in ps._procs:
+            raise NoSuchProcess(pid)
+        self.info = {}
+
+    def _row(self):
+        row = self._ps._procs.get(self.pid)
+        if row is None:
+            raise NoSuchProcess(self.pid)
+        return row
+
+    def oneshot(self):
+        return _OneShot()
+
+    def name(self):
+        return self._row()['name']
+
+    def create_time(self):
+        return self._row()['create_time']
+
+    def memory_info(self):
+        rss = self._row()['rss']
+        return pmem(rss, rss * 2)
+
+    def memory_full_info(self):
+        rss = self._row()['rss']
+        return pfullmem(rss, rss * 2, rss // 2)
+
+    def cpu_times(self):
+        row = self._row()
+        row['cpu_time'] += row['cpu'] / 100.0
+        return pcputimes(row['cpu_time'] * 0.8, row['cpu_time'] * 0.2)
+
+    def num_threads(self):
+        return self._row()['threads']
+
+    def num_fds(self):
+        return self._row()['handles']
+
+    num_handles = num_fds
+
+    def ppid(self):
+        return self._row()['ppid']
+
+    def io_counters(self):
+        io = self._row()['io']
+        io[2] += self._ps.rand.randint(0, 4096)
+        io[3] += self._ps.rand.randint(0, 4096)
+        return pio(*io)
+
+    def memory_percent(self):
+        return self._row()['rss'] * 100.0 / self._ps.total_mem
+
+    def cpu_percent(self, interval=None):
+        return self._row()['cpu']
+
+    def as_dict(self, attrs):
+        out = {}
+        for a in attrs:
+            out[a] = self.pid if a == 'pid' else getattr(self, a)()
+        return out
+
+
+class FakePsutil:
+    """Stand-in for the psutil module.
+
+    procs/mounts set how big the machine looks; churn is the fraction of
+    processes swapped for new ones every time pids() is called. The first
+    hung mounts never answer disk_usage(), like a dead network share.
+    """
+
+    NoSuchProcess = NoSuchProcess
+    ZombieProcess = ZombieProcess
+    AccessDenied = AccessDenied
+    TimeoutExpired = TimeoutExpired
+    Error = Error
+    AF_LINK = 17
+
+    def __init__(self, procs=10000, mounts=200, churn=0.01, seed=0, hung=0):
+        self.rand = random.Random(seed)
+        self.total_mem = 64 * GB
+        self.churn = churn
+        self._boot = time.time() - 86400 * 3
+        self._next_pid = 100
+        self._procs = {}
+        for _ in range(procs):
+            self._spawn()
+
+        self._mounts = []
+        for i in range(mounts):
+            total = self.rand.randint(20, 4000) * GB
+            used = int(total * self.rand.uniform(0.05, 0.99))
+            self._mounts.append((sdiskpart(f"/dev/fake{i}", f"/mnt/fake{i}", 'ext4', 'rw'),
+                                 sdiskusage(total, used, total - used, round(used * 100.0 / total, 1))))
+        self._usage = {part.mountpoint: usage for part, usage in self._mounts}
+        self._hung = {part.mountpoint for part, _ in self._mounts[:hung]}
+        self._never = threading.Event()
+
+        self._io = {f"fake{i}": [0] * 7 for i in range(mounts)}
+        self._net = {nic: [0] * 8 for nic in ('lo', 'eth0', 'eth1', 'wlan0')}
+
+    def _spawn(self):
+        pid = self._next_pid
+        self._next_pid += 1
+        self._procs[pid] = {
+            'name': f"proc{pid % 500}.exe",
+            'create_time': time.time(),
+            'rss': self.rand.randint(1, 2000) * 1024 * 1024,
+            'cpu': self.rand.random() * 5,
+            'cpu_time': self.rand.random() * 1000,
+            'threads': self.rand.randint(1, 64),
+            'handles': self.rand.randint(3, 2000),
+            'ppid': self.rand.randint(100, pid - 1) if pid > 100 else 1,  # parent may be gone, like real life
+            'io': [0, 0, 0, 0],
+        }
+
+    # System wide bits
+    def boot_time(self):
+        return self._boot
+
+    def cpu_count(self, logical=True):
+        return 64 if logical else 32
+
+    def cpu_percent(self, interval=None, percpu=False):
+        # Never sleeps, even when asked to - we're timing our code, not the OS
+        return round(self.rand.uniform(0, 100), 1)
+
+    def cpu_freq(self):
+        return scpufreq(3200.0, 800.0, 4500.0)
+
+    def virtual_memory(self):
+        used = sum(p['rss'] for p in self._procs.values()) % self.total_mem
+        avail = self.total_mem - used
+        return svmem(self.total_mem, avail, round(used * 100.0 / self.total_mem, 1), used, avail)
+
+    def swap_memory(self):
+        return sswap(8 * GB, 2 * GB, 6 * GB, 25.0, 0, 0)
+
+    # Disks
+    def disk_partitions(self, all=False):
+        return [part for part, _ in self._mounts]
+
+    def disk_usage(self, path):
+        if path in self._hung:
+            self._never.wait()
+        try:
+            return self._usage[path]
+        except KeyError:
+            raise OSError(f"No such mount: {path}")
+
+    def disk_io_counters(self, perdisk=False, nowrap=True):
+        for dev, io in self._io.items():
+            io[:] = [v + self.rand.randint(0, 1000) for v in io]
+        if perdisk:
+            return {dev: sdiskio(*io) for dev, io in self._io.items()}
+        return sdiskio(*[sum(col) for col in zip(*self._io.values())])
+
+    # Network
+    def net_io_counters(self, pernic=False, nowrap=True):
+        for io in self._net.values():
+            io[:] = [v + self.rand.randint(0, 100000) for v in io]
+        if pernic:
+            return {nic: snetio(*io) for nic, io in self._net.items()}
+        return snetio(*[sum(col) for col in zip(*self._net.values())])
+
+    def net_if_addrs(self):
+        out = {}
+        for i, nic in enumerate(self._net):
+            out[nic] = [snicaddr(socket.AF_INET, f"10.0.{i}.2", '255.255.255.0', None, None),
+                        snicaddr(socket.AF_INET6, f"fd00::{i}:2", None, None, None),
+                        snicaddr(self.AF_LINK, f"02:00:00:00:00:{i:02x}", None, None, None)]
+        return out
+
+    def net_if_stats(self):
+        return {nic: snicstats(True, 2, 0 if nic == 'lo' else 1000, 1500, 'up,running') for nic in self._net}
+
+    # Processes
+    def pids(self):
+        # Some processes finish and new ones start between looks
+        n = int(len(self._procs) * self.churn)
+        for pid in self.rand.sample(list(self._procs), n):
+            del self._procs[pid]
+        for _ in range(n):
+            self._spawn()
+        return list(self._procs)
+
+    def Process(self, pid):
+        return FakeProcess(self, pid)
+
+    def process_iter(self, attrs=None):
+        for pid in self.pids():
+            p = FakeProcess(self, pid)
+            if attrs:
+                p.info = p.as_dict(attrs)
+            yield p
+
+
+class ReplayProcess(FakeProcess):
+    # Recorded numbers, and recorded refusals too: whatever the OS wouldn't
+    # tell the original scan is AccessDenied here as well
+
+    def _recorded(self, field):
+        value = self._row()[field]
+        if value is None:
+            raise AccessDenied(f"{field} wasn't recorded for pid {self.pid}")
+        return value
+
+    def cpu_times(self):
+        t = self._row()['cpu_time'] or 0.0
+        return pcputimes(t * 0.8, t * 0.2)
+
+    def num_fds(self):
+        return self._recorded('handles')
+
+    num_handles = num_fds
+
+    def io_counters(self):
+        row = self._row()
+        return pio(0, 0, self._recorded('read_bytes'), row['write_bytes'] or 0)
+
+    def memory_full_info(self):
+        rss = self._row()['rss']
+        return pfullmem(rss, rss * 2, self._recorded('uss'))
+
+
+class ReplayPsutil:
+    """Stand-in for the psutil module that plays back recorded Snapshots.
+
+    Nothing moves until tick(). With speed=None every tick moves on to the
+    next snapshot, so each scan sees the next one whatever the timing,
+    otherwise it jumps to wherever the replay clock has got to (speed=1 is
+    the pace they were recorded at, 10 ten times faster). Disk and network
+    counters are rebuilt from the recorded rates, so the collectors come
+    up with the same rates again. After the last snapshot it goes back to
+    the first (or stays on the last, loop=False).
+    """
+
+    NoSuchProcess = NoSuchProcess
+    ZombieProcess = ZombieProcess
+    AccessDenied = AccessDenied
+    TimeoutExpired = TimeoutExpired
+    Error = Error
+    AF_LINK = 17
+
+    def __init__(self, snapshots, speed=None, loop=True):
+        if not snapshots:
+            raise ValueError("Nothing to replay")
+        self.snapshots = sorted(snapshots, key=lambda s: s.taken)
+        self.speed = speed
+        self.loop = loop
+        self.index = None
+        self.frame = None
+        self.ticks = 0
+        self._times = [s.taken for s in self.snapshots]
+        self._started = None
+        self._last_tick = None
+        self._created = {}  # (pid, name) -> made up create_time, kept across snapshots
+        self._disk_io = {}  # device -> running totals
+        self._net_io = {}
+        self._procs = {}
+        self._never = threading.Event()
+        self.tick()
+
+    def tick(self):
+        """Move on (or not, in clock mode, if it isn't time yet)."""
+        now = time.monotonic()
+        n = len(self.snapshots)
+        if self.index is None:
+            index = 0
+            self._started = now
+        elif self.speed:
+            at = (now - self._started) * self.speed
+            span = self._times[-1] - self._times[0]
+            if self.loop and span > 0:
+                at %= span
+            index = bisect.bisect_right(self._times, self._times[0] + at) - 1
+        else:
+            index = self.index + 1
+            if index >= n:
+                index = 0 if self.loop else n - 1
+
+        # In clock mode counters go up by rate x real time, so the rates
+        # come out as recorded however fast it's going
+        dt = (now - self._last_tick) if self.speed and self._last_tick is not None else None
+        self._last_tick = now
+        self.ticks += 1
+        self._show(index, dt)
+
+    def _show(self, index, dt):
+        snap = self.frame = self.snapshots[index]
+        self.index = index
+        hw = snap.hw
+        self.total_mem = (hw.mem_total if hw else None) or 16 * GB
+
+        procs = {}
+        for p in snap.procs or []:
+            created = self._created.setdefault((p.pid, p.name), snap.taken - (p.cpu_time or 0))
+            procs[p.pid] = {
+                'name': p.name, 'create_time': created, 'rss': p.rss or 0, 'cpu': p.cpu or 0.0,
+                'cpu_time': p.cpu_time, 'threads': p.threads, 'handles': p.handles, 'ppid': p.ppid,
+                'read_bytes': p.read_bytes, 'write_bytes': p.write_bytes, 'uss': p.uss,
+            }
+        self._procs = procs
+
+        self._mounts = [sdiskpart(d.drive, d.mount, d.fstype or '', 'rw') for d in snap.disks or []]
+        self._usage = {d.mount: d for d in snap.disks or []}
+
+        self._busy = all(d.busy is not None for d in snap.diskio or [])
+        self._devices = []
+        for d in snap.diskio or []:
+            step = dt or d.interval or 1.0
+            io = self._disk_io.setdefault(d.device, [0.0] * 7)
+            reads, writes = d.read_iops * step, d.write_iops * step
+            for i, v in enumerate((reads, writes, d.read_bps * step, d.write_bps * step,
+                                   d.read_ms * reads, d.write_ms * writes, (d.busy or 0) * step * 10)):
+                io[i] += v
+            self._devices.append(d.device)
+
+        self._nics = snap.net or []
+        for n in self._nics:
+            step = dt or n.interval or 1.0
+            c = self._net_io.get(n.name)
+            if c is None:
+                # Totals start where the recording says they were
+                c = self._net_io[n.name] = [n.bytes_sent or 0, n.bytes_recv or 0] + [0.0] * 6
+            else:
+                c[0] += n.sent_bps * step
+                c[1] += n.recv_bps * step
+            c[2] += n.packets_sent_ps * step
+            c[3] += n.packets_recv_ps * step
+            for i, v in enumerate((n.errin, n.errout, n.dropin, n.dropout), 4):
+                c[i] += v or 0
+
+    # System wide bits
+    def boot_time(self):
+        s = self.frame.sys
+        return s.boot_time if s and s.boot_time else self.frame.taken
+
+    def cpu_count(self, logical=True):
+        hw = self.frame.hw
+        if hw is None:
+            return None
+        return hw.cpu_cores if logical else hw.cpu_physical
+
+    def cpu_percent(self, interval=None, percpu=False):
+        hw = self.frame.hw
+        return hw.cpu_percent if hw and hw.cpu_percent is not None else 0.0
+
+    def cpu_freq(self):
+        hw = self.frame.hw
+        return scpufreq(hw.cpu_mhz, 0.0, 0.0) if hw and hw.cpu_mhz else None
+
+    def virtual_memory(self):
+        hw = self.frame.hw
+        used = (hw.mem_used if hw else None) or 0
+        free = self.total_mem - used
+        return svmem(self.total_mem, free, (hw.mem_percent if hw else None) or 0.0, used, free)
+
+    def swap_memory(self):
+        hw = self.frame.hw
+        total, used = (hw.swap_total or 0, hw.swap_used or 0) if hw else (0, 0)
+        return sswap(total, used, total - used, (hw.swap_percent if hw else None) or 0.0, 0, 0)
+
+    # Disks
+    def disk_partitions(self, all=False):
+        return list(self._mounts)
+
+    def disk_usage(self, path):
+        d = self._usage.get(path)
+        if d is None:
+            raise OSError(f"No such mount: {path}")
+        if d.error:
+            if 'no answer' in d.error or 'not answering' in d.error:
+                self._never.wait()  # hung when it was recorded, hangs now
+            raise OSError(d.error)
+        return sdiskusage(d.total, d.used, d.free, d.percent)
+
+    def disk_io_counters(self, perdisk=False, nowrap=True):
+        shape = sdiskio if self._busy else sdiskio_win
+        counters = {dev: shape(*self._disk_io[dev][:len(shape._fields)]) for dev in self._devices}
+        if perdisk:
+            return counters
+        return shape(*[sum(col) for col in zip(*counters.values())]) if counters else None
+
+    # Network
+    def net_io_counters(self, pernic=False, nowrap=True):
+        counters = {n.name: snetio(*self._net_io[n.name]) for n in self._nics}
+        if pernic:
+            return counters
+        return snetio(*[sum(col) for col in zip(*counters.values())]) if counters else None
+
+    def net_if_addrs(self):
+        out = {}
+        for n in self._nics:
+            addrs = [snicaddr(socket.AF_INET, a, None, None, None) for a in n.ipv4 or []]
+            addrs += [snicaddr(socket.AF_INET6, a, None, None, None) for a in n.ipv6 or []]
+            if n.mac:
+                addrs.append(snicaddr(self.AF_LINK, n.mac, None, None, None))
+            out[n.name] = addrs
+        return out
+
+    def net_if_stats(self):
+        return {n.name: snicstats(bool(n.is_up), 2, n.speed or 0, n.mtu or 0, '') for n in self._nics}
+
+    # Processes
+    def pids(self):
+        return list(self._procs)
+
+    def Process(self, pid):
+        return ReplayProcess(self, pid)
+
+    def process_iter(self, attrs=None):
+        for pid in self.pids():
+            p = ReplayProcess(self, pid)
+            if attrs:
+                p.info = p.as_dict(attrs)
+            yield p
+
+
+@contextmanager
+def installed(fake):
+    """Point the collectors at fake instead of the real psutil for a while."""
+    old = (collectors.psutil if collectors.has_psutil else None, collectors.has_psutil)
+    old_state = {name: getattr(collectors, name) for name in collectors.STATEFUL}
+    collectors.psutil = tracer.wrap(fake)
+    collectors.has_psutil = True
+    collectors.reset_state()
+    cache.invalidate()
+    try:
+        yield fake
+    finally:
+        collectors.psutil, collectors.has_psutil = old
+        for name, value in old_state.items():
+            setattr(collectors, name, value)
+        cache.invalidate()
@@ -0,0 +1,321 @@
+# fleet.py - many machines, one place to ask questions
+#
+# Agents scan their own machine every so often and push a compact snapshot
+# to an aggregator over TCP or a unix socket. The aggregator keeps the
+# latest snapshot per host in memory and answers fleet-wide queries from
+# that, so nobody has to go and rescan every host to get an answer.
+#
+# Wire format: 4 byte big-endian length, then zlib'd JSON. Messages are
+#   {'type': 'snapshot', 'host': ..., 'data': {...}}     agent -> aggregator
+#   {'type': 'query', 'q': 'disks_over', 'args': {...}}   client -> aggregator
+#   {'type': 'reply', 'ok': True, 'result': ...}          aggregator -> client
+
+import asyncio
+import heapq
+import json
+import platform
+import struct
+import time
+import zlib
+from numbers import Number
+
+from . import collectors
+from .engine import Collector
+from .tracing import tracer
+
+DEFAULT_PORT = 9650
+MAX_FRAME = 16 * 1024 * 1024
+AGENT_TOP_PROCS = 50  # per host, enough for any sensible fleet-wide top-N
+
+_HEAD = struct.Struct('>I')
+
+
+def encode(msg):
+    body = zlib.compress(json.dumps(msg, separators=(',', ':'), default=str).encode('utf-8'))
+    return _HEAD.pack(len(body)) + body
+
+
+async def read_msg(reader):
+    """Next message off the stream, or None when the other end hangs up."""
+    try:
+        head = await reader.readexactly(_HEAD.size)
+        size = _HEAD.unpack(head)[0]
+        if size > MAX_FRAME:
+            raise ValueError(f"frame too big ({size} bytes)")
+        body = await reader.readexactly(size)
+    except asyncio.IncompleteReadError:
+        return None
+    return json.loads(zlib.decompress(body))
+
+
+def parse_address(addr):
+    """'host:port', 'tcp://host:port', 'unix:///path' or '/path' -> ('tcp', host, port) / ('unix', path)."""
+    if addr.startswith('unix://'):
+        return ('unix', addr[len('unix://'):])
+    if addr.startswith('/') or addr.startswith('./'):
+        return ('unix', addr)
+    if addr.startswith('tcp://'):
+        addr = addr[len('tcp://'):]
+    host, _, port = addr.rpartition(':')
+    return ('tcp', host or '127.0.0.1', int(port or DEFAULT_PORT))
+
+
+async def connect(addr):
+    where = parse_address(addr)
+    if where[0] == 'unix':
+        return await asyncio.open_unix_connection(where[1])
+    return await asyncio.open_connection(where[1], where[2])
+
+
+def compact(snap):
+    """The bits of a Snapshot the aggregator cares about, small enough to send often."""
+    data = snap.to_dict()
+    # Swap the display list for a bigger one sorted by RSS, so fleet-wide
+    # top-N by memory is exact for N up to AGENT_TOP_PROCS
+    table = collectors.process_table(create=False) if collectors.has_psutil else None
+    if table is not None:
+        data['procs'] = [e.record()._asdict() for e in table.top(AGENT_TOP_PROCS, 'rss')]
+    return data
+
+
+def _number(v):
+    return isinstance(v, Number) and not isinstance(v, bool)
+
+
+def _rows(rows, numbers):
+    # Only dict rows whose numbers really are numbers (or missing)
+    return [r for r in rows if isinstance(r, dict)
+            and all(r.get(k) is None or _number(r[k]) for k in numbers)]
+
+
+# Fields the queries compare, checked once on arrival
+DISK_NUMBERS = ('percent', 'total', 'used', 'free')
+PROC_NUMBERS = ('pid', 'mem', 'cpu', 'rss', 'uss', 'cpu_time', 'threads', 'handles',
+                'read_bytes', 'write_bytes', 'io_bps', 'ppid')
+
+
+def check_snapshot(msg):
+    """(host, data) out of a snapshot message, ValueError if it isn't one.
+
+    Any agent can connect, so nothing is trusted: disk and process rows
+    that are the wrong shape are dropped here rather than tripping up a
+    fleet-wide query later."""
+    host, data = msg.get('host'), msg.get('data')
+    if not isinstance(host, str) or not host:
+        raise ValueError("snapshot without a host")
+    if not isinstance(data, dict):
+        raise ValueError(f"snapshot from {host} without data")
+    for name, numbers in (('disks', DISK_NUMBERS), ('procs', PROC_NUMBERS)):
+        rows = data.get(name)
+        if rows is None:
+            continue
+        if not isinstance(rows, list):
+            raise ValueError(f"{name} from {host} isn't a list")
+        data[name] = _rows(rows, numbers)
+    return host, data
+
+
+class HostState:
+    __slots__ = ('host', 'snapshot', 'received', 'peer', 'max_disk')
+
+    def __init__(self, host):
+        self.host = host
+        self.snapshot = None
+        self.received = 0.0
+        self.peer = None
+        self.max_disk = 0.0
+
+
+class Aggregator:
+    """Holds the latest snapshot from every agent and answers questions about them."""
+
+    def __init__(self):
+        self.hosts = {}
+        self.connections = 0
+        self.received = 0
+        self.rejected = 0  # messages that didn't make sense
+        self.queries = {
+            'hosts': self.q_hosts,
+            'disks_over': self.q_disks_over,
+            'top_procs': self.q_top_procs,
+            'stale': self.q_stale,
+            'snapshot': self.q_snapshot,
+        }
+
+    def update(self, host, data, peer=None):
+        st = self.hosts.get(host)
+        if st is None:
+            st = self.hosts[host] = HostState(host)
+        st.snapshot = data
+        st.received = time.time()
+        st.peer = peer
+        # Worked out once on arrival so disk queries don't walk every disk
+        st.max_disk = max((d.get('percent') or 0 for d in data.get('disks') or [] if 'percent' in d),
+                          default=0.0)
+        self.received += 1
+
+    # Queries - all answered from memory
+    def q_hosts(self):
+        now = time.time()
+        return [{'host': h, 'age': now - st.received, 'max_disk': st.max_disk}
+                for h, st in sorted(self.hosts.items())]
+
+    def q_disks_over(self, percent=90):
+        out = []
+        for h, st in self.hosts.items():
+            if st.max_disk <= percent:
+                continue
+            for d in st.snapshot.get('disks') or []:
+                if (d.get('percent') or 0) > percent:
+                    out.append({'host': h, 'drive': d.get('drive'), 'mount': d.get('mount'),
+                                'percent': d.get('percent')})
+        out.sort(key=lambda d: d['percent'], reverse=True)
+        return out
+
+    def q_top_procs(self, n=20, key='rss'):
+        def rows():
+            for h, st in self.hosts.items():
+                for p in st.snapshot.get('procs') or []:
+                    if _number(p.get(key)):
+                        yield dict(p, host=h)
+        return heapq.nlargest(n, rows(), key=lambda p: p[key])
+
+    def q_stale(self, seconds=300):
+        cutoff = time.time() - seconds
+        return sorted(h for h, st in self.hosts.items() if st.received < cutoff)
+
+    def q_snapshot(self, host):
+        st = self.hosts.get(host)
+        return st.snapshot if st else None
+
+    def answer(self, msg):
+        fn = self.queries.get(msg.get('q'))
+        if fn is None:
+            return {'type': 'reply', 'ok': False, 'error': f"unknown query {msg.get('q')!r}"}
+        try:
+            return {'type': 'reply', 'ok': True, 'result': fn(**(msg.get('args') or {}))}
+        except Exception as e:
+            return {'type': 'reply', 'ok': False, 'error': str(e)}
+
+    async def handle(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        self.connections += 1
+        try:
+            while True:
+                msg = await read_msg(reader)
+                if msg is None:
+                    break
+                kind = msg.get('type') if isinstance(msg, dict) else None
+                if kind == 'snapshot':
+                    try:
+                        host, data = check_snapshot(msg)
+                    except ValueError as e:
+                        # One bad message doesn't cost the agent its connection
+                        tracer.swallowed('fleet snapshot', e)
+                        self.rejected += 1
+                        continue
+                    self.update(host, data, peer)
+                elif kind == 'query':
+                    writer.write(encode(self.answer(msg)))
+                    await writer.drain()
+                else:
+                    tracer.swallowed('fleet message', ValueError(f"unknown message type {kind!r}"))
+                    self.rejected += 1
+        except (ConnectionError, ValueError, zlib.error):
+            pass  # bad or broken client, just drop it
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def start(self, addr):
+        where = parse_address(addr)
+        if where[0] == 'unix':
+            return await asyncio.start_unix_server(self.handle, path=where[1])
+        return await asyncio.start_server(self.handle, where[1], where[2], backlog=1024)
+
+
+async def run_agent(addr, interval=10.0, count=None, host=None, collector=None):
+    """Scan every interval seconds and push it to the aggregator at addr.
+
+    Reconnects (with backoff) if the aggregator goes away. count stops
+    after that many snapshots have been sent.
+    """
+    host = host or platform.node()
+    collector = collector or Collector()
+    loop = asyncio.get_running_loop()
+    sent = 0
+    backoff = 1.0
+    writer = None
+
+    while count is None or sent < count:
+        started = time.monotonic()
+        try:
+            if writer is None:
+                _, writer = await connect(addr)
+                backoff = 1.0
+            # Scans block, keep them off the event loop
+            snap = await loop.run_in_executor(None, collector.scan)
+            writer.write(encode({'type': 'snapshot', 'host': host, 'data': compact(snap)}))
+            await writer.drain()
+            sent += 1
+        except (ConnectionError, OSError):
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+            continue
+
+        if count is None or sent < count:
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    if writer is not None:
+        writer.close()
+    return sent
+
+
+async def ask(addr, q, **args):
+    reader, writer = await connect(addr)
+    try:
+        writer.write(encode({'type': 'query', 'q': q, 'args': args}))
+        await writer.drain()
+        reply = await read_msg(reader)
+    finally:
+        writer.close()
+    if reply is None:
+        raise ConnectionError("aggregator hung up")
+    if not reply.get('ok'):
+        raise ValueError(reply.get('error'))
+    return reply['result']
+
+
+def run(coro):
+    # asyncio.run() without needing 3.7
+    loop = asyncio.new_event_loop()
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def query(addr, q, **args):
+    """Blocking version of ask() for scripts and the command line."""
+    return run(ask(addr, q, **args))
+
+
+def serve(addr, agg=None):
+    """Run an aggregator on addr until Ctrl+C."""
+    agg = agg or Aggregator()
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    server = loop.run_until_complete(agg.start(addr))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+        loop.close()
+    return agg
@@ -0,0 +1,530 @@
+# formatting.py - turns scan data into the text we show and save
+#
+# The collectors hand back raw numbers (records.py); this is the only
+# place they become "12.3 GB" or "45.0%".
+
+import time
+from datetime import datetime
+
+from .rules import check_snapshot
+
+GB = 1024 ** 3
+MB = 1024 ** 2
+
+
+def gb(n):
+    return f"{n / GB:.1f} GB"
+
+
+def size(n):
+    sign = '-' if n < 0 else ''
+    n = abs(n)
+    for unit, scale in (('GB', GB), ('MB', MB), ('KB', 1024)):
+        if n >= scale:
+            return f"{sign}{n / scale:.1f} {unit}"
+    return f"{sign}{n} B"
+
+
+def cputime(secs):
+    # Like top's TIME column, h:mm:ss
+    secs = int(secs)
+    return f"{secs // 3600}:{secs % 3600 // 60:02}:{secs % 60:02}"
+
+
+def rate(bps):
+    # bytes per second, scaled to something readable
+    for unit, size in (('GB/s', GB), ('MB/s', MB), ('KB/s', 1024)):
+        if bps >= size:
+            return f"{bps / size:.1f} {unit}"
+    return f"{bps:.0f} B/s"
+
+
+def percent(v):
+    return f"{v:.1f}%" if v is not None else "?"
+
+
+def uptime(boot_time, now=None):
+    secs = int((now or time.time()) - boot_time)
+    days, secs = divmod(secs, 86400)
+    return f"{days}d {secs // 3600}h {secs % 3600 // 60}m"
+
+
+def sys_rows(sys_info, now=None):
+    # (label, text) pairs, in the order they're shown
+    if sys_info is None:
+        return []
+    rows = [('OS', sys_info.os), ('Version', sys_info.version),
+            ('Edition', sys_info.edition or "Unknown")]
+    if sys_info.boot_time:
+        rows.append(('Uptime', uptime(sys_info.boot_time, now)))
+    rows.append(('Python', sys_info.python))
+    return rows
+
+
+def hw_rows(hw):
+    if hw is None:
+        return []
+    rows = [('CPU Cores', hw.cpu_cores), ('CPU Physical', hw.cpu_physical),
+            ('CPU Usage', percent(hw.cpu_percent))]
+    if hw.cpu_mhz:
+        rows.append(('CPU Speed', f"{hw.cpu_mhz:.0f} MHz"))
+    rows += [('Total RAM', gb(hw.mem_total)), ('Used RAM', gb(hw.mem_used)),
+             ('RAM %', percent(hw.mem_percent))]
+    if hw.swap_total:
+        rows.append(('Swap', f"{hw.swap_used / GB:.1f} / {hw.swap_total / GB:.1f} GB"))
+    return rows
+
+
+def net_lines(nics):
+    if not nics:
+        return []
+    sent = sum(n.sent_bps for n in nics)
+    recv = sum(n.recv_bps for n in nics)
+    lines = [f"Total sent {sum(n.bytes_sent for n in nics) / MB:.1f} MB, "
+             f"received {sum(n.bytes_recv for n in nics) / MB:.1f} MB",
+             f"Right now: up {rate(sent)}, down {rate(recv)}", ""]
+
+    for n in nics:
+        link = ["up" if n.is_up else "down"]
+        if n.speed:
+            link.append(f"{n.speed} Mbps")
+        if n.mtu:
+            link.append(f"MTU {n.mtu}")
+        lines.append(f"{n.name} ({', '.join(link)})")
+        for ip in n.ipv4:
+            lines.append(f"  IPv4: {ip}")
+        for ip in n.ipv6:
+            lines.append(f"  IPv6: {ip}")
+        if n.mac:
+            lines.append(f"  MAC: {n.mac}")
+        lines.append(f"  Traffic: up {rate(n.sent_bps)}, down {rate(n.recv_bps)} "
+                     f"({n.packets_sent_ps:.0f} / {n.packets_recv_ps:.0f} packets/s)")
+        lines.append(f"  Total: {n.bytes_sent / MB:.1f} MB sent, {n.bytes_recv / MB:.1f} MB received")
+        if n.errin or n.errout or n.dropin or n.dropout:
+            lines.append(f"  Errors: {n.errin} in, {n.errout} out   Drops: {n.dropin} in, {n.dropout} out")
+        lines.append("")
+    return lines
+
+
+# The tab builders collect lines in a list and join once at the end -
+# with thousands of rows, repeated += on a str gets expensive.
+
+def overview_text(sys_info, hw_info, timings=None):
+    lines = ["=== System Overview ===", ""]
+    for k, v in sys_rows(sys_info):
+        lines.append(f"{k}: {v}")
+
+    lines += ["", "=== Hardware ==="]
+    for k, v in hw_rows(hw_info):
+        lines.append(f"{k}: {v}")
+
+    if timings:
+        lines += ["", "=== Scan Timings ==="]
+        for k, v in timings.items():
+            lines.append(f"{k:6}: {v * 1000:.0f} ms")
+
+    return "\n".join(lines) + "\n"
+
+
+def hardware_text(hw_info):
+    lines = ["=== Hardware Details ===", ""]
+    for k, v in hw_rows(hw_info):
+        lines.append(f"{k:15}: {v}")
+    return "\n".join(lines) + "\n"
+
+
+def storage_text(disk_info, disk_io=None):
+    lines = ["=== Disk Drives ===", ""]
+    for d in disk_info:
+        lines.append(f"{d.drive} ({d.fstype})")
+        lines.append(f"  Mount: {d.mount}")
+        if d.error:
+            lines.append(f"  Unreachable: {d.error}")
+            lines.append("")
+            continue
+        lines.append(f"  Size: {gb(d.total)}")
+        lines.append(f"  Used: {gb(d.used)} ({d.percent}%)")
+        lines.append(f"  Free: {gb(d.free)}")
+        lines.append("")
+
+    if disk_io:
+        lines += ["=== Disk Activity ===", ""]
+        lines += disk_io_lines(disk_io)
+    return "\n".join(lines) + "\n"
+
+
+def disk_io_lines(disk_io):
+    # Busiest first, so a saturated disk is at the top
+    lines = [f"{'Device':14} {'Read':>11} {'Write':>11} {'R IOPS':>8} {'W IOPS':>8} "
+             f"{'R ms':>6} {'W ms':>6} {'Busy':>6}"]
+    lines.append("-" * 77)
+    rows = sorted(disk_io, key=lambda d: (d.busy or 0, d.read_bps + d.write_bps), reverse=True)
+    for d in rows:
+        busy = f"{d.busy:5.1f}%" if d.busy is not None else "     -"
+        lines.append(f"{d.device[:14]:14} {rate(d.read_bps):>11} {rate(d.write_bps):>11} "
+                     f"{d.read_iops:8.1f} {d.write_iops:8.1f} {d.read_ms:6.1f} {d.write_ms:6.1f} {busy}")
+    return lines
+
+
+# Process columns: (field, heading, width, how to show it)
+PROC_COLUMNS = (
+    ('mem', "Mem %", 6, lambda v: f"{v:.2f}"),
+    ('cpu', "CPU %", 6, lambda v: f"{v:.1f}"),
+    ('rss', "RSS", 9, size),
+    ('uss', "USS", 9, size),
+    ('cpu_time', "CPU time", 9, cputime),
+    ('threads', "Thr", 4, str),
+    ('handles', "Handles", 7, str),
+    ('io_bps', "I/O", 10, rate),
+    ('ppid', "Parent", 7, str),
+)
+PROC_SHOW = {f: show for f, _, _, show in PROC_COLUMNS}
+
+
+def proc_cell(field, v):
+    # One process table cell as text (the GUI's table uses this too)
+    if v is None:
+        return "-"
+    show = PROC_SHOW.get(field)
+    return show(v) if show else str(v)
+
+
+def procs_text(proc_info, key='mem'):
+    heading = dict((f, h) for f, h, _, _ in PROC_COLUMNS).get(key, key)
+    lines = [f"=== Top Processes (by {heading}) ===", ""]
+    # Whole names, the column's as wide as the longest one
+    width = max([16] + [len(p.name) for p in proc_info])
+    head = f"{'PID':>8}  {'Name':{width}}"
+    for _, title, w, _ in PROC_COLUMNS:
+        head += f" {title:>{w}}"
+    lines.append(head)
+    lines.append("-" * len(head))
+
+    for p in proc_info:
+        row = f"{p.pid:8}  {p.name:{width}}"
+        for field, _, w, show in PROC_COLUMNS:
+            v = getattr(p, field)
+            row += f" {show(v) if v is not None else '-':>{w}}"
+        if p.service:
+            row += f"  [{p.service}]"
+        lines.append(row)
+    return "\n".join(lines) + "\n"
+
+
+def proc_groups_text(groups, by='name', key='rss'):
+    heading = dict((f, h) for f, h, _, _ in PROC_COLUMNS).get(key, key)
+    lines = [f"=== Processes by {'service' if by == 'service' else 'program'} (by {heading}) ===", ""]
+    width = max([16] + [len(g.name) for g in groups])
+    lines.append(f"{'Name':{width}} {'Count':>5} {'Mem %':>6} {'CPU %':>6} {'RSS':>9} "
+                 f"{'CPU time':>9} {'Thr':>5} {'Handles':>7} {'I/O':>10}")
+    lines.append("-" * (width + 66))
+    for g in groups:
+        lines.append(f"{g.name:{width}} {g.count:5} {g.mem:6.2f} {g.cpu:6.1f} {size(g.rss):>9} "
+                     f"{cputime(g.cpu_time):>9} {g.threads:5} {g.handles:7} {rate(g.io_bps):>10}")
+    return "\n".join(lines) + "\n"
+
+
+def network_text(net_info):
+    lines = ["=== Network ===", ""]
+    lines += net_lines(net_info)
+    return "\n".join(lines) + "\n"
+
+
+def system_text(sys_info):
+    # Short version for the quick info box
+    text = "=== System Info ===\n\n"
+    for k, v in sys_rows(sys_info):
+        text += f"{k}: {v}\n"
+    return text
+
+
+def disks_text(disk_info):
+    # Short version for the quick info box
+    text = "=== Disks ===\n\n"
+    for d in disk_info:
+        if d.error:
+            text += f"{d.drive}: unreachable ({d.error})\n\n"
+            continue
+        text += f"{d.drive}: {d.percent}% used\n"
+        text += f"  Free: {gb(d.free)}\n\n"
+    return text
+
+
+def summary_text(snap):
+    info_text = f"Last scan: {datetime.fromtimestamp(snap.taken).strftime('%H:%M:%S')}\n"
+    info_text += f"OS: {snap.sys.os if snap.sys else '?'}\n"
+
+    if snap.hw:
+        info_text += f"RAM: {gb(snap.hw.mem_total)}\n"
+
+    if snap.disks:
+        info_text += f"Total disk: {gb(sum(d.total for d in snap.disks if d.total))}\n"
+
+    if snap.timings:
+        slowest = max(snap.timings, key=snap.timings.get)
+        info_text += f"Slowest check: {slowest} ({snap.timings[slowest]:.2f}s)\n"
+
+    return info_text
+
+
+def value_lines(value, indent=""):
+    # Plugin answers are plain json: dicts as "key: value", lists a line each
+    lines = []
+    if isinstance(value, dict):
+        for k, v in value.items():
+            if isinstance(v, (dict, list)):
+                lines.append(f"{indent}{k}:")
+                lines += value_lines(v, indent + "  ")
+            else:
+                lines.append(f"{indent}{k}: {v}")
+    elif isinstance(value, list):
+        for v in value:
+            if isinstance(v, dict):
+                lines.append(indent + "  ".join(f"{k}={x}" for k, x in v.items()))
+            else:
+                lines.append(f"{indent}{v}")
+    else:
+        lines.append(f"{indent}{value}")
+    return lines
+
+
+def extra_text(extra, errors=None):
+    """What the plugin collectors found (Snapshot.extra), each under its title."""
+    from .plugins import registry
+    from .snapshot import SECTIONS
+
+    failed = {n: e for n, e in (errors or {}).items() if n not in SECTIONS and n not in extra}
+    if not extra and not failed:
+        return "No extra checks ran\n"
+    lines = []
+    for name in sorted(set(extra) | set(failed)):
+        spec = registry.get(name) if name in registry else None
+        title = spec.title if spec else name
+        lines.append(title.upper())
+        lines.append("-" * 30)
+        if name in failed:
+            lines.append(f"Failed: {failed[name]}")
+        elif spec is not None and spec.render is not None:
+            lines += spec.render(extra[name]).rstrip("\n").split("\n")
+        else:
+            lines += value_lines(extra[name])
+        lines.append("")
+    return "\n".join(lines)
+
+
+def diagnostics_text(report, cache_stats=None):
+    # Tracer report (and cache stats) -> what the Diagnostics tab shows
+    if not report:
+        return "Nothing traced yet - run a scan first\n"
+
+    lines = ["=== Collector Timings ===", ""]
+    lines.append(f"{'collector':16} {'runs':>5} {'last ms':>9} {'last cpu':>9} {'avg ms':>9} {'errors':>7}")
+    lines.append("-" * 60)
+    for name, st in sorted(report.items()):
+        avg = st['wall_s'] / st['runs'] * 1000 if st['runs'] else 0
+        lines.append(f"{name:16} {st['runs']:5} {st['last_wall_s'] * 1000:9.1f} "
+                     f"{st['last_cpu_s'] * 1000:9.1f} {avg:9.1f} {st['errors']:7}")
+
+    lines += ["", "=== psutil Calls ==="]
+    for name, st in sorted(report.items()):
+        if not st['calls']:
+            continue
+        lines += ["", name]
+        calls = sorted(st['calls'].items(), key=lambda kv: kv[1]['seconds'], reverse=True)
+        for api, c in calls:
+            lines.append(f"  {api:28} x{c['count']:<7} {c['seconds'] * 1000:9.1f} ms")
+
+    swallowed = [(name, s) for name, st in sorted(report.items()) for s in st['swallowed']]
+    lines += ["", "=== Swallowed Errors ==="]
+    if not swallowed:
+        lines.append("None")
+    for name, s in swallowed:
+        lines.append(f"{name}: {s['where']} - {s['type']} x{s['count']}")
+        for ex in s['examples'][:2]:
+            lines.append(f"    {ex}")
+
+    if cache_stats:
+        lines += ["", "=== Metric Cache ==="]
+        lines.append(f"{'metric':16} {'hits':>6} {'misses':>7} {'ttl':>8} {'age':>8}")
+        for key, c in cache_stats.items():
+            ttl = "forever" if c['ttl'] == float('inf') else f"{c['ttl']:g}s"
+            age = f"{c['age']:.1f}s" if c['age'] is not None else ("loading" if c.get('loading') else "-")
+            lines.append(f"{key:16} {c['hits']:6} {c['misses']:7} {ttl:>8} {age:>8}")
+
+    return "\n".join(lines) + "\n"
+
+
+# What each section's changes look like in a diff - fields worth showing
+# and what to call a row
+DIFF_TITLES = (('sys', "SYSTEM"), ('hw', "HARDWARE"), ('disks', "STORAGE"), ('diskio', "DISK ACTIVITY"),
+               ('procs', "PROCESSES"), ('net', "NETWORK"))
+DIFF_FIELDS = {
+    'disks': ('percent', 'used', 'free', 'total', 'fstype', 'error'),
+    'diskio': ('busy',),
+    'procs': ('rss', 'mem'),
+    'net': ('is_up', 'speed', 'mtu', 'mac', 'ipv4', 'ipv6', 'errin', 'errout', 'dropin', 'dropout'),
+}
+DIFF_LABELS = {
+    'disks': lambda d: f"{d.mount} ({d.drive})",
+    'diskio': lambda d: d.device,
+    'procs': lambda p: f"{p.pid} {p.name}",
+    'net': lambda n: n.name,
+}
+BYTE_FIELDS = ('mem_total', 'mem_used', 'swap_total', 'swap_used', 'total', 'used', 'free', 'rss',
+               'bytes_sent', 'bytes_recv')
+
+
+def field_text(field, v):
+    if v is None:
+        return "-"
+    if field in BYTE_FIELDS:
+        return size(v)
+    if field == 'boot_time':
+        return datetime.fromtimestamp(v).strftime('%Y-%m-%d %H:%M')
+    if field.endswith('percent') or field in ('mem', 'busy'):
+        return f"{v:.1f}%"
+    if isinstance(v, float):
+        return f"{v:.2f}"
+    if isinstance(v, list):
+        return ", ".join(map(str, v)) or "none"
+    return str(v)
+
+
+def change_text(ch):
+    text = f"{ch.field}: {field_text(ch.field, ch.old)} -> {field_text(ch.field, ch.new)}"
+    if ch.delta is not None and ch.field != 'boot_time':
+        d = field_text(ch.field, ch.delta)
+        text += f" ({d if d.startswith('-') else '+' + d})"
+    return text
+
+
+def diff_text(d, limit=15):
+    # SnapshotDiff -> what the CLI prints and the Compare window shows
+    def when(snap):
+        return f"{snap.host} at {datetime.fromtimestamp(snap.taken).strftime('%Y-%m-%d %H:%M:%S')}"
+
+    lines = [f"=== Changes from {when(d.old)} to {when(d.new)} ===", ""]
+    if not d:
+        return "\n".join(lines + ["Nothing changed"]) + "\n"
+
+    for name, title in DIFF_TITLES:
+        sec = d.sections.get(name)
+        if sec is None:
+            continue
+        fields = DIFF_FIELDS.get(name)
+        label = DIFF_LABELS.get(name)
+
+        changed = []
+        for c in sec.changed:
+            shown = [ch for ch in c.changes if fields is None or ch.field in fields]
+            if shown:
+                changed.append((c, shown))
+        if not (sec.added or sec.removed or changed):
+            continue
+
+        head = title
+        if label and (sec.added or sec.removed):
+            head += f" ({len(sec.added)} new, {len(sec.removed)} gone)"
+        lines.append(head)
+        lines.append("-" * 30)
+
+        if label:
+            for mark, rows in (('+', sec.added), ('-', sec.removed)):
+                if name == 'procs':
+                    rows = sorted(rows, key=lambda p: p.rss or 0, reverse=True)
+                for r in rows[:limit]:
+                    extra = f"  {size(r.rss)}" if name == 'procs' and r.rss else ""
+                    lines.append(f"  {mark} {label(r)}{extra}")
+                if len(rows) > limit:
+                    lines.append(f"    ...and {len(rows) - limit} more")
+
+        # Biggest moves first
+        changed.sort(key=lambda cs: max(abs(ch.delta) if ch.delta is not None else 0 for ch in cs[1]),
+                     reverse=True)
+        for c, shown in changed[:limit]:
+            if label:
+                lines.append(f"  {label(c.new)}")
+            for ch in shown:
+                lines.append(f"    {change_text(ch)}")
+        if len(changed) > limit:
+            lines.append(f"    ...and {len(changed) - limit} more changed")
+        lines.append("")
+
+    return "\n".join(lines) + "\n"
+
+
+def get_notes(snap, rules=None):
+    notes = [a.text() for a in check_snapshot(snap, rules)]
+    for d in snap.disks or ():
+        if d.error:
+            notes.append(f"Couldn't read drive {d.drive} ({d.error})")
+
+    if not notes:
+        notes.append("System looks okay")
+
+    notes.append("Keep Windows updated")
+    notes.append("Back up important files regularly")
+
+    return notes
+
+
+def report_text(snap):
+    # The plain text report that Save Report writes out
+    lines = []
+    lines.append("PC Diagnostic Report")
+    lines.append("=" * 50)
+    lines.append(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    lines.append(f"Computer: {snap.host or 'Unknown'}")
+    lines.append("=" * 50 + "\n")
+
+    # System
+    lines.append("SYSTEM")
+    lines.append("-" * 30)
+    for k, v in sys_rows(snap.sys, snap.taken):
+        lines.append(f"{k}: {v}")
+
+    # Hardware
+    lines.append("\n\nHARDWARE")
+    lines.append("-" * 30)
+    for k, v in hw_rows(snap.hw):
+        lines.append(f"{k}: {v}")
+
+    # Disks
+    lines.append("\n\nSTORAGE")
+    lines.append("-" * 30)
+    for d in snap.disks or ():
+        if d.error:
+            lines.append(f"{d.drive}: unreachable ({d.error})")
+            continue
+        lines.append(f"{d.drive}: {d.percent}% used")
+        lines.append(f"  Free: {gb(d.free)}")
+    if snap.diskio:
+        lines.append("")
+        lines += disk_io_lines(snap.diskio)
+
+    # Processes
+    lines.append("\n\nRUNNING PROGRAMS")
+    lines.append("-" * 30)
+    for p in snap.procs or ():
+        # Older exports and recordings may not have every field
+        mem = f"{p.mem:6.2f}%" if p.mem is not None else f"{'-':>7}"
+        lines.append(f"{p.pid:8}  {p.name or '?':30}  {mem} mem  {proc_cell('rss', p.rss)}")
+
+    # Network
+    lines.append("\n\nNETWORK")
+    lines.append("-" * 30)
+    lines += net_lines(snap.net)
+
+    # Anything the plugins found
+    if snap.extra:
+        lines.append("\n\nEXTRA CHECKS")
+        lines.append("-" * 30)
+        lines += extra_text(snap.extra).rstrip("\n").split("\n")
+
+    # Recommendations
+    lines.append("\n\nNOTES")
+    lines.append("-" * 30)
+    for note in get_notes(snap):
+        lines.append(f"• {note}")
+
+    return "\n".join(lines) + "\n"
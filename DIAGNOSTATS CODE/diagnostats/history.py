@@ -0,0 +1,245 @@
+# history.py - remembers scans and samples between runs, in SQLite
+#
+# Three kinds of data, each with its own retention:
+#   snapshots  every full scan, compressed, for looking back at / diffing
+#   samples    one row per metric per minute (the sampler's 1 Hz readings
+#              are averaged down before they get here)
+#   rollups    hourly min/max/mean of samples too old to keep per minute
+#
+# Everything is indexed by (host, metric, time), so a trend over any range
+# is one index scan grouped down to however many points you want to draw,
+# and nothing ever has to be loaded whole.
+
+import json
+import os
+import platform
+import sqlite3
+import threading
+import time
+import zlib
+
+from .rules import snapshot_metrics
+from .snapshot import Snapshot
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.diagnostats', 'history.db')
+
+RESOLUTION = 60      # seconds per stored sample
+ROLLUP = 3600        # seconds per rollup bucket
+RAW_DAYS = 30        # per-minute samples are kept this long...
+ROLLUP_DAYS = 400    # ...hourly rollups this long...
+SNAPSHOT_DAYS = 30   # ...and whole scans this long
+MAINTAIN_EVERY = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS metrics (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS samples (
+    host INTEGER NOT NULL, metric INTEGER NOT NULL, ts INTEGER NOT NULL, value REAL NOT NULL,
+    PRIMARY KEY (host, metric, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollups (
+    host INTEGER NOT NULL, metric INTEGER NOT NULL, ts INTEGER NOT NULL,
+    count INTEGER NOT NULL, total REAL NOT NULL, lo REAL NOT NULL, hi REAL NOT NULL,
+    PRIMARY KEY (host, metric, ts)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY, host INTEGER NOT NULL, ts REAL NOT NULL, errors INTEGER NOT NULL, data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_by_time ON snapshots (host, ts);
+"""
+
+
+class History:
+    """On-disk store of scans and per-minute metrics for one or more hosts.
+
+    Safe to share between threads (the sampler's listener and the GUI).
+    """
+
+    def __init__(self, path=DEFAULT_PATH, host=None, raw_days=RAW_DAYS,
+                 rollup_days=ROLLUP_DAYS, snapshot_days=SNAPSHOT_DAYS):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.host = host or platform.node()
+        self.raw_days = raw_days
+        self.rollup_days = rollup_days
+        self.snapshot_days = snapshot_days
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._ids = {'hosts': {}, 'metrics': {}}
+        self._minute = {}  # metric -> [bucket, total, count] for the minute being filled
+        self._maintained = 0.0
+
+    def close(self):
+        with self._lock:
+            self._flush_minutes(force=True)
+            self._db.close()
+
+    def _id(self, table, name, create=True):
+        # hosts/metrics are stored once and referred to by number
+        cache = self._ids[table]
+        i = cache.get(name)
+        if i is None:
+            if create:
+                self._db.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            row = self._db.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                return None
+            i = cache[name] = row[0]
+        return i
+
+    # Writing
+    def add_snapshot(self, snap):
+        """Store a whole scan, plus its numbers as samples."""
+        body = zlib.compress(json.dumps(snap.to_dict(), separators=(',', ':'), default=str).encode('utf-8'))
+        host = snap.host or self.host
+        with self._lock, self._db:
+            hid = self._id('hosts', host)
+            self._db.execute("INSERT INTO snapshots (host, ts, errors, data) VALUES (?, ?, ?, ?)",
+                             (hid, snap.taken, len(snap.errors or ()), body))
+            bucket = int(snap.taken // RESOLUTION * RESOLUTION)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?)",
+                [(hid, self._id('metrics', m), bucket, v) for m, v in snapshot_metrics(snap).items()])
+        self._maybe_maintain()
+
+    def on_sample(self, ts, values):
+        """Sampler listener: averages readings into one row per metric per minute."""
+        bucket = int(ts // RESOLUTION * RESOLUTION)
+        with self._lock:
+            self._flush_minutes(before=bucket)
+            for name, v in values.items():
+                cur = self._minute.get(name)
+                if cur is None:
+                    cur = self._minute[name] = [bucket, 0.0, 0]
+                cur[1] += v
+                cur[2] += 1
+        self._maybe_maintain()
+
+    def flush(self):
+        with self._lock:
+            self._flush_minutes(force=True)
+
+    def _flush_minutes(self, before=None, force=False):
+        # Write out every metric whose minute is over (or all of them)
+        done = [(name, cur) for name, cur in self._minute.items()
+                if force or (before is not None and cur[0] < before)]
+        if not done:
+            return
+        with self._db:
+            hid = self._id('hosts', self.host)
+            self._db.executemany(
+                "INSERT OR REPLACE INTO samples VALUES (?, ?, ?, ?)",
+                [(hid, self._id('metrics', name), cur[0], cur[1] / cur[2]) for name, cur in done])
+        for name, cur in done:
+            if self._minute.get(name) is cur:
+                del self._minute[name]
+
+    # Reading
+    def hosts(self):
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT name FROM hosts ORDER BY name")]
+
+    def metrics(self, host=None):
+        """Metric names that have data for host."""
+        with self._lock:
+            hid = self._id('hosts', host or self.host, create=False)
+            if hid is None:
+                return []
+            rows = self._db.execute(
+                "SELECT name FROM metrics m WHERE EXISTS (SELECT 1 FROM samples WHERE host = ? AND metric = m.id) "
+                "OR EXISTS (SELECT 1 FROM rollups WHERE host = ? AND metric = m.id) ORDER BY name", (hid, hid))
+            return [r[0] for r in rows]
+
+    def query(self, metric, start=None, end=None, host=None, step=None):
+        """[(ts, mean, min, max)] for metric between start and end (unix times).
+
+        step groups the points into buckets that many seconds wide (pick
+        range / pixels to get one point per pixel). Ranges reaching back
+        past the per-minute data are filled in from the hourly rollups.
+        """
+        end = time.time() if end is None else end
+        start = 0 if start is None else start
+        step = max(int(step or RESOLUTION), 1)
+        with self._lock:
+            hid = self._id('hosts', host or self.host, create=False)
+            mid = self._id('metrics', metric, create=False)
+            if hid is None or mid is None:
+                return []
+            raw = self._db.execute(
+                "SELECT ts / :step * :step AS b, AVG(value), MIN(value), MAX(value) FROM samples "
+                "WHERE host = :h AND metric = :m AND ts BETWEEN :a AND :z GROUP BY b ORDER BY b",
+                {'step': step, 'h': hid, 'm': mid, 'a': int(start), 'z': int(end)}).fetchall()
+            first_raw = raw[0][0] if raw else int(end) + 1
+            old = self._db.execute(
+                "SELECT ts / :step * :step AS b, SUM(total) / SUM(count), MIN(lo), MAX(hi) FROM rollups "
+                "WHERE host = :h AND metric = :m AND ts BETWEEN :a AND :z AND ts < :cut GROUP BY b ORDER BY b",
+                {'step': step, 'h': hid, 'm': mid, 'a': int(start), 'z': int(end), 'cut': first_raw}).fetchall()
+        return old + raw
+
+    def snapshots(self, host=None, start=None, end=None, limit=100):
+        """[(id, ts, error count)] newest first."""
+        with self._lock:
+            hid = self._id('hosts', host or self.host, create=False)
+            if hid is None:
+                return []
+            return self._db.execute(
+                "SELECT id, ts, errors FROM snapshots WHERE host = ? AND ts BETWEEN ? AND ? "
+                "ORDER BY ts DESC LIMIT ?",
+                (hid, start or 0, end if end is not None else time.time() + 1, limit)).fetchall()
+
+    def snapshot(self, snap_id):
+        with self._lock:
+            row = self._db.execute("SELECT data FROM snapshots WHERE id = ?", (snap_id,)).fetchone()
+        return Snapshot.from_dict(json.loads(zlib.decompress(row[0]))) if row else None
+
+    def latest_snapshot(self, host=None, before=None, clean=False):
+        """Most recent stored scan (optionally only ones with no errors)."""
+        with self._lock:
+            hid = self._id('hosts', host or self.host, create=False)
+            if hid is None:
+                return None
+            row = self._db.execute(
+                "SELECT data FROM snapshots WHERE host = ? AND ts < ? AND (? = 0 OR errors = 0) "
+                "ORDER BY ts DESC LIMIT 1",
+                (hid, before if before is not None else time.time() + 1, 1 if clean else 0)).fetchone()
+        return Snapshot.from_dict(json.loads(zlib.decompress(row[0]))) if row else None
+
+    # Housekeeping
+    def _maybe_maintain(self):
+        if time.time() - self._maintained >= MAINTAIN_EVERY:
+            self.maintain()
+
+    def maintain(self, now=None):
+        """Roll old minutes up into hours and drop what's past retention."""
+        now = time.time() if now is None else now
+        self._maintained = now
+        raw_cut = int((now - self.raw_days * 86400) // ROLLUP * ROLLUP)
+        with self._lock, self._db:
+            # Merge with any rollup already there for the same hour
+            self._db.execute(
+                "INSERT OR REPLACE INTO rollups "
+                "SELECT s.host, s.metric, s.b, s.n + IFNULL(r.count, 0), s.t + IFNULL(r.total, 0), "
+                "       MIN(s.lo, IFNULL(r.lo, s.lo)), MAX(s.hi, IFNULL(r.hi, s.hi)) "
+                "FROM (SELECT host, metric, ts / :size * :size AS b, COUNT(*) AS n, SUM(value) AS t, "
+                "             MIN(value) AS lo, MAX(value) AS hi "
+                "      FROM samples WHERE ts < :cut GROUP BY host, metric, b) s "
+                "LEFT JOIN rollups r ON r.host = s.host AND r.metric = s.metric AND r.ts = s.b",
+                {'size': ROLLUP, 'cut': raw_cut})
+            rolled = self._db.execute("DELETE FROM samples WHERE ts < ?", (raw_cut,)).rowcount
+            dropped = self._db.execute("DELETE FROM rollups WHERE ts < ?",
+                                       (now - self.rollup_days * 86400,)).rowcount
+            dropped += self._db.execute("DELETE FROM snapshots WHERE ts < ?",
+                                        (now - self.snapshot_days * 86400,)).rowcount
+        return {'rolled_up': rolled, 'dropped': dropped}
+
+    def stats(self):
+        with self._lock:
+            count = lambda t: self._db.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+            out = {t: count(t) for t in ('snapshots', 'samples', 'rollups')}
+        out['bytes'] = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return out
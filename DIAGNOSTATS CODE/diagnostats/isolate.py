@@ -0,0 +1,158 @@
+# isolate.py - run the risky collectors in their own process
+#
+# Some checks end up in native code that can hang for good or crash the
+# whole process: registry/WMI reads, psutil poking at protected processes.
+# A thread stuck in there can't be stopped. A process can: each isolated
+# section gets a worker process of its own, kept between scans (starting
+# one costs far more than a scan does, and the collectors keep their
+# rate counters and caches there). If a worker runs past its deadline it
+# is killed and a fresh one is started the next time that section runs.
+#
+# Requests go over a pipe as the section name, answers come back as
+# zlib'd JSON of the raw records (same as the fleet wire format).
+
+import json
+import multiprocessing
+import threading
+import zlib
+
+from .records import plain, from_plain
+
+DEFAULT_TIMEOUT = 10.0
+
+# The checks most likely to get stuck in native code
+RISKY = ('sys', 'procs')
+
+
+class IsolatedError(Exception):
+    """A collector failed inside its worker process."""
+
+    def __init__(self, kind, message):
+        super().__init__(f"{kind}: {message}" if message else kind)
+        self.kind = kind
+
+
+def _encode(msg):
+    return zlib.compress(json.dumps(msg, separators=(',', ':'), default=str).encode('utf-8'))
+
+
+def _decode(body):
+    return json.loads(zlib.decompress(body))
+
+
+def _serve(conn):
+    # Worker process main loop: one section name in, one answer out.
+    # The collector is looked up the same way as in the parent, so
+    # plugins can be isolated too
+    from .plugins import registry
+
+    while True:
+        try:
+            name = conn.recv_bytes().decode('utf-8')
+        except (EOFError, OSError):
+            return
+        try:
+            value = registry.get(name).func()
+            msg = {'value': plain(value)}
+        except Exception as e:
+            msg = {'error': [type(e).__name__, str(e)]}
+        conn.send_bytes(_encode(msg))
+
+
+class Worker:
+    """One long lived process running one section's collector."""
+
+    def __init__(self, ctx, section):
+        self.section = section
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child,), name=f"diagnostats-{section}")
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+        self.lock = threading.Lock()
+
+    def alive(self):
+        return self.process.is_alive()
+
+    def call(self, timeout):
+        """The section's records, or raises. TimeoutError means the worker
+        has been killed and shouldn't be used again."""
+        self.conn.send_bytes(self.section.encode('utf-8'))
+        if not self.conn.poll(timeout):
+            self.kill()
+            raise TimeoutError(f"{self.section} took longer than {timeout:g}s (worker killed)")
+        try:
+            msg = _decode(self.conn.recv_bytes())
+        except (EOFError, OSError):
+            self.process.join(1.0)
+            raise IsolatedError("worker died", f"exit code {self.process.exitcode}")
+        if 'error' in msg:
+            raise IsolatedError(*msg['error'])
+        return from_plain(self.section, msg['value'])
+
+    def kill(self):
+        # Process.kill() is 3.7+, terminate() is just as final on Windows
+        getattr(self.process, 'kill', self.process.terminate)()
+        self.process.join(1.0)
+        self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.close()  # the worker sees EOF and exits
+        finally:
+            self.process.join(1.0)
+            if self.process.is_alive():
+                self.kill()
+
+
+class IsolatedRunner:
+    """Hands out collector jobs that run in worker processes.
+
+    job(section) looks like any other collector to the Scheduler, but a
+    hang only costs that section its answer and a dead worker.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, timeouts=None):
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        # spawn everywhere: forking a process that has threads running is asking for trouble
+        self._ctx = multiprocessing.get_context('spawn')
+        self._workers = {}
+        self._lock = threading.Lock()
+        self.started = 0  # worker processes started, restarts included
+
+    def _worker(self, section):
+        with self._lock:
+            w = self._workers.get(section)
+            if w is None or not w.alive():
+                w = self._workers[section] = Worker(self._ctx, section)
+                self.started += 1
+            return w
+
+    def run(self, section):
+        w = self._worker(section)
+        with w.lock:  # one request at a time per pipe
+            try:
+                return w.call(self.timeouts.get(section, self.timeout))
+            except (TimeoutError, IsolatedError):
+                with self._lock:
+                    if self._workers.get(section) is w and not w.alive():
+                        del self._workers[section]
+                raise
+
+    def job(self, section):
+        from .plugins import registry
+        if section not in registry:
+            raise ValueError(f"Unknown section {section!r}")
+        return lambda: self.run(section)
+
+    def start(self, sections):
+        """Get workers going ahead of the first scan."""
+        for s in sections:
+            self._worker(s)
+
+    def close(self):
+        with self._lock:
+            workers, self._workers = list(self._workers.values()), {}
+        for w in workers:
+            w.close()
@@ -0,0 +1,42 @@
+# lazy.py - put off importing the heavy stuff until something uses it
+#
+# psutil and numpy between them take longer to import than the rest of the
+# package, and plenty of runs (drawing the window, --help, a quick disk
+# check) never touch one or the other. available() asks whether a module
+# is installed without importing it, and LazyModule stands in for it until
+# the first attribute lookup.
+
+import importlib
+import importlib.util
+import threading
+
+
+def available(name):
+    """True if name could be imported (nothing is actually imported)."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule:
+    """Looks like module name, imports it on first use."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded yet"
+        return f"<lazy module {self._name!r} ({state})>"
@@ -0,0 +1,239 @@
+# monitor.py - a live, top-style view that's cheap enough to leave running
+#
+# Nothing here rescans the machine. Every tick takes one more reading of
+# things that are already kept incrementally: the sampler's CPU/memory
+# rings, the disk and network counter deltas, the persistent process
+# table. Disk usage comes out of the metric cache. So a tick costs a few
+# milliseconds, and what it costs (plus our own CPU use) is on screen.
+#
+# The same text is drawn by the Tk window's Live tab and by the terminal
+# view (curses), see monitor_lines() and run_curses().
+
+import threading
+import time
+from collections import namedtuple
+
+from . import backends, collectors, formatting
+from .cache import cache
+from .sampler import Sampler
+from .tracing import tracer
+
+DEFAULT_INTERVAL = 2.0
+MIN_INTERVAL = 0.5
+DEFAULT_TOP = 10
+SORTS = ('cpu', 'mem', 'io_bps', 'threads', 'handles')
+SPARK = 40  # samples in the CPU/memory history lines
+
+# One screenful. cost is how long the tick took to collect, own_cpu is this
+# process's CPU use since the previous tick and frame_ms how long the last
+# screen took to draw (filled in by whoever draws it)
+Frame = namedtuple('Frame', 'taken interval cpu mem mem_used mem_total swap cpu_history mem_history '
+                            'disks diskio net procs sort cost own_cpu frame_ms errors')
+
+
+class Monitor:
+    """Collects a Frame every interval seconds, from incremental sources only."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, top=DEFAULT_TOP, sort='cpu'):
+        self.interval = max(MIN_INTERVAL, interval)
+        self.top = top
+        self.sort = sort
+        self.sampler = Sampler(interval=self.interval, capacity=SPARK)
+        self.frame_ms = None
+        self._last_cpu = None  # (wall, process cpu) at the previous tick
+        self._stop = threading.Event()
+        self._thread = None
+
+    def tick(self):
+        start = time.perf_counter()
+        errors = {}
+
+        with tracer.span('monitor'):
+            backends.current().tick()
+            self.sampler.sample_once()
+            parts = {}
+            for name, fn in (('disks', collectors.get_disk_info),
+                             ('diskio', collectors.get_disk_io),
+                             ('net', collectors.get_net_info),
+                             ('procs', lambda: collectors.get_proc_info(self.top, self.sort, uss=False))):
+                try:
+                    parts[name] = fn()
+                except Exception as e:
+                    parts[name] = []
+                    errors[name] = str(e) or type(e).__name__
+
+        cost = time.perf_counter() - start
+        s = self.sampler.series
+        total = None
+        if collectors.has_psutil:
+            total = cache.get('mem_total', lambda: collectors.psutil.virtual_memory().total)
+        return Frame(
+            taken=time.time(),
+            interval=self.interval,
+            cpu=s['cpu.percent'].latest(),
+            mem=s['mem.percent'].latest(),
+            mem_used=s['mem.used'].latest(),
+            mem_total=total,
+            swap=s['swap.percent'].latest(),
+            cpu_history=[v for _, v in s['cpu.percent'].items()],
+            mem_history=[v for _, v in s['mem.percent'].items()],
+            disks=parts['disks'],
+            diskio=parts['diskio'],
+            net=parts['net'],
+            procs=parts['procs'],
+            sort=self.sort,
+            cost=cost,
+            own_cpu=self._own_cpu(),
+            frame_ms=self.frame_ms,
+            errors=errors,
+        )
+
+    def _own_cpu(self):
+        # Our CPU use since the last tick, as a % of one core
+        now = (time.perf_counter(), time.process_time())
+        last, self._last_cpu = self._last_cpu, now
+        if last is None or now[0] <= last[0]:
+            return None
+        return (now[1] - last[1]) * 100.0 / (now[0] - last[0])
+
+    def next_sort(self):
+        self.sort = SORTS[(SORTS.index(self.sort) + 1) % len(SORTS)] if self.sort in SORTS else SORTS[0]
+
+    def set_interval(self, seconds):
+        self.interval = self.sampler.interval = max(MIN_INTERVAL, seconds)
+
+    # Background mode, for the GUI
+    def start(self, on_frame):
+        """Tick on a thread of its own, handing every Frame to on_frame
+        (on that thread - post it somewhere rather than touching Tk)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(on_frame,), name='monitor')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def _run(self, on_frame):
+        # Same fixed schedule as the sampler: a slow tick doesn't push the rest back
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                on_frame(self.tick())
+            except Exception as e:
+                tracer.swallowed('monitor tick', e)
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+
+def bar(pct, width=20):
+    if pct is None:
+        return "[" + "?" * width + "]"
+    filled = int(round(min(max(pct, 0), 100) * width / 100.0))
+    return "[" + "#" * filled + "." * (width - filled) + "]"
+
+
+def spark(values, width=SPARK):
+    # Plain ASCII so it survives any terminal (Windows consoles included)
+    marks = " .:-=+*#%@"
+    out = "".join(marks[min(len(marks) - 1, int(max(v, 0) * len(marks) / 100.0))] for v in values[-width:])
+    return out.rjust(width)
+
+
+def monitor_lines(f, host=''):
+    """The live view as a list of text lines."""
+    when = time.strftime('%H:%M:%S', time.localtime(f.taken))
+    own = f"{f.own_cpu:.1f}%" if f.own_cpu is not None else "-"
+    frame = f"{f.frame_ms:.1f} ms" if f.frame_ms is not None else "-"
+    lines = [f"PC Check live - {host} - {when} - every {f.interval:g}s",
+             f"refresh {f.cost * 1000:.1f} ms   frame {frame}   own CPU {own}",
+             ""]
+
+    mem = formatting.percent(f.mem)
+    if f.mem_total:
+        mem += f" ({f.mem_used / formatting.GB:.1f} / {f.mem_total / formatting.GB:.1f} GB)"
+    lines.append(f"CPU  {bar(f.cpu)} {formatting.percent(f.cpu):>6}   |{spark(f.cpu_history)}|")
+    lines.append(f"Mem  {bar(f.mem)} {mem}")
+    lines.append(f"     {'':22} {'':6}   |{spark(f.mem_history)}|")
+    lines.append(f"Swap {bar(f.swap)} {formatting.percent(f.swap):>6}")
+
+    lines += ["", "DISKS"]
+    for d in f.disks:
+        if d.error:
+            lines.append(f"  {d.mount[:20]:20} unreachable ({d.error})")
+        else:
+            lines.append(f"  {d.mount[:20]:20} {bar(d.percent, 10)} {d.percent:5.1f}%  "
+                         f"{formatting.gb(d.free)} free")
+    busy = [d for d in f.diskio if d.read_bps or d.write_bps or d.busy]
+    if busy:
+        busy.sort(key=lambda d: d.read_bps + d.write_bps, reverse=True)
+        for d in busy[:5]:
+            b = f"{d.busy:5.1f}% busy" if d.busy is not None else ""
+            lines.append(f"  {d.device[:20]:20} read {formatting.rate(d.read_bps):>11}  "
+                         f"write {formatting.rate(d.write_bps):>11}  {b}")
+
+    lines += ["", "NETWORK"]
+    for n in f.net:
+        if not n.is_up and not (n.sent_bps or n.recv_bps):
+            continue
+        errs = n.errin + n.errout + n.dropin + n.dropout
+        lines.append(f"  {n.name[:20]:20} up {formatting.rate(n.sent_bps):>11}  "
+                     f"down {formatting.rate(n.recv_bps):>11}" + (f"  {errs} errors/drops" if errs else ""))
+
+    lines.append("")
+    lines += formatting.procs_text(f.procs, f.sort).rstrip("\n").split("\n")
+
+    for name, err in f.errors.items():
+        lines.append(f"! {name}: {err}")
+    return lines
+
+
+def run_curses(monitor, host=''):
+    """Full screen terminal view. q quits, s changes the sort, +/- the interval."""
+    import curses
+
+    def main(scr):
+        curses.curs_set(0)
+        while True:
+            frame = monitor.tick()
+            start = time.perf_counter()
+            height, width = scr.getmaxyx()
+            scr.erase()
+            lines = monitor_lines(frame, host)
+            lines.append("")
+            lines.append("q quit   s sort   +/- refresh interval")
+            for y, line in enumerate(lines[:height - 1]):
+                scr.addnstr(y, 0, line, width - 1)
+            scr.refresh()  # curses only sends what changed
+            monitor.frame_ms = (time.perf_counter() - start) * 1000
+
+            # Sleep in getch() so keys still work between ticks
+            deadline = time.monotonic() + monitor.interval
+            while True:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                scr.timeout(int(left * 1000))
+                key = scr.getch()
+                if key in (ord('q'), ord('Q'), 27):
+                    return
+                if key in (ord('s'), ord('S')):
+                    monitor.next_sort()
+                    break
+                if key in (ord('+'), ord('=')):
+                    monitor.set_interval(monitor.interval * 2)
+                elif key == ord('-'):
+                    monitor.set_interval(monitor.interval / 2)
+                elif key == curses.KEY_RESIZE:
+                    break
+
+    curses.wrapper(main)
@@ -0,0 +1,106 @@
+# mounts.py - disk usage for every mount without letting a dead one hang the scan
+#
+# disk_usage() on a stale network share, an empty CD drive or a hung NFS
+# mount can block for a very long time, and there's no interrupting it.
+# So every mount gets checked on the scheduler's worker pool with its own
+# deadline. A mount that doesn't answer in time is reported with a reason
+# and not asked again until its stuck call finally returns.
+
+import threading
+import time
+
+from . import collectors
+from .records import Disk
+from .scheduler import Scheduler
+from .tracing import tracer
+
+PROBE_TIMEOUT = 2.0  # seconds one mount gets to answer
+PROBE_WORKERS = 8
+SLOW = 0.5           # a mount slower than this (or one that failed)...
+SLOW_TTL = 60.0      # ...keeps its last answer for this long
+
+
+class MountProber:
+    """Checks mounts in parallel, each with a deadline.
+
+    Slow and failed mounts are remembered for slow_ttl seconds so they
+    don't cost every scan, and a mount whose previous check is still stuck
+    in the OS is skipped instead of tying up another thread.
+    """
+
+    def __init__(self, timeout=PROBE_TIMEOUT, workers=PROBE_WORKERS, slow=SLOW, slow_ttl=SLOW_TTL):
+        self.scheduler = Scheduler(max_workers=workers, timeout=timeout)
+        self.slow = slow
+        self.slow_ttl = slow_ttl
+        self._in_flight = set()  # mounts with a disk_usage call that hasn't come back
+        self._remembered = {}    # mount -> (Disk, when)
+        self._lock = threading.Lock()
+
+    def probe(self, partitions):
+        """Disk records for partitions, in the same order."""
+        now = time.monotonic()
+        parts = {p.mountpoint: p for p in partitions}
+        found = {}
+        jobs = {}
+
+        for mount, part in parts.items():
+            kept = self._remembered.get(mount)
+            if kept and now - kept[1] < self.slow_ttl:
+                found[mount] = kept[0]
+                continue
+            with self._lock:
+                stuck = mount in self._in_flight
+            if stuck:
+                found[mount] = failed(part, "still not answering (last check hung)")
+            elif 'cdrom' in part.opts and not part.fstype:
+                found[mount] = failed(part, "no disc in drive")
+            else:
+                jobs[mount] = self._job(part)
+
+        results = self.scheduler.run(jobs) if jobs else {}
+        for mount, res in results.items():
+            part = parts[mount]
+            if res.error is None:
+                disk = res.value
+            elif res.timed_out:
+                disk = failed(part, f"no answer after {res.elapsed:.1f}s")
+            else:
+                tracer.swallowed(f"disk_usage {mount}", res.error)
+                disk = failed(part, reason(res.error))
+
+            if res.error is not None or res.elapsed >= self.slow:
+                self._remembered[mount] = (disk, time.monotonic())
+            else:
+                self._remembered.pop(mount, None)
+            found[mount] = disk
+
+        return [found[p.mountpoint] for p in partitions]
+
+    def _job(self, part):
+        mount = part.mountpoint
+
+        def check():
+            with self._lock:
+                self._in_flight.add(mount)
+            try:
+                usage = collectors.psutil.disk_usage(mount)
+            finally:
+                with self._lock:
+                    self._in_flight.discard(mount)
+            return Disk(part.device, mount, part.fstype, usage.total, usage.used,
+                        usage.free, usage.percent, None)
+
+        # Runs on a worker thread, so it needs its own span for the tracer to see it
+        return tracer.traced('disk probe', check)
+
+
+def failed(part, why):
+    return Disk(part.device, part.mountpoint, part.fstype, None, None, None, None, why)
+
+
+def reason(e):
+    if isinstance(e, PermissionError):
+        return "access denied"
+    if isinstance(e, OSError) and e.strerror:
+        return e.strerror
+    return str(e) or type(e).__name__
@@ -0,0 +1,184 @@
+# plugins.py - collectors are declared in one place instead of wired in by hand
+#
+# Every collector, built in or not, is a CollectorSpec in the registry:
+# its name (which is also its section of the Snapshot), how expensive it
+# is, how long an answer stays good and what it needs. engine.Collector
+# decides from those what a scan runs:
+#
+#   static     read once, then the answer is kept (OS version and the like)
+#   cheap      run every scan, or every interval seconds if it has one
+#   expensive  only run when a scan asks for it by name
+#
+# A collector whose modules aren't installed (requires) or that's for
+# another OS (platforms) is left out instead of failing every scan.
+#
+# Other collectors are picked up the first time the registry is used, from
+#   - packages declaring a 'diagnostats.collectors' entry point (the entry
+#     point names a module, importing it registers its collectors)
+#   - *.py files in ~/.diagnostats/plugins, or the folders listed in
+#     DIAGNOSTATS_PLUGINS
+#
+# A plugin file looks like this:
+#
+#   from diagnostats.plugins import collector
+#
+#   @collector('print_queue', cost='cheap', interval=30, title="Print queue")
+#   def print_queue():
+#       return {'jobs': 3, 'stuck': 0}
+#
+# Plugin answers end up in Snapshot.extra, so they have to be plain json
+# (dicts, lists, strings, numbers). Top level numbers in a dict answer
+# become metrics (print_queue.jobs) that rules and history can use.
+
+import importlib
+import importlib.util
+import os
+import sys
+import threading
+from collections import namedtuple
+
+from . import collectors, security
+from .lazy import available
+from .tracing import tracer
+
+COSTS = ('static', 'cheap', 'expensive')
+ENTRY_POINTS = 'diagnostats.collectors'
+PLUGIN_DIR = os.path.join(os.path.expanduser('~'), '.diagnostats', 'plugins')
+
+# render(value) -> text for the report/GUI and metrics(value) -> {name: number}
+# are optional, there are plain defaults for both (formatting.extra_text,
+# rules.snapshot_metrics). source is where a plugin came from
+CollectorSpec = namedtuple('CollectorSpec', 'name func cost interval requires platforms title '
+                                            'render metrics source')
+
+
+class Registry:
+    """Every collector there is, by name."""
+
+    def __init__(self):
+        self.specs = {}
+        self.errors = {}  # plugin file/entry point -> why it didn't load
+        self._loaded = False
+        self._source = None  # what's being loaded right now
+        self._lock = threading.RLock()
+
+    def register(self, name, func, cost='cheap', interval=0, requires=(), platforms=(),
+                 title=None, render=None, metrics=None):
+        if cost not in COSTS:
+            raise ValueError(f"cost must be one of {', '.join(COSTS)}, not {cost!r}")
+        spec = CollectorSpec(name, func, cost, interval or 0, tuple(requires), tuple(platforms),
+                             title or name, render, metrics, self._source)
+        with self._lock:
+            self.specs[name] = spec
+        return spec
+
+    def collector(self, name=None, **kw):
+        """Decorator version of register(), name defaults to the function's."""
+        def wrap(func):
+            self.register(name or func.__name__, func, **kw)
+            return func
+        return wrap
+
+    # Discovery
+    def load(self, dirs=None):
+        """Look for plugins (once). Anything that fails to load is noted in
+        errors and skipped, a bad plugin can't take the tool down with it."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            self._load_entry_points()
+            if dirs is None:
+                env = os.environ.get('DIAGNOSTATS_PLUGINS')
+                dirs = env.split(os.pathsep) if env else [PLUGIN_DIR]
+            for d in dirs:
+                if os.path.isdir(d):
+                    for f in sorted(os.listdir(d)):
+                        if f.endswith('.py') and not f.startswith('_'):
+                            self._load_file(os.path.join(d, f))
+
+    def _load_entry_points(self):
+        try:
+            from importlib.metadata import entry_points
+        except ImportError:  # 3.7 and older
+            return
+        eps = entry_points()
+        # 3.10 has select(), before that it's a dict of lists
+        group = eps.select(group=ENTRY_POINTS) if hasattr(eps, 'select') else eps.get(ENTRY_POINTS, [])
+        for ep in group:
+            self._guarded(f"entry point {ep.name}", ep.load)
+
+    def _load_file(self, path):
+        def run():
+            name = 'diagnostats_plugin_' + os.path.splitext(os.path.basename(path))[0]
+            spec = importlib.util.spec_from_file_location(name, path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        self._guarded(path, run)
+
+    def _guarded(self, source, fn):
+        self._source = source
+        try:
+            fn()
+        except Exception as e:
+            tracer.swallowed('plugin load', e)
+            self.errors[source] = f"{type(e).__name__}: {e}"
+        finally:
+            self._source = None
+
+    # Looking things up
+    def get(self, name):
+        self.load()
+        return self.specs[name]
+
+    def all(self):
+        self.load()
+        with self._lock:
+            return list(self.specs.values())
+
+    def missing(self, spec):
+        """Why spec can't run here ([] if it can)."""
+        out = [f"needs {m}" for m in spec.requires if not available(m)]
+        if spec.platforms and not any(sys.platform.startswith(p) for p in spec.platforms):
+            out.append(f"{'/'.join(spec.platforms)} only")
+        return out
+
+    def defaults(self):
+        """What a scan runs when it isn't told: everything that can run here
+        and isn't expensive."""
+        return [s.name for s in self.all() if s.cost != 'expensive' and not self.missing(s)]
+
+    def __contains__(self, name):
+        self.load()
+        return name in self.specs
+
+
+def extra_metrics(name, value):
+    """{metric: number} out of one plugin's answer."""
+    spec = registry.get(name) if name in registry else None
+    if spec is not None and spec.metrics is not None:
+        try:
+            return spec.metrics(value)
+        except Exception as e:
+            tracer.swallowed(f'{name} metrics', e)
+            return {}
+    if not isinstance(value, dict):
+        return {}
+    return {f"{name}.{k}": v for k, v in value.items()
+            if isinstance(v, (int, float)) and not isinstance(v, bool)}
+
+
+registry = Registry()
+collector = registry.collector
+
+# The built in sections. Everything here keeps its own rate counters and
+# caches, so none of them need an interval
+registry.register('sys', collectors.get_sys_info, cost='static', title="System")
+registry.register('hw', collectors.get_hardware_info, title="Hardware")
+registry.register('disks', collectors.get_disk_info, title="Storage")
+registry.register('diskio', collectors.get_disk_io, title="Disk activity")
+registry.register('procs', collectors.get_proc_info, title="Running programs")
+registry.register('net', collectors.get_net_info, title="Network")
+# Never waits, the slow queries refresh themselves in the background
+registry.register('security', security.get_security_info, title="Security",
+                  render=security.security_text, metrics=security.security_metrics)
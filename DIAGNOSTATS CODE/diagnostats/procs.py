@@ -0,0 +1,309 @@
+# procs.py - a process list that's kept up to date instead of rebuilt every scan
+
+import heapq
+import sys
+import threading
+import time
+from operator import attrgetter
+
+from . import collectors
+from .cache import cache
+from .records import Proc, ProcGroup
+from .tracing import tracer
+
+# What top() and rollup() can sort by
+SORT_KEYS = ('mem', 'cpu', 'rss', 'cpu_time', 'threads', 'handles', 'io_bps',
+             'read_bytes', 'write_bytes')
+
+# Added up per group by rollup(), in ProcGroup's order
+SUMMED = ('mem', 'cpu', 'rss', 'cpu_time', 'threads', 'handles', 'io_bps')
+
+# Open handles on Windows, open file descriptors everywhere else
+HANDLES = 'num_handles' if sys.platform == 'win32' else 'num_fds'
+
+# Threads, handles, I/O and parent are re-read when a process has used
+# some CPU since the last look, and otherwise only every this many
+# refreshes. Most processes on a busy box are asleep most of the time
+DETAIL_EVERY = 10
+
+
+class ProcEntry:
+    """What we know about one running process."""
+    __slots__ = ('key', 'pid', 'name', 'proc', 'first_seen', 'rss', 'mem', 'cpu', 'ppid',
+                 'cpu_time', 'cpu_at', 'threads', 'handles', 'read_bytes', 'write_bytes', 'io_bps',
+                 'io_time', 'service', 'denied', 'suspect')
+
+    def __init__(self, proc, create_time, name, now, ppid=None, cpu_time=None):
+        self.key = (proc.pid, create_time)
+        self.pid = proc.pid
+        self.name = name or ''
+        self.proc = proc
+        self.first_seen = now
+        self.rss = 0
+        self.mem = 0.0
+        self.cpu = None  # needs two looks before there's a number
+        self.ppid = ppid
+        self.cpu_time = cpu_time
+        self.cpu_at = now
+        self.threads = None
+        self.handles = None
+        self.read_bytes = None
+        self.write_bytes = None
+        self.io_bps = None
+        self.io_time = None
+        self.service = None
+        self.denied = ()  # optional reads the OS said no to, not asked again
+        self.suspect = False  # looked like a different process last read
+
+    def read(self, now, total_mem, details):
+        # All in one oneshot(), so the OS gets asked as few times as it can
+        # be (on Linux the CPU times, parent and threads share one file).
+        # CPU% comes from the change in CPU time, same as cpu_percent()
+        p = self.proc
+        with p.oneshot():
+            self.rss = p.memory_info().rss
+            t = p.cpu_times()
+            cpu_time = t.user + t.system
+            if self.cpu_time is not None and cpu_time < self.cpu_time:
+                self.suspect = True  # CPU time never goes down, is this pid someone else now?
+            busy = self.cpu_time is None or cpu_time != self.cpu_time
+            if self.cpu_time is not None and now > self.cpu_at:
+                self.cpu = max(0.0, cpu_time - self.cpu_time) * 100.0 / (now - self.cpu_at)
+            self.cpu_time, self.cpu_at = cpu_time, now
+
+            if busy or details or self.threads is None:
+                self.threads = p.num_threads()
+                ppid = p.ppid()
+                if self.ppid is not None and ppid != self.ppid:
+                    self.suspect = True
+                self.ppid = ppid
+                if 'handles' not in self.denied:
+                    self.handles = self._optional('handles', getattr(p, HANDLES))
+                if 'io' not in self.denied:
+                    self._read_io(now)
+            elif self.io_bps:
+                self.io_bps = 0.0  # no CPU used, so no I/O worth counting either
+        self.mem = self.rss * 100.0 / total_mem
+
+    def _read_io(self, now):
+        io = self._optional('io', self.proc.io_counters)
+        if io is None:
+            return
+        total = io.read_bytes + io.write_bytes
+        if self.io_time is not None and now > self.io_time:
+            prev = (self.read_bytes or 0) + (self.write_bytes or 0)
+            self.io_bps = max(0, total - prev) / (now - self.io_time)
+        self.read_bytes, self.write_bytes, self.io_time = io.read_bytes, io.write_bytes, now
+
+    def _optional(self, what, fn):
+        # Other users' handles/IO are off limits without admin; remember
+        # that rather than paying for the exception on every refresh
+        psutil = collectors.psutil
+        try:
+            return fn()
+        except (psutil.AccessDenied, AttributeError, NotImplementedError) as ex:
+            tracer.swallowed(f'Process {what}', ex)
+            self.denied += (what,)
+            return None
+
+    def record(self, uss=None):
+        return Proc(self.pid, self.name, self.mem, self.cpu, self.rss, uss, self.cpu_time,
+                    self.threads, self.handles, self.read_bytes, self.write_bytes, self.io_bps,
+                    self.ppid, self.service)
+
+
+class ProcessTable:
+    """Persistent index of running processes keyed by (pid, create_time).
+
+    Each refresh() only builds entries for processes it hasn't seen, drops
+    the ones that exited and re-reads the numbers for the rest. Holding on
+    to the psutil.Process objects is what makes per-process CPU% and I/O
+    rates possible: both are measured since the previous tick.
+    """
+
+    def __init__(self):
+        self.entries = {}  # (pid, create_time) -> ProcEntry
+        self.last_refresh = None
+        self.added = 0
+        self.removed = 0
+        self.refreshes = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        psutil = collectors.psutil
+        now = time.time()
+
+        with self._lock:
+            pids = set(psutil.pids())
+
+            gone = [key for key, e in self.entries.items() if e.pid not in pids]
+            for key in gone:
+                del self.entries[key]
+
+            added = len(self._track_new(pids, now))
+            total_mem = psutil.virtual_memory().total or 1
+            services = service_names()
+            turn = self.refreshes % DETAIL_EVERY
+            dead, check = self._read(self.entries.items(), now, total_mem, services, turn)
+            for key in dead:
+                del self.entries[key]
+            removed = len(gone) + len(dead)
+
+            # A pid can go to a new process once the old one exits. Asking
+            # every pid for its start time again would double the cost of a
+            # refresh, so only the ones that looked odd (CPU time went down,
+            # different parent) and this refresh's detail share get asked
+            start = time.perf_counter()
+            reused = [key for key in check if key in self.entries and not self._same(self.entries[key])]
+            tracer.record_call('Process.create_time (reuse)', time.perf_counter() - start, len(check))
+            if reused:
+                for key in reused:
+                    del self.entries[key]
+                fresh = self._track_new(pids, now)
+                dead, _ = self._read([(e.key, e) for e in fresh], now, total_mem, services, turn)
+                for key in dead:
+                    del self.entries[key]
+                added += len(fresh)
+                removed += len(reused) + len(dead)
+
+            self.added = added
+            self.removed = removed
+            self.last_refresh = now
+            self.refreshes += 1
+
+    def _track_new(self, pids, now):
+        # Entries for the pids we aren't tracking yet, returns the new ones
+        start = time.perf_counter()
+        added = []
+        known = {e.pid for e in self.entries.values()}
+        for pid in pids - known:
+            entry = self._track(pid, now)
+            if entry is not None:
+                self.entries[entry.key] = entry
+                added.append(entry)
+        if added:
+            tracer.record_call('Process (new)', time.perf_counter() - start, len(added))
+        return added
+
+    def _read(self, items, now, total_mem, services, turn):
+        # Re-read (key, entry) pairs; returns the keys that exited and the
+        # ones to check for pid reuse
+        psutil = collectors.psutil
+        start = time.perf_counter()
+        dead, check = [], []
+        for key, e in items:
+            # Spread the periodic detail reads over the refreshes
+            details = e.pid % DETAIL_EVERY == turn
+            try:
+                e.read(now, total_mem, details)
+            except (psutil.ZombieProcess, psutil.AccessDenied) as ex:
+                tracer.swallowed('Process refresh', ex)
+            except psutil.NoSuchProcess:
+                dead.append(key)
+                continue
+            e.service = services.get(e.pid)
+            if e.suspect or (details and e.first_seen != now):
+                check.append(key)
+        tracer.record_call('Process.oneshot (refresh)', time.perf_counter() - start, len(items))
+        return dead, check
+
+    def _same(self, entry):
+        # Still the process we've been tracking? A pid can be handed to a
+        # new process once the old one exits, only the start time tells
+        # them apart. Our own Process object caches its start time, so ask
+        # a fresh one (the same check as psutil's is_running())
+        psutil = collectors.psutil
+        entry.suspect = False
+        try:
+            return psutil.Process(entry.pid).create_time() == entry.key[1]
+        except psutil.ZombieProcess:
+            return True
+        except psutil.NoSuchProcess:
+            return False
+        except psutil.AccessDenied as ex:
+            tracer.swallowed('Process create_time', ex)
+            return True  # can't tell, keep it
+
+    def _track(self, pid, now):
+        psutil = collectors.psutil
+        try:
+            proc = psutil.Process(pid)
+            with proc.oneshot():
+                name = proc.name()
+                create_time = proc.create_time()
+                ppid = proc.ppid()
+                t = proc.cpu_times()  # starts the clock for CPU% next time
+        except (psutil.NoSuchProcess, psutil.AccessDenied) as ex:
+            tracer.swallowed('Process (new)', ex)
+            return None
+        return ProcEntry(proc, create_time, name, now, ppid, t.user + t.system)
+
+    def top(self, n=15, key='mem'):
+        """Biggest n entries by key, without sorting the whole table."""
+        if key not in SORT_KEYS:
+            raise ValueError(f"Can't sort processes by {key!r}")
+        get = attrgetter(key)
+        with self._lock:
+            return heapq.nlargest(n, self.entries.values(), key=lambda e: get(e) or 0)
+
+    def rollup(self, by='name', n=15, key='rss'):
+        """Biggest n ProcGroups, one per executable name (by='name') or per
+        Windows service (by='service', anything not a service goes by name)."""
+        if key not in SUMMED:
+            raise ValueError(f"Can't sort groups by {key!r}")
+        groups = {}
+        with self._lock:
+            for e in self.entries.values():
+                name = (e.service if by == 'service' else None) or e.name
+                g = groups.get(name)
+                if g is None:
+                    g = groups[name] = ([], [0] * len(SUMMED))
+                g[0].append(e.pid)
+                totals = g[1]
+                for i, field in enumerate(SUMMED):
+                    totals[i] += getattr(e, field) or 0
+        rows = [ProcGroup(name, len(pids), *totals, pids) for name, (pids, totals) in groups.items()]
+        return heapq.nlargest(n, rows, key=attrgetter(key))
+
+    def uss(self, entry):
+        """Memory only this process is using (freed if it exited). Much slower
+        to get than RSS, so only worth it for the rows being shown."""
+        psutil = collectors.psutil
+        if 'uss' in entry.denied:
+            return None
+        start = time.perf_counter()
+        try:
+            return entry.proc.memory_full_info().uss
+        except (psutil.AccessDenied, psutil.ZombieProcess, AttributeError) as ex:
+            tracer.swallowed('Process uss', ex)
+            entry.denied += ('uss',)
+        except psutil.NoSuchProcess:
+            pass
+        finally:
+            tracer.record_call('Process.memory_full_info', time.perf_counter() - start)
+        return None
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def service_names():
+    """pid -> service name(s) on Windows, {} anywhere else."""
+    if not hasattr(collectors.psutil, 'win_service_iter'):
+        return {}
+    return cache.get('services', _read_services)
+
+
+def _read_services():
+    psutil = collectors.psutil
+    out = {}
+    for s in psutil.win_service_iter():
+        try:
+            pid = s.pid()
+        except psutil.Error as ex:
+            tracer.swallowed('service pid', ex)
+            continue
+        if pid:
+            # svchost runs several services in one process
+            out[pid] = f"{out[pid]}, {s.name()}" if pid in out else s.name()
+    return out
@@ -0,0 +1,62 @@
+# rates.py - turns the OS's ever-growing counters into per-second rates
+#
+# psutil hands back totals since boot (bytes read, packets sent...). The
+# interesting number is how fast they're going up, which needs two
+# readings. CounterDelta keeps the previous one between scans, so a scan
+# normally costs a single read; only when there's nothing recent to
+# compare with does it take a second look a moment later.
+
+import threading
+import time
+
+# A previous reading older than this says more about the last hour than
+# about right now, so take a fresh pair instead
+MAX_AGE = 30.0
+
+# Gap between the two readings when we have to take both
+SETTLE = 0.25
+
+
+class CounterDelta:
+    """Last reading of a {key: counters namedtuple} dict, and how much it moved."""
+
+    def __init__(self, max_age=MAX_AGE, settle=SETTLE):
+        self.max_age = max_age
+        self.settle = settle
+        self.last = {}
+        self.taken = None
+        self._lock = threading.Lock()
+
+    def age(self, now=None):
+        if self.taken is None:
+            return None
+        return (time.monotonic() if now is None else now) - self.taken
+
+    def update(self, counters, now=None):
+        """Store counters; returns {key: (seconds, {field: increase})} for keys
+        that were there last time as well."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            prev, prev_t = self.last, self.taken
+            self.last, self.taken = dict(counters), now
+
+        if prev_t is None or now <= prev_t:
+            return {}
+        dt = now - prev_t
+        out = {}
+        for key, c in counters.items():
+            p = prev.get(key)
+            if p is None:
+                continue
+            # Counters can go backwards when a device resets, call that 0
+            out[key] = (dt, {f: max(0, a - b) for f, a, b in zip(c._fields, c, p)})
+        return out
+
+    def sample(self, read):
+        """read() -> counters dict; returns update()'s deltas, taking a quick
+        extra reading first if the stored one is missing or stale."""
+        age = self.age()
+        if age is None or age > self.max_age:
+            self.update(read())
+            time.sleep(self.settle)
+        return self.update(read())
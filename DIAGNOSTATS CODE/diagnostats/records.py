@@ -0,0 +1,75 @@
+# records.py - what the collectors hand back
+#
+# Raw numbers only: sizes in bytes, percentages as floats, times as unix
+# timestamps. Turning them into "12.3 GB" is formatting.py's job and only
+# happens when something is actually shown or written out as text.
+# NamedTuples keep them small (no per-instance dict) and read-only.
+
+from collections import namedtuple
+
+SysInfo = namedtuple('SysInfo', 'os version edition boot_time python')
+
+HwInfo = namedtuple('HwInfo', 'cpu_cores cpu_physical cpu_percent cpu_mhz '
+                              'mem_total mem_used mem_percent swap_total swap_used swap_percent')
+
+# Sizes are None (and error says why) for a mount that couldn't be read
+Disk = namedtuple('Disk', 'drive mount fstype total used free percent error')
+
+# Rates over the last interval seconds. Latency is the average ms per
+# read/write; busy is None where the OS doesn't report busy time (Windows)
+DiskIO = namedtuple('DiskIO', 'device read_iops write_iops read_bps write_bps '
+                              'read_ms write_ms busy interval')
+
+# One process. cpu is % since the last look and cpu_time the seconds used
+# since it started. uss is only filled in for rows that get shown (it's
+# slow to read). handles is open handles on Windows, open fds elsewhere.
+# Anything the OS wouldn't tell us is None
+Proc = namedtuple('Proc', 'pid name mem cpu rss uss cpu_time threads handles '
+                          'read_bytes write_bytes io_bps ppid service')
+
+# Processes added up per executable or service (pids are the members)
+ProcGroup = namedtuple('ProcGroup', 'name count mem cpu rss cpu_time threads handles io_bps pids')
+
+# One network adapter. bytes_* are totals since boot, *_bps/*_ps rates and
+# err*/drop* the errors and drops seen during the last interval seconds.
+# speed is in Mbit/s (None if the OS doesn't know)
+Nic = namedtuple('Nic', 'name is_up speed mtu mac ipv4 ipv6 bytes_sent bytes_recv '
+                        'sent_bps recv_bps packets_sent_ps packets_recv_ps '
+                        'errin errout dropin dropout interval')
+
+# One security check (antivirus, firewall...). status is ok, warning,
+# problem, unknown or checking (first answer not in yet); items are plain
+# dicts with the details (products, profiles, accounts...). checked is
+# when the answer was got, None while checking
+SecurityCheck = namedtuple('SecurityCheck', 'name status detail items checked')
+
+# Section -> record type. Sections in LIST_TYPES are lists of them.
+TYPES = {'sys': SysInfo, 'hw': HwInfo}
+LIST_TYPES = {'disks': Disk, 'diskio': DiskIO, 'procs': Proc, 'net': Nic}
+
+
+def plain(value):
+    """Records (and lists of them) -> dicts and lists, ready for json/csv."""
+    if hasattr(value, '_asdict'):
+        return dict(value._asdict())
+    if isinstance(value, list):
+        return [plain(v) for v in value]
+    return value
+
+
+def build(cls, data):
+    # Missing fields come back as None, extra ones are dropped, so older
+    # exports still load
+    return cls(*[data.get(f) for f in cls._fields])
+
+
+def from_plain(section, data):
+    """Inverse of plain() for one snapshot section."""
+    if data is None:
+        return None
+    if section in LIST_TYPES:
+        cls = LIST_TYPES[section]
+        return [build(cls, d) for d in data if isinstance(d, dict)]
+    if section in TYPES and isinstance(data, dict):
+        return build(TYPES[section], data)
+    return data
@@ -0,0 +1,238 @@
+# report.py - streams scan/sample records out to JSON Lines, CSV or binary files
+#
+# Every record looks the same whatever the format:
+#   {'ts': unix time, 'host': name, 'section': 'hw', 'data': {...}}
+# and gets written the moment it's ready, so nothing has to pile up in memory.
+
+import csv
+import io
+import json
+import os
+import platform
+import struct
+import threading
+import time
+import zlib
+
+from . import formatting
+from .records import plain
+from .snapshot import SECTIONS
+
+FORMATS = ('jsonl', 'csv', 'bin')
+
+# File extension -> format, for when we're handed a filename
+EXTENSIONS = {
+    '.jsonl': 'jsonl', '.ndjson': 'jsonl',
+    '.json': 'json',  # one document, so a one-off save only - can't be appended to
+    '.csv': 'csv',
+    '.bin': 'bin', '.dsb': 'bin',
+    '.txt': 'text',
+}
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+
+# Binary records: 4 byte little-endian length, then zlib'd JSON
+_LEN = struct.Struct('<I')
+
+
+class RotatingFile:
+    """Append-only file that rolls over to name.1, name.2, ... when it gets big.
+
+    header (if any) goes at the top of every fresh file, e.g. CSV column names.
+    """
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS, header=b''):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.header = header
+        self._f = open(path, 'ab')
+        self._size = self._f.tell()
+
+    def write(self, data):
+        if self.max_bytes and self._size and self._size + len(data) > self.max_bytes:
+            self.rotate()
+        if self._size == 0 and self.header:
+            self._f.write(self.header)
+            self._size += len(self.header)
+        self._f.write(data)
+        self._size += len(data)
+
+    def rotate(self):
+        self._f.close()
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._f = open(self.path, 'ab')
+        self._size = 0
+
+    @property
+    def size(self):
+        return self._size
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+def flatten(data, prefix=''):
+    # {'a': {'b': 1}, 'c': [2]} -> [('a.b', 1), ('c.0', 2)]
+    out = []
+    if isinstance(data, dict):
+        for k, v in data.items():
+            out.extend(flatten(v, f"{prefix}{k}."))
+    elif isinstance(data, (list, tuple)):
+        for i, v in enumerate(data):
+            out.extend(flatten(v, f"{prefix}{i}."))
+    else:
+        out.append((prefix[:-1], data))
+    return out
+
+
+class RecordWriter:
+    """Base writer - subclasses turn a record into bytes."""
+    fmt = None
+    header = b''
+
+    def __init__(self, out, host=None):
+        # out is anything with write(bytes): a RotatingFile, sys.stdout.buffer...
+        self.out = out
+        self.host = host or platform.node()
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def write(self, section, data, ts=None):
+        record = {'ts': ts if ts is not None else time.time(), 'host': self.host,
+                  'section': section, 'data': plain(data)}
+        chunk = self.encode(record)
+        with self._lock:
+            # RotatingFile handles its own header, plain streams get it once
+            if self.count == 0 and self.header and not isinstance(self.out, RotatingFile):
+                self.out.write(self.header)
+            self.out.write(chunk)
+            self.out.flush()
+            self.count += 1
+
+    def encode(self, record):
+        raise NotImplementedError
+
+    # Handy hooks
+    def on_result(self, res):
+        # Plug straight into Collector.scan(on_result=...)
+        if res.error is None:
+            self.write(res.name, res.value)
+        else:
+            self.write(res.name, {'error': str(res.error), 'timed_out': res.timed_out})
+
+    def write_snapshot(self, snap):
+        for name in SECTIONS:
+            self.write(name, getattr(snap, name), ts=snap.taken)
+        for name, value in (snap.extra or {}).items():
+            self.write(name, value, ts=snap.taken)
+        self.write('timings', snap.timings, ts=snap.taken)
+        if snap.errors:
+            self.write('errors', snap.errors, ts=snap.taken)
+
+    def on_sample(self, ts, values):
+        # Plug into Sampler.add_listener
+        self.write('sample', values, ts=ts)
+
+    def close(self):
+        if hasattr(self.out, 'close'):
+            self.out.close()
+
+
+class JsonLinesWriter(RecordWriter):
+    fmt = 'jsonl'
+
+    def encode(self, record):
+        return (json.dumps(record, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+
+
+class CsvWriter(RecordWriter):
+    """Long format: one row per value, so every section fits the same columns."""
+    fmt = 'csv'
+    header = b'ts,host,section,key,value\n'
+
+    def encode(self, record):
+        ts, host, section = record['ts'], record['host'], record['section']
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator='\n').writerows(
+            (ts, host, section, k, v) for k, v in flatten(record['data']))
+        return buf.getvalue().encode('utf-8')
+
+
+class BinaryWriter(RecordWriter):
+    """Length-prefixed, zlib'd JSON - a fraction of the size, still easy to read back."""
+    fmt = 'bin'
+
+    def encode(self, record):
+        body = zlib.compress(json.dumps(record, separators=(',', ':'), default=str).encode('utf-8'))
+        return _LEN.pack(len(body)) + body
+
+
+WRITERS = {'jsonl': JsonLinesWriter, 'csv': CsvWriter, 'bin': BinaryWriter}
+
+
+def guess_format(path, default='jsonl'):
+    ext = os.path.splitext(path)[1].lower()
+    return EXTENSIONS.get(ext, default)
+
+
+def open_writer(path, fmt=None, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS, host=None):
+    """Writer appending to a rotating file at path."""
+    fmt = fmt or guess_format(path)
+    if fmt not in WRITERS:
+        hint = " (use .jsonl for a JSON log)" if fmt == 'json' else ""
+        raise ValueError(f"Can't stream {fmt!r}, pick one of {', '.join(FORMATS)}{hint}")
+    cls = WRITERS[fmt]
+    return cls(RotatingFile(path, max_bytes, backups, header=cls.header), host=host)
+
+
+def read_records(path):
+    """Yield records back out of a .jsonl, .json or .bin file."""
+    fmt = guess_format(path)
+    if fmt == 'json':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        yield from (data if isinstance(data, list) else [data])
+    elif fmt == 'bin':
+        with open(path, 'rb') as f:
+            while True:
+                head = f.read(_LEN.size)
+                if len(head) < _LEN.size:
+                    return
+                body = f.read(_LEN.unpack(head)[0])
+                yield json.loads(zlib.decompress(body))
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def save_snapshot(snap, path):
+    """One-off save of a whole scan, format picked from the extension."""
+    fmt = guess_format(path, default='text')
+    if fmt == 'text':
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(formatting.report_text(snap))
+        return
+    if fmt == 'json':
+        # Same as 'scan --format json', so compare and replay can read it back
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(snap.to_dict(), f, indent=2, default=str)
+            f.write("\n")
+        return
+
+    # Structured formats start a fresh file rather than appending
+    with open(path, 'wb') as f:
+        WRITERS[fmt](f, host=snap.host).write_snapshot(snap)
@@ -0,0 +1,329 @@
+# rules.py - alert rules over raw metrics
+#
+# A rule boils down to "metric stat op value", e.g. "RAM over 90% for 5
+# minutes" is: the minimum of mem.percent over the last 300s is > 90.
+#
+# Rules looking at the same metric over the same window share one pass
+# over its history, and rules comparing the same stat the same way are
+# kept sorted by threshold, so finding the ones that fire is a bisect
+# instead of a loop. Hundreds of rules cost about the same as a handful.
+
+import bisect
+import re
+from collections import namedtuple
+
+from .lazy import available, LazyModule
+from .plugins import extra_metrics
+
+# numpy speeds up window_stats but is only imported once a rule needs it
+has_numpy = available('numpy')
+np = LazyModule('numpy')
+
+LEVELS = ('info', 'warning', 'critical')
+
+# Fraction of a window that has to be covered by samples before a rule
+# over that window is judged (so "for 5 minutes" means 5 minutes of data)
+COVERAGE = 0.9
+
+OPS = ('>', '>=', '<', '<=')
+
+# stat is one of last/min/max/mean/slope, or eta:<full> for predict rules
+Rule = namedtuple('Rule', 'name metric stat op value window level message')
+
+
+class Alert(namedtuple('Alert', 'rule subject value')):
+    """A rule that fired. subject is the metric it fired on, value its stat."""
+    __slots__ = ()
+
+    @property
+    def level(self):
+        return self.rule.level
+
+    @property
+    def label(self):
+        # 'disk.percent:C:\' -> 'C:\'
+        return self.subject.partition(':')[2] or self.subject
+
+    def text(self):
+        return self.rule.message.format(subject=self.subject, label=self.label, value=self.value,
+                                        threshold=self.rule.value, hours=self.value / 3600.0)
+
+
+def threshold(name, metric, op, value, for_=0, level='warning', message=None):
+    """metric op value; with for_ (seconds) it has to hold the whole time."""
+    if op not in OPS:
+        raise ValueError(f"bad operator {op!r}")
+    if for_:
+        # Always above -> the lowest reading is above, and the other way round
+        stat = 'min' if op.startswith('>') else 'max'
+    else:
+        stat = 'last'
+    return Rule(name, metric, stat, op, value, for_, level,
+                message or "{subject} is {value:g} (" + op + " {threshold:g})")
+
+
+def rate(name, metric, op, per_second, window=600, level='warning', message=None):
+    """How fast metric is changing (least squares slope over window)."""
+    if op not in OPS:
+        raise ValueError(f"bad operator {op!r}")
+    return Rule(name, metric, 'slope', op, per_second, window, level,
+                message or "{subject} is changing by {value:.3g}/s")
+
+
+def predict_full(name, metric, within, window=1800, full=100.0, level='warning', message=None):
+    """Fires when the trend over window says metric hits full within seconds."""
+    return Rule(name, metric, f"eta:{full:g}", '<', within, window, level,
+                message or "{label} will be full in about {hours:.1f} hours")
+
+
+# What the Notes section of the report checks. The duration and trend ones
+# need sampled history, so they only fire from the sampler.
+DEFAULT_RULES = (
+    threshold('disk_full', 'disk.percent:*', '>', 90, level='critical',
+              message="Drive {label} is almost full ({value:g}%)"),
+    threshold('disk_full', 'disk.percent:*', '>', 80,
+              message="Drive {label} is getting full ({value:g}%)"),
+    threshold('ram_high', 'mem.percent', '>', 90,
+              message="High RAM usage ({value:g}%) - might need more memory"),
+    threshold('ram_high', 'mem.percent', '>', 90, for_=300, level='critical',
+              message="RAM has been over 90% for 5 minutes"),
+    predict_full('disk_filling', 'disk.percent:*', within=24 * 3600),
+    threshold('disk_busy', 'disk.busy:*', '>', 90,
+              message="Disk {label} is {value:.0f}% busy - it may be slowing things down"),
+    threshold('security', 'security.problems', '>', 0, level='critical',
+              message="{value:g} security check(s) need attention - see Security"),
+)
+
+
+# Parsing rules out of text, one per line:
+#   mem.percent > 90 for 5m
+#   cpu.percent mean > 80 over 10m
+#   disk.percent:* rate > 1/h over 30m
+#   disk.percent:* full in < 24h
+#   critical: swap.percent > 50
+_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_DURATION = r'\d+(?:\.\d+)?[smhd]?'
+_COMPARE = re.compile(
+    r'^(?P<metric>\S+)\s+(?:(?P<stat>last|min|max|mean|rate)\s+)?(?P<op>>=|<=|>|<)\s*'
+    r'(?P<value>-?\d+(?:\.\d+)?)%?(?:/(?P<per>[smhd]))?'
+    r'(?:\s+(?:for|over)\s+(?P<window>' + _DURATION + r'))?$')
+_FULL = re.compile(
+    r'^(?P<metric>\S+)\s+full\s+in\s*<\s*(?P<within>' + _DURATION + r')'
+    r'(?:\s+over\s+(?P<window>' + _DURATION + r'))?$')
+
+
+def seconds(text):
+    """'5m' -> 300.0"""
+    unit = text[-1] if text[-1] in _UNITS else ''
+    return float(text[:-1] if unit else text) * _UNITS[unit]
+
+
+def parse(line, name=None, level='warning'):
+    line = line.strip()
+    head, sep, rest = line.partition(':')
+    if sep and head in LEVELS:
+        level, line = head, rest.strip()
+    name = name or line
+
+    m = _FULL.match(line)
+    if m:
+        window = seconds(m['window']) if m['window'] else 1800
+        return predict_full(name, m['metric'], seconds(m['within']), window, level=level)
+
+    m = _COMPARE.match(line)
+    if not m:
+        raise ValueError(f"can't make sense of rule {line!r}")
+    value = float(m['value'])
+    window = seconds(m['window']) if m['window'] else 0
+    stat = m['stat']
+    if stat == 'rate':
+        return rate(name, m['metric'], m['op'], value / _UNITS[m['per'] or 's'], window or 600, level)
+    if stat in (None, 'last'):
+        return threshold(name, m['metric'], m['op'], value, window, level)
+    if not window:
+        raise ValueError(f"{stat} needs a window ('over 10m'): {line!r}")
+    return Rule(name, m['metric'], stat, m['op'], value, window, level,
+                "{subject} " + stat + " is {value:g} (" + m['op'] + " {threshold:g})")
+
+
+def load(path):
+    """Rules from a text file, one per line, # for comments."""
+    out = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                out.append(parse(line))
+    return out
+
+
+# Where the numbers come from
+class PointSource:
+    """A single set of readings (e.g. from one scan) - no history, so rules
+    with a window are skipped."""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def names(self):
+        return self.metrics.keys()
+
+    def stats(self, name, window):
+        if window:
+            return None
+        v = self.metrics.get(name)
+        return None if v is None else {'last': v}
+
+
+class HistorySource:
+    """Sampled history: a {name: Series} dict such as Sampler.series."""
+
+    def __init__(self, series):
+        self.series = series
+
+    def names(self):
+        return self.series.keys()
+
+    def stats(self, name, window):
+        s = self.series.get(name)
+        if s is None or not s.count:
+            return None
+        if not window:
+            return {'last': s.latest()}
+        return window_stats(s, window)
+
+
+def window_stats(series, window):
+    """last/min/max/mean/slope of a Series over its last window seconds.
+
+    None if the samples don't cover enough of the window yet. Nothing here
+    cares about sample order, so the ring is used as-is without unrolling.
+    """
+    n = len(series)
+    last_t = series.latest_time()
+    since = last_t - window
+
+    if has_numpy:
+        t = np.frombuffer(series.times, count=n)
+        v = np.frombuffer(series.values, count=n)
+        keep = t >= since
+        t, v = t[keep], v[keep]
+        if not len(t) or last_t - t.min() < window * COVERAGE:
+            return None
+        tm = t - t.mean()
+        var = float(np.dot(tm, tm))
+        return {'last': series.latest(), 'min': float(v.min()), 'max': float(v.max()),
+                'mean': float(v.mean()), 'count': len(v),
+                'slope': float(np.dot(tm, v - v.mean())) / var if var else None}
+
+    pts = series.items(since)
+    if not pts or last_t - pts[0][0] < window * COVERAGE:
+        return None
+    k = len(pts)
+    mt = sum(p[0] for p in pts) / k
+    mv = sum(p[1] for p in pts) / k
+    var = sum((p[0] - mt) ** 2 for p in pts)
+    cov = sum((p[0] - mt) * (p[1] - mv) for p in pts)
+    vals = [p[1] for p in pts]
+    return {'last': series.latest(), 'min': min(vals), 'max': max(vals), 'mean': mv,
+            'count': k, 'slope': cov / var if var else None}
+
+
+def _stat(st, stat):
+    if stat.startswith('eta:'):
+        # Seconds until the trend reaches full; None if it isn't growing
+        slope = st.get('slope')
+        if not slope or slope <= 0:
+            return None
+        return max(0.0, (float(stat[4:]) - st['last']) / slope)
+    return st.get(stat)
+
+
+class RuleSet:
+    """A batch of rules compiled for evaluating together."""
+
+    def __init__(self, rules=()):
+        self.rules = []
+        # (metric, window) -> {(stat, op): [sorted thresholds, rules in the same order]}
+        self._groups = {}
+        for r in rules:
+            self.add(r)
+
+    def add(self, rule):
+        if rule.op not in OPS:
+            raise ValueError(f"bad operator {rule.op!r}")
+        self.rules.append(rule)
+        checks = self._groups.setdefault((rule.metric, rule.window), {})
+        limits, rules = checks.setdefault((rule.stat, rule.op), ([], []))
+        i = bisect.bisect_right(limits, rule.value)
+        limits.insert(i, rule.value)
+        rules.insert(i, rule)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def evaluate(self, source):
+        """Every rule that fires against source, as Alerts."""
+        alerts = []
+        names = list(source.names())
+        for (metric, window), checks in self._groups.items():
+            for name in _matching(metric, names):
+                st = source.stats(name, window)
+                if st is None:
+                    continue
+                for (stat, op), (limits, rules) in checks.items():
+                    v = _stat(st, stat)
+                    if v is None:
+                        continue
+                    if op == '>':
+                        fired = rules[:bisect.bisect_left(limits, v)]
+                    elif op == '>=':
+                        fired = rules[:bisect.bisect_right(limits, v)]
+                    elif op == '<':
+                        fired = rules[bisect.bisect_right(limits, v):]
+                    else:
+                        fired = rules[bisect.bisect_left(limits, v):]
+                    alerts.extend(Alert(r, name, v) for r in fired)
+        return alerts
+
+
+def _matching(metric, names):
+    if metric.endswith('*'):
+        prefix = metric[:-1]
+        return [n for n in names if n.startswith(prefix)]
+    return [metric] if metric in names else []
+
+
+def worst(alerts):
+    """Only the most severe alert per (rule name, subject), in rule order."""
+    best = {}
+    for a in alerts:
+        key = (a.rule.name, a.subject)
+        cur = best.get(key)
+        if cur is None or LEVELS.index(a.level) > LEVELS.index(cur.level):
+            best[key] = a
+    return list(best.values())
+
+
+def snapshot_metrics(snap):
+    """Flat {metric: number} from a Snapshot, named like the sampler's series."""
+    out = {}
+    for d in snap.disks or []:
+        out['disk.percent:' + d.mount] = d.percent
+    for d in snap.diskio or []:
+        out['disk.busy:' + d.device] = d.busy
+    for n in snap.net or []:
+        out['net.sent_bps:' + n.name] = n.sent_bps
+        out['net.recv_bps:' + n.name] = n.recv_bps
+        out['net.errors:' + n.name] = n.errin + n.errout
+    for name, value in (snap.extra or {}).items():
+        out.update(extra_metrics(name, value))
+    if snap.hw:
+        out['mem.percent'] = snap.hw.mem_percent
+        out['cpu.percent'] = snap.hw.cpu_percent
+        out['swap.percent'] = snap.hw.swap_percent
+    return {k: v for k, v in out.items() if v is not None}
+
+
+def check_snapshot(snap, rules=None):
+    return worst(RuleSet(rules or DEFAULT_RULES).evaluate(PointSource(snapshot_metrics(snap))))
@@ -0,0 +1,308 @@
+# sampler.py - keeps sampling CPU/memory/disk/network in the background
+#
+# Every metric lives in a fixed size ring backed by array('d'), so memory
+# use is set when the sampler starts and doesn't grow however long it runs.
+
+import threading
+import time
+from array import array
+from collections import deque
+
+from . import collectors
+from .tracing import tracer
+
+DEFAULT_INTERVAL = 1.0
+DEFAULT_CAPACITY = 3600  # an hour at 1 Hz
+DEFAULT_WINDOWS = (60, 300)  # seconds, kept up to date on every sample
+
+# Plain readings, stored as-is
+GAUGES = ('cpu.percent', 'mem.percent', 'mem.used', 'swap.percent')
+
+# Ever-growing counters, stored as per-second rates
+COUNTERS = ('disk.read_bps', 'disk.write_bps', 'net.sent_bps', 'net.recv_bps')
+
+
+class Window:
+    """min/max/mean over the last seconds of a Series, updated as samples
+    come in: a running sum plus monotonic queues, so each push costs O(1)
+    amortized and so does asking. Holds at most the samples in the window."""
+
+    def __init__(self, seconds, capacity):
+        self.seconds = seconds
+        self.capacity = capacity
+        self._samples = deque()  # (sample number, time, value), oldest first
+        self._lo = deque()       # (sample number, value), values going up: candidates for min
+        self._hi = deque()       # same, values going down: candidates for max
+        self._sum = 0.0
+        self._pushes = 0
+
+    def push(self, t, value):
+        n = self._pushes
+        self._pushes += 1
+        self._samples.append((n, t, value))
+        self._sum += value
+        while self._lo and self._lo[-1][1] >= value:
+            self._lo.pop()
+        self._lo.append((n, value))
+        while self._hi and self._hi[-1][1] <= value:
+            self._hi.pop()
+        self._hi.append((n, value))
+
+        # Never more than the ring holds, same as a window worked out from it
+        cutoff = t - self.seconds
+        samples = self._samples
+        while samples[0][1] < cutoff or len(samples) > self.capacity:
+            old_n, _, old = samples.popleft()
+            self._sum -= old
+            if self._lo[0][0] == old_n:
+                self._lo.popleft()
+            if self._hi[0][0] == old_n:
+                self._hi.popleft()
+
+        # Same drift fix as Series
+        if self._pushes % self.capacity == 0:
+            self._sum = sum(v for _, _, v in samples)
+
+    def stats(self):
+        if not self._samples:
+            return None
+        n = len(self._samples)
+        return {'min': self._lo[0][1], 'max': self._hi[0][1], 'mean': self._sum / n, 'count': n}
+
+
+class Series:
+    """Fixed size ring of (time, value) samples.
+
+    latest(), min(), max() and mean() are O(1) and cover everything still
+    in the ring. Min/max use monotonic queues of sample numbers, which also
+    live in preallocated arrays. window() is O(1) for the window lengths
+    given up front (windows) and O(k) in the samples covered for any other.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, windows=()):
+        self.capacity = capacity
+        self.windows = {seconds: Window(seconds, capacity) for seconds in windows}
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.count = 0  # samples pushed ever, not samples held
+        self._sum = 0.0
+
+        # Monotonic queues: sample numbers, head/tail are running counters
+        self._lo = array('q', bytes(8 * capacity))
+        self._hi = array('q', bytes(8 * capacity))
+        self._lo_head = self._lo_tail = 0
+        self._hi_head = self._hi_tail = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def push(self, t, value):
+        cap = self.capacity
+        n = self.count
+        slot = n % cap
+
+        if n >= cap:
+            # Oldest sample falls out of the ring
+            oldest = n - cap
+            self._sum -= self.values[slot]
+            if self._lo_head < self._lo_tail and self._lo[self._lo_head % cap] == oldest:
+                self._lo_head += 1
+            if self._hi_head < self._hi_tail and self._hi[self._hi_head % cap] == oldest:
+                self._hi_head += 1
+
+        self.times[slot] = t
+        self.values[slot] = value
+        self._sum += value
+
+        values = self.values
+        while self._lo_tail > self._lo_head and values[self._lo[(self._lo_tail - 1) % cap] % cap] >= value:
+            self._lo_tail -= 1
+        self._lo[self._lo_tail % cap] = n
+        self._lo_tail += 1
+
+        while self._hi_tail > self._hi_head and values[self._hi[(self._hi_tail - 1) % cap] % cap] <= value:
+            self._hi_tail -= 1
+        self._hi[self._hi_tail % cap] = n
+        self._hi_tail += 1
+
+        self.count = n + 1
+        for w in self.windows.values():
+            w.push(t, value)
+
+        # Running sums drift over days, so redo it properly once per lap
+        if self.count % cap == 0:
+            self._sum = sum(self.values)
+
+    def latest(self):
+        if not self.count:
+            return None
+        return self.values[(self.count - 1) % self.capacity]
+
+    def latest_time(self):
+        if not self.count:
+            return None
+        return self.times[(self.count - 1) % self.capacity]
+
+    def min(self):
+        if not self.count:
+            return None
+        return self.values[self._lo[self._lo_head % self.capacity] % self.capacity]
+
+    def max(self):
+        if not self.count:
+            return None
+        return self.values[self._hi[self._hi_head % self.capacity] % self.capacity]
+
+    def mean(self):
+        if not self.count:
+            return None
+        return self._sum / len(self)
+
+    def items(self, since=None):
+        """(time, value) pairs oldest first, optionally only those after since."""
+        cap = self.capacity
+        first = max(0, self.count - cap)
+        if since is not None:
+            # Times only go up, so walk back from the newest and stop at the
+            # first one that's too old - only the samples wanted get looked at
+            n = self.count
+            while n > first and self.times[(n - 1) % cap] >= since:
+                n -= 1
+            first = n
+        return [(self.times[n % cap], self.values[n % cap]) for n in range(first, self.count)]
+
+    def window(self, seconds):
+        """min/max/mean over the last few seconds. O(1) for a window this
+        series keeps, otherwise O(k) in the samples it covers."""
+        if not self.count:
+            return None
+        if seconds in self.windows:
+            return self.windows[seconds].stats()
+        since = self.latest_time() - seconds
+        vals = [v for _, v in self.items(since)]
+        return {'min': min(vals), 'max': max(vals), 'mean': sum(vals) / len(vals), 'count': len(vals)}
+
+
+class Sampler:
+    """Background thread that samples the machine every interval seconds."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, capacity=DEFAULT_CAPACITY, windows=DEFAULT_WINDOWS):
+        self.interval = interval
+        self.capacity = capacity
+        self.windows = windows
+        self.series = {name: Series(capacity, windows) for name in GAUGES + COUNTERS}
+        self._last = {}  # last raw counter readings, for working out rates
+        self._primed = False
+        self._listeners = []
+        self._fresh = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_listener(self, fn):
+        # fn(ts, {metric: value}) gets called after every sample
+        self._listeners.append(fn)
+
+    def sample_once(self):
+        if not collectors.has_psutil:
+            return
+        with tracer.span('sampler'):
+            return self._sample()
+
+    def _sample(self):
+        psutil = collectors.psutil
+        now = time.time()
+        self._fresh = {}
+
+        # cpu_percent(None) measures since the last call, so the very first
+        # reading is meaningless and only sets the starting point
+        cpu = psutil.cpu_percent(interval=None)
+        if self._primed:
+            self._push('cpu.percent', now, cpu)
+        self._primed = True
+
+        mem = psutil.virtual_memory()
+        self._push('mem.percent', now, mem.percent)
+        self._push('mem.used', now, mem.used)
+        self._push('swap.percent', now, psutil.swap_memory().percent)
+
+        disk = psutil.disk_io_counters()
+        if disk:
+            self._count('disk.read_bps', now, disk.read_bytes)
+            self._count('disk.write_bps', now, disk.write_bytes)
+
+        net = psutil.net_io_counters()
+        if net:
+            self._count('net.sent_bps', now, net.bytes_sent)
+            self._count('net.recv_bps', now, net.bytes_recv)
+
+        # Per-drive usage for the "fills up in N hours" rules. Comes out of
+        # the metric cache, so this is nearly free between disk refreshes
+        for d in collectors.get_disk_info():
+            if d.percent is not None:
+                self._push('disk.percent:' + d.mount, now, d.percent)
+
+        for fn in self._listeners:
+            fn(now, self._fresh)
+        return self._fresh
+
+    def _push(self, name, now, value):
+        s = self.series.get(name)
+        if s is None:
+            s = self.series[name] = Series(self.capacity, self.windows)
+        s.push(now, value)
+        self._fresh[name] = value
+
+    def _count(self, name, now, raw):
+        # Turn a running total into a per-second rate
+        prev = self._last.get(name)
+        self._last[name] = (now, raw)
+        if prev is None:
+            return
+        dt = now - prev[0]
+        if dt <= 0:
+            return
+        delta = raw - prev[1]
+        if delta < 0:  # counter wrapped or got reset
+            delta = 0
+        self._push(name, now, delta / dt)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        # Tick on a fixed schedule so a slow sample doesn't push later ones back
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample_once()
+            except Exception as e:
+                tracer.swallowed('sampler tick', e)
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                # We fell behind, skip the missed ticks instead of bunching up
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    # Queries
+    def latest(self, name):
+        return self.series[name].latest()
+
+    def stats(self, name):
+        s = self.series[name]
+        return {'latest': s.latest(), 'min': s.min(), 'max': s.max(), 'mean': s.mean(), 'count': len(s)}
+
+    def window(self, name, seconds):
+        # O(1) for the windows the sampler was set up with
+        return self.series[name].window(seconds)
@@ -0,0 +1,127 @@
+# scheduler.py - runs collectors side by side instead of one after another
+
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from .events import Cancelled
+
+# What a collector hands back when it finishes (or when we give up on it)
+Result = namedtuple('Result', 'name value error elapsed timed_out')
+
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 15.0
+
+
+class Scheduler:
+    """Runs a batch of collectors on a small pool of worker threads.
+
+    Every collector gets its own deadline, counted from when it starts
+    running. A collector that blows its deadline is reported as timed out
+    and its (stuck) thread is left behind; a fresh worker takes its place
+    so the rest of the batch isn't held up.
+    """
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self._spawned = 0
+
+    def run(self, jobs, on_result=None, timeouts=None, cancel=None):
+        """Run jobs ({name: func}) and return {name: Result}.
+
+        on_result is called with each Result as soon as it's ready, from
+        the thread that called run(). If cancel (a CancelToken) fires, jobs
+        that haven't finished are reported as Cancelled and run() returns
+        right away without waiting for them.
+        """
+        timeouts = timeouts or {}
+        pending = queue.Queue()
+        for name, func in jobs.items():
+            pending.put((name, func))
+
+        finished = queue.Queue()
+        started = {}
+        lock = threading.Lock()
+        results = {}
+
+        def worker():
+            while True:
+                try:
+                    name, func = pending.get_nowait()
+                except queue.Empty:
+                    return
+
+                start = time.perf_counter()
+                with lock:
+                    started[name] = start
+
+                try:
+                    value, error = func(), None
+                except Exception as e:
+                    value, error = None, e
+                finished.put(Result(name, value, error, time.perf_counter() - start, False))
+
+        def spawn():
+            self._spawned += 1
+            t = threading.Thread(target=worker, name=f"collector-{self._spawned}")
+            t.daemon = True
+            t.start()
+
+        def deliver(res):
+            results[res.name] = res
+            if on_result:
+                on_result(res)
+
+        if cancel is not None:
+            # Wake the loop below as soon as someone hits cancel
+            cancel.on_cancel(lambda: finished.put(None))
+
+        for _ in range(min(self.max_workers, len(jobs))):
+            spawn()
+
+        while len(results) < len(jobs):
+            if cancel is not None and cancel.cancelled:
+                # Stop handing out work and write off whatever's left
+                while True:
+                    try:
+                        pending.get_nowait()
+                    except queue.Empty:
+                        break
+                now = time.perf_counter()
+                for name in jobs:
+                    if name not in results:
+                        start = started.get(name, now)
+                        deliver(Result(name, None, Cancelled(f"{name} cancelled"), now - start, False))
+                break
+
+            with lock:
+                running = {n: t for n, t in started.items() if n not in results}
+
+            # Sleep until something finishes or the next deadline comes up
+            now = time.perf_counter()
+            if running:
+                deadline = min(t + timeouts.get(n, self.timeout) for n, t in running.items())
+            else:
+                deadline = now + self.timeout
+
+            try:
+                res = finished.get(timeout=max(0.0, deadline - now))
+                # None is the cancel wake-up, late answers from timed out jobs are dropped
+                if res is not None and res.name not in results:
+                    deliver(res)
+            except queue.Empty:
+                pass
+
+            now = time.perf_counter()
+            for name, start in running.items():
+                limit = timeouts.get(name, self.timeout)
+                if name not in results and now - start >= limit:
+                    err = TimeoutError(f"{name} took longer than {limit:g}s")
+                    deliver(Result(name, None, err, now - start, True))
+                    # That worker is stuck, get another one going
+                    if not pending.empty():
+                        spawn()
+
+        return results
@@ -0,0 +1,398 @@
+# security.py - antivirus, firewall, updates, accounts and services
+#
+# These are the slow ones. SecurityCenter2 over WMI, walking every service
+# and reading the update history can each take several seconds, so the
+# security collector never waits on them: every query's answer is cached
+# for a long time (the security.* TTLs in cache.py) and refreshed on a
+# background thread once it's stale (cache.get_async). A scan gets
+# whatever is there, and "checking" the very first time round.
+#
+# What gets asked is up to a Queries object from the backend
+# (backends.current().security()): WindowsQueries, LinuxQueries, or
+# FakeQueries/RecordedQueries for tests and replays. Each query returns a
+# SecurityCheck.
+
+import os
+import subprocess
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from . import backends
+from .cache import cache
+from .lazy import available
+from .records import SecurityCheck, plain
+from .tracing import tracer
+
+QUERIES = ('antivirus', 'firewall', 'updates', 'accounts', 'services')
+STATUSES = ('ok', 'warning', 'problem', 'unknown', 'checking')
+
+# Days since the last update before it's a warning / a problem
+UPDATES_WARN_DAYS = 30
+UPDATES_PROBLEM_DAYS = 90
+
+# Longest we let any one command line tool run
+COMMAND_TIMEOUT = 15.0
+
+has_wmi = available('wmi')
+
+
+def check(name, status, detail, items=None):
+    return SecurityCheck(name, status, detail, items or [], time.time())
+
+
+def updates_check(last, pending=None, items=None):
+    # Same verdict whatever OS the date came from
+    if last is None:
+        return check('updates', 'unknown', "Couldn't tell when updates were last installed", items)
+    days = (time.time() - last) / 86400
+    status = 'ok'
+    if days > UPDATES_PROBLEM_DAYS:
+        status = 'problem'
+    elif days > UPDATES_WARN_DAYS:
+        status = 'warning'
+    detail = f"Last installed {datetime.fromtimestamp(last).strftime('%Y-%m-%d')} ({days:.0f} days ago)"
+    if pending:
+        detail += f", {pending} waiting"
+        status = 'warning' if status == 'ok' else status
+    return check('updates', status, detail, items)
+
+
+def run(cmd, timeout=COMMAND_TIMEOUT):
+    """stdout of a command, or None if it isn't there / fails / takes too long."""
+    try:
+        out = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                             timeout=timeout, universal_newlines=True)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        tracer.swallowed(f"run {cmd[0]}", e)
+        return None
+    return out.stdout
+
+
+class Queries:
+    """Knows nothing about this OS, so every check comes back unknown."""
+    slow = True  # False: answers are instant, ask every time rather than cache
+
+    def antivirus(self):
+        return check('antivirus', 'unknown', "Not checked on this system")
+
+    def firewall(self):
+        return check('firewall', 'unknown', "Not checked on this system")
+
+    def updates(self):
+        return check('updates', 'unknown', "Not checked on this system")
+
+    def accounts(self):
+        return check('accounts', 'unknown', "Not checked on this system")
+
+    def services(self):
+        return check('services', 'unknown', "Not checked on this system")
+
+
+class WindowsQueries(Queries):
+    """WMI (Security Center, firewall profiles, hotfixes, accounts) and the
+    service manager through psutil."""
+
+    @contextmanager
+    def _wmi(self, namespace=None):
+        # These run on background threads, and COM needs setting up per thread
+        if not has_wmi:
+            raise RuntimeError("Need the wmi module for this check")
+        import pythoncom
+        import wmi
+        pythoncom.CoInitialize()
+        try:
+            yield wmi.WMI(namespace=namespace) if namespace else wmi.WMI()
+        finally:
+            pythoncom.CoUninitialize()
+
+    def antivirus(self):
+        with self._wmi(r"root\SecurityCenter2") as c:
+            products = c.AntiVirusProduct()
+        if not products:
+            # Server editions don't have a Security Center at all
+            return check('antivirus', 'unknown', "Nothing registered with Security Center")
+        items = []
+        for p in products:
+            state = int(p.productState)
+            items.append({'name': p.displayName,
+                          'enabled': bool((state >> 12) & 1),
+                          'up_to_date': (state >> 4) & 0xF == 0})
+        on = [i for i in items if i['enabled']]
+        if not on:
+            return check('antivirus', 'problem', "No antivirus is turned on", items)
+        stale = [i['name'] for i in on if not i['up_to_date']]
+        if stale:
+            return check('antivirus', 'warning', f"{', '.join(stale)} is out of date", items)
+        return check('antivirus', 'ok', ", ".join(i['name'] for i in on), items)
+
+    def firewall(self):
+        with self._wmi(r"root\StandardCimv2") as c:
+            profiles = c.MSFT_NetFirewallProfile()
+        items = [{'name': p.Name, 'enabled': bool(p.Enabled)} for p in profiles]
+        off = [i['name'] for i in items if not i['enabled']]
+        if not items:
+            return check('firewall', 'unknown', "No firewall profiles found")
+        if len(off) == len(items):
+            return check('firewall', 'problem', "Firewall is off", items)
+        if off:
+            return check('firewall', 'warning', f"Off for {', '.join(off)}", items)
+        return check('firewall', 'ok', "On for every profile", items)
+
+    def updates(self):
+        with self._wmi() as c:
+            fixes = c.Win32_QuickFixEngineering()
+        items = []
+        for f in fixes:
+            # InstalledOn is M/D/YYYY, and sometimes missing or hex junk
+            try:
+                when = datetime.strptime(f.InstalledOn, '%m/%d/%Y').timestamp()
+            except (TypeError, ValueError):
+                continue
+            items.append({'id': f.HotFixID, 'installed': when, 'description': f.Description})
+        items.sort(key=lambda i: i['installed'], reverse=True)
+        return updates_check(items[0]['installed'] if items else None, items=items[:10])
+
+    def accounts(self):
+        with self._wmi() as c:
+            users = c.Win32_UserAccount(LocalAccount=True)
+            admins = c.Win32_Group(LocalAccount=True, SID='S-1-5-32-544')  # Administrators, any language
+            admin_names = set()
+            if admins:
+                admin_names = {u.Name for u in admins[0].associators(wmi_result_class='Win32_UserAccount')}
+        items = [{'name': u.Name, 'admin': u.Name in admin_names, 'disabled': bool(u.Disabled),
+                  'builtin': u.SID.rsplit('-', 1)[-1] in ('500', '501')} for u in users]
+        return accounts_check(items, guest=[u.Name for u in users if u.SID.endswith('-501') and not u.Disabled])
+
+    def services(self):
+        from . import collectors
+        psutil = collectors.psutil
+        stopped = []
+        for s in psutil.win_service_iter():
+            try:
+                info = s.as_dict()
+            except psutil.Error as e:
+                tracer.swallowed('service info', e)
+                continue
+            if info['start_type'] == 'automatic' and info['status'] != 'running':
+                stopped.append({'name': info['name'], 'display': info['display_name'], 'status': info['status']})
+        return services_check(stopped, "set to start automatically but not running")
+
+
+class LinuxQueries(Queries):
+    """systemd, the package manager's logs and /etc/passwd."""
+
+    AV_UNITS = ('clamav-daemon', 'clamd@scan', 'clamav-freshclam', 'falcon-sensor', 'mdatp', 'sophos-spl')
+    FIREWALL_UNITS = ('firewalld', 'ufw', 'nftables', 'iptables', 'netfilter-persistent')
+    # Newest of these tells us when packages were last updated
+    UPDATE_LOGS = ('/var/log/apt/history.log', '/var/lib/apt/periodic/upgrade-stamp', '/var/log/dnf.rpm.log',
+                   '/var/log/dnf.log', '/var/log/yum.log', '/var/log/pacman.log', '/var/log/zypp/history')
+    PENDING = '/var/lib/update-notifier/updates-available'
+    ADMIN_GROUPS = ('sudo', 'wheel', 'admin')
+
+    def _active(self, units):
+        # Units that are running, out of the ones asked about
+        out = run(['systemctl', 'is-active'] + list(units))
+        if out is None:
+            return None
+        return [u for u, state in zip(units, out.split()) if state == 'active']
+
+    def antivirus(self):
+        active = self._active(self.AV_UNITS)
+        if active is None:
+            return check('antivirus', 'unknown', "Couldn't ask systemd")
+        items = [{'name': u, 'enabled': u in active} for u in self.AV_UNITS if u in active]
+        if not active:
+            return check('antivirus', 'unknown', "No antivirus running (not unusual on Linux)")
+        return check('antivirus', 'ok', ", ".join(active), items)
+
+    def firewall(self):
+        active = self._active(self.FIREWALL_UNITS) or []
+        items = [{'name': u, 'enabled': True} for u in active]
+        rules = None
+        out = run(['nft', 'list', 'ruleset'])  # needs root, None/empty otherwise
+        if out:
+            # A rule is a line ending in a verdict ("tcp dport 22 accept")
+            rules = sum(1 for line in out.splitlines() if line.split()[-1:] in (['accept'], ['drop'], ['reject']))
+            items.append({'name': 'nftables rules', 'count': rules})
+        if active or rules:
+            detail = ", ".join(active) if active else f"{rules} nftables rules"
+            return check('firewall', 'ok', detail, items)
+        if out is None and os.geteuid() != 0:
+            return check('firewall', 'unknown', "No firewall service running (rules need root to read)", items)
+        return check('firewall', 'warning', "No firewall service or rules found", items)
+
+    def updates(self):
+        times = []
+        for path in self.UPDATE_LOGS:
+            try:
+                times.append(os.path.getmtime(path))
+            except OSError:
+                continue
+        pending = None
+        try:
+            with open(self.PENDING, encoding='utf-8') as f:
+                for line in f:
+                    words = line.split()
+                    if words and words[0].isdigit() and 'update' in line:
+                        pending = int(words[0])
+                        break
+        except OSError:
+            pass
+        return updates_check(max(times) if times else None, pending)
+
+    def accounts(self):
+        import grp
+        import pwd
+
+        admins = set()
+        for g in self.ADMIN_GROUPS:
+            try:
+                admins.update(grp.getgrnam(g).gr_mem)
+            except KeyError:
+                continue
+        items, root_alikes = [], []
+        for u in pwd.getpwall():
+            login = not u.pw_shell.endswith(('nologin', 'false'))
+            if u.pw_uid == 0 and u.pw_name != 'root':
+                root_alikes.append(u.pw_name)
+            if u.pw_uid == 0 or (u.pw_uid >= 1000 and login and u.pw_name != 'nobody'):
+                items.append({'name': u.pw_name, 'admin': u.pw_uid == 0 or u.pw_name in admins,
+                              'disabled': not login, 'builtin': u.pw_uid == 0})
+        return accounts_check(items, root_alikes=root_alikes)
+
+    def services(self):
+        out = run(['systemctl', 'list-units', '--type=service', '--state=failed', '--no-legend', '--plain'])
+        if out is None:
+            return check('services', 'unknown', "Couldn't ask systemd")
+        failed = [{'name': line.split()[0], 'status': 'failed'} for line in out.splitlines() if line.strip()]
+        return services_check(failed, "failed")
+
+
+def accounts_check(items, guest=(), root_alikes=()):
+    admins = [i['name'] for i in items if i['admin'] and not i['disabled']]
+    if guest:
+        return check('accounts', 'problem', "Guest account is enabled", items)
+    if root_alikes:
+        return check('accounts', 'problem', f"Accounts with root's id: {', '.join(root_alikes)}", items)
+    users = [i for i in items if not i['disabled']]
+    detail = f"{len(users)} enabled, {len(admins)} admin ({', '.join(admins[:5])})"
+    return check('accounts', 'warning' if len(admins) > 3 else 'ok', detail, items)
+
+
+def services_check(bad, what):
+    if not bad:
+        return check('services', 'ok', "Nothing " + what)
+    names = ", ".join(s['name'] for s in bad[:5]) + (f" and {len(bad) - 5} more" if len(bad) > 5 else "")
+    return check('services', 'warning', f"{len(bad)} {what}: {names}", bad)
+
+
+class FakeQueries(Queries):
+    """Made up answers, the same every time. delay makes every query that
+    slow (seconds), fail names queries that raise instead."""
+
+    def __init__(self, delay=0.0, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.slow = delay > 0
+
+    def _slow(self, name):
+        if self.delay:
+            time.sleep(self.delay)
+        if name in self.fail:
+            raise RuntimeError(f"{name} query failed (on purpose)")
+
+    def antivirus(self):
+        self._slow('antivirus')
+        return check('antivirus', 'ok', "Fake Defender",
+                     [{'name': "Fake Defender", 'enabled': True, 'up_to_date': True}])
+
+    def firewall(self):
+        self._slow('firewall')
+        return check('firewall', 'warning', "Off for Public",
+                     [{'name': 'Domain', 'enabled': True}, {'name': 'Private', 'enabled': True},
+                      {'name': 'Public', 'enabled': False}])
+
+    def updates(self):
+        self._slow('updates')
+        return updates_check(time.time() - 12 * 86400, pending=2)
+
+    def accounts(self):
+        self._slow('accounts')
+        return accounts_check([{'name': 'admin', 'admin': True, 'disabled': False, 'builtin': False},
+                               {'name': 'user', 'admin': False, 'disabled': False, 'builtin': False}])
+
+    def services(self):
+        self._slow('services')
+        return services_check([], "set to start automatically but not running")
+
+
+class RecordedQueries(Queries):
+    """Hands back whatever a recorded snapshot said (see backends.ReplayBackend)."""
+    slow = False  # and follows the replay from one snapshot to the next
+
+    def __init__(self, recorded):
+        self.recorded = recorded  # () -> the security section as saved, or None
+
+    def _answer(self, name):
+        for c in self.recorded() or ():
+            if c.get('name') == name:
+                return SecurityCheck(*[c.get(f) for f in SecurityCheck._fields])
+        return check(name, 'unknown', "Not in the recording")
+
+    def antivirus(self):
+        return self._answer('antivirus')
+
+    def firewall(self):
+        return self._answer('firewall')
+
+    def updates(self):
+        return self._answer('updates')
+
+    def accounts(self):
+        return self._answer('accounts')
+
+    def services(self):
+        return self._answer('services')
+
+
+def get_security_info():
+    """[SecurityCheck], straight away. Anything stale is refreshed in the
+    background and shows up in a later scan."""
+    queries = backends.current().security()
+    out = []
+    for name in QUERIES:
+        if not queries.slow:
+            out.append(getattr(queries, name)())
+            continue
+        key = 'security.' + name
+        c = cache.get_async(key, getattr(queries, name))
+        if c is None:
+            err = cache.error(key)
+            if err is not None:
+                c = SecurityCheck(name, 'unknown', f"Failed: {err}", [], None)
+            else:
+                c = SecurityCheck(name, 'checking', "Still checking...", [], None)
+        out.append(c)
+    return out
+
+
+def wait(timeout=None):
+    """Wait for any security queries still running (True if they all finished)."""
+    return cache.wait(['security.' + name for name in QUERIES], timeout)
+
+
+# How the registry shows and measures it (plugins.py)
+def security_text(checks):
+    lines = []
+    for c in plain(checks):
+        lines.append(f"{c['name'].capitalize():10} {c['status'].upper():8} {c['detail']}")
+    return "\n".join(lines) + "\n"
+
+
+def security_metrics(checks):
+    checks = plain(checks)
+    return {
+        'security.problems': sum(1 for c in checks if c['status'] == 'problem'),
+        'security.warnings': sum(1 for c in checks if c['status'] == 'warning'),
+    }
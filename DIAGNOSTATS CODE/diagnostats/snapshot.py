@@ -0,0 +1,55 @@
+# snapshot.py - what one scan found, as a plain object
+
+import time
+from collections import namedtuple
+
+from . import backends, records
+
+SECTIONS = ('sys', 'hw', 'disks', 'diskio', 'procs', 'net')
+
+# Sections that come back as a list rather than a dict
+LIST_SECTIONS = ('disks', 'diskio', 'procs', 'net')
+
+
+class Snapshot(namedtuple('Snapshot', 'host taken sys hw disks diskio procs net extra timings errors')):
+    """One full scan of a machine.
+
+    Sections hold the typed records from records.py (None, or an empty
+    list, if that collector didn't run or failed). extra maps plugin
+    collector name to its (plain json) answer. taken is a unix timestamp,
+    timings maps collector name to seconds and errors maps collector name
+    to what went wrong (if anything did).
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_results(cls, results, taken=None, host=None):
+        # Build from the scheduler's {name: Result} dict
+        sections = {}
+        for name in SECTIONS:
+            res = results.get(name)
+            if res is not None and res.error is None:
+                sections[name] = res.value
+            else:
+                sections[name] = [] if name in LIST_SECTIONS else None
+        extra = {n: records.plain(r.value) for n, r in results.items()
+                 if n not in SECTIONS and r.error is None}
+
+        return cls(
+            host=host or backends.current().host(),
+            taken=taken if taken is not None else time.time(),
+            extra=extra,
+            timings={n: r.elapsed for n, r in results.items()},
+            errors={n: str(r.error) for n, r in results.items() if r.error is not None},
+            **sections
+        )
+
+    @classmethod
+    def from_dict(cls, d):
+        snap = cls(**{f: records.from_plain(f, d.get(f)) for f in cls._fields})
+        # Saved before there were plugins
+        return snap if snap.extra is not None else snap._replace(extra={})
+
+    def to_dict(self):
+        # Plain dicts/lists all the way down, ready for json
+        return {f: records.plain(v) for f, v in self._asdict().items()}
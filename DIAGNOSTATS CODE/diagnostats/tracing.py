@@ -0,0 +1,224 @@
+# tracing.py - where does a scan spend its time?
+#
+# Every collector runs inside a span, and psutil is wrapped so each call
+# made inside a span gets counted and timed against it. Exceptions that
+# the collectors catch and carry on from are recorded too, so they stop
+# vanishing into "except: pass".
+
+import threading
+import time
+from contextlib import contextmanager
+
+MAX_EXAMPLES = 5  # swallowed exception messages kept per (where, type)
+
+
+class SpanStats:
+    __slots__ = ('name', 'runs', 'wall', 'cpu', 'last_wall', 'last_cpu', 'errors', 'calls', 'swallowed')
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.last_wall = 0.0
+        self.last_cpu = 0.0
+        self.errors = 0       # exceptions that escaped the collector
+        self.calls = {}       # api -> [count, seconds]
+        self.swallowed = {}   # (where, exc type) -> [count, [examples]]
+
+    def as_dict(self):
+        return {
+            'runs': self.runs,
+            'wall_s': self.wall,
+            'cpu_s': self.cpu,
+            'last_wall_s': self.last_wall,
+            'last_cpu_s': self.last_cpu,
+            'errors': self.errors,
+            'calls': {api: {'count': c, 'seconds': t} for api, (c, t) in self.calls.items()},
+            'swallowed': [{'where': w, 'type': t, 'count': c, 'examples': ex}
+                          for (w, t), (c, ex) in self.swallowed.items()],
+        }
+
+
+class Tracer:
+    """Collects per-collector timings, psutil call counts and swallowed errors."""
+
+    def __init__(self):
+        self.enabled = True
+        self.spans = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stats(self, name):
+        st = self.spans.get(name)
+        if st is None:
+            with self._lock:
+                st = self.spans.setdefault(name, SpanStats(name))
+        return st
+
+    def _current(self):
+        stack = getattr(self._local, 'stack', None)
+        return self._stats(stack[-1] if stack else '(outside scan)')
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(name)
+
+        st = self._stats(name)
+        wall0 = time.perf_counter()
+        cpu0 = time.thread_time()
+        try:
+            yield st
+        except Exception:
+            st.errors += 1
+            raise
+        finally:
+            wall = time.perf_counter() - wall0
+            cpu = time.thread_time() - cpu0
+            stack.pop()
+            with self._lock:
+                st.runs += 1
+                st.wall += wall
+                st.cpu += cpu
+                st.last_wall = wall
+                st.last_cpu = cpu
+
+    def traced(self, name, fn):
+        # fn wrapped so every call runs inside span(name)
+        def run(*args, **kwargs):
+            with self.span(name):
+                return fn(*args, **kwargs)
+        run.__name__ = getattr(fn, '__name__', name)
+        return run
+
+    def record_call(self, api, seconds, count=1):
+        if not self.enabled:
+            return
+        st = self._current()
+        with self._lock:
+            c = st.calls.get(api)
+            if c is None:
+                st.calls[api] = [count, seconds]
+            else:
+                c[0] += count
+                c[1] += seconds
+
+    def swallowed(self, where, exc):
+        """Note an exception that got caught and ignored."""
+        if not self.enabled:
+            return
+        st = self._current()
+        key = (where, type(exc).__name__)
+        with self._lock:
+            entry = st.swallowed.get(key)
+            if entry is None:
+                entry = st.swallowed[key] = [0, []]
+            entry[0] += 1
+            if len(entry[1]) < MAX_EXAMPLES:
+                entry[1].append(str(exc))
+
+    def wrap(self, module):
+        """Proxy for a module (psutil) that times every function call made through it."""
+        return TracedModule(module, self)
+
+    def report(self):
+        with self._lock:
+            return {name: st.as_dict() for name, st in self.spans.items()}
+
+    def reset(self):
+        with self._lock:
+            self.spans = {}
+
+
+class TracedModule:
+    """Looks like the wrapped module, but its functions report to a Tracer.
+
+    Classes (psutil.Process, the exception types) come through untouched so
+    isinstance checks and except clauses keep working.
+    """
+
+    def __init__(self, module, tracer):
+        self._module = module
+        self._tracer = tracer
+        self._cache = {}
+
+    def __getattr__(self, name):
+        attr = getattr(self._module, name)
+        if isinstance(attr, type) or not callable(attr):
+            return attr
+
+        wrapped = self._cache.get(name)
+        if wrapped is None:
+            tracer = self._tracer
+            api = name
+
+            def wrapped(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return attr(*args, **kwargs)
+                finally:
+                    tracer.record_call(api, time.perf_counter() - start)
+
+            self._cache[name] = wrapped
+        return wrapped
+
+
+# The one everybody shares
+tracer = Tracer()
+
+
+def profile_scan(collector, sections=None, top=25):
+    """Run one scan under cProfile and tracemalloc.
+
+    The collectors run one after another on this thread, since cProfile only
+    sees the thread it was started on. Returns (snapshot, profile, text
+    summary); profile.dump_stats(path) saves it for snakeviz and friends.
+    """
+    # Only needed here, and not cheap to import
+    import cProfile
+    import io
+    import pstats
+    import tracemalloc
+    from .scheduler import Result
+    from .snapshot import Snapshot
+
+    names = sections or collector.registry.defaults()
+    results = {}
+    prof = cProfile.Profile()
+    tracemalloc.start(10)
+    taken = time.time()
+
+    prof.enable()
+    for name in names:
+        start = time.perf_counter()
+        try:
+            value, error = collector.jobs[name](), None
+        except Exception as e:
+            value, error = None, e
+        results[name] = Result(name, value, error, time.perf_counter() - start, False)
+    prof.disable()
+
+    mem = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    out = io.StringIO()
+    out.write("=== Timings ===\n")
+    for name, res in results.items():
+        out.write(f"{name:8} {res.elapsed * 1000:9.1f} ms\n")
+
+    out.write("\n=== Top functions (cumulative) ===\n")
+    pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(top)
+
+    out.write(f"=== Top allocations (peak {peak / 1024:.0f} KB) ===\n")
+    for stat in mem.statistics('lineno')[:top]:
+        out.write(f"{stat}\n")
+
+    return Snapshot.from_results(results, taken=taken), prof, out.getvalue()
@@ -1,32 +1,28 @@
 import os
-import sys
-import platform
 from datetime import datetime
+import threading
 import time
 
-# Try to load what we need, but don't crash if something's missing
-try:
-    import psutil
-    has_psutil = True
-except ImportError:
-    has_psutil = False
-    print("Note: psutil not found, some features limited")
-
-try:
-    import wmi
-    has_wmi = True
-except ImportError:
-    has_wmi = False
-
+# Try to load what we need, but don't crash if something's missing.
+# Anything not needed to draw the window (psutil, numpy, sqlite) gets
+# imported the first time it's used instead of here
 try:
     from tkinter import *
     from tkinter import ttk, messagebox, filedialog
     import tkinter.scrolledtext as st
+    from tk_render import TextPane, RenderQueue, ProcessTree, TrendChart
     has_tk = True
 except ImportError:
     has_tk = False
     print("No tkinter - need GUI version of Python")
 
+from diagnostats import Collector, SECTIONS, backends, formatting, report
+from diagnostats.events import EventChannel, CancelToken, Cancelled
+from diagnostats import collectors
+from diagnostats.collectors import get_basic_info, is_admin
+from diagnostats.cache import cache
+from diagnostats.tracing import tracer
+
 # Colors I like using
 BG = '#f5f5f5'
 ACCENT = '#2a5caa'
@@ -34,6 +30,23 @@ WARN = '#ff9900'
 BAD = '#cc3333'
 GOOD = '#339966'
 
+# How often the UI checks for news from the scan thread
+PUMP_MS = 50
+
+# Sections run in their own process (when the box is ticked) so one stuck
+# in the registry or on a protected process can be killed - see isolate.py
+ISOLATE = ('sys', 'procs')
+
+# Seconds between Live tab refreshes
+LIVE_INTERVAL = 2.0
+
+# While security checks are still running after a scan, look again this often
+SECURITY_POLL_MS = 3000
+
+# Choices in the history window, in seconds
+HISTORY_RANGES = (("Last hour", 3600), ("Last day", 86400), ("Last week", 7 * 86400),
+                  ("Last 30 days", 30 * 86400), ("Last year", 365 * 86400))
+
 class DiagTool:
     def __init__(self, master):
         self.master = master
@@ -53,14 +66,50 @@ class DiagTool:
         self.scanning = False
         self.last_scan = None
         self.data = {}
+        self.snapshot = None
+        self.collector = Collector()
+        self.render = RenderQueue(master)
+        self.panes = {}
+        self.events = EventChannel()
+        self.cancel_token = None
+        self.history = None
+        self._history_lock = threading.Lock()
+        self.monitor = None
         
         self.setup_gui()
         
+        # Start listening for scan events
+        self._pump()
+        
+        # Nothing that asks the OS anything happens before the window's on
+        # screen. Idle callbacks queued now run after Tk's own redraws, and
+        # the extra hop through after() puts us behind those for sure
+        master.after_idle(lambda: master.after(0, self._after_first_frame))
+    
+    def _after_first_frame(self):
         # Check if we're admin (sorta)
         self.check_admin()
         
         # Load initial system info
         self.load_basic_info()
+        
+        # Get psutil imported while nobody's waiting, not on the first scan
+        threading.Thread(target=collectors.warm_up, daemon=True).start()
+        self._set_isolation()
+    
+    def _set_isolation(self):
+        # Swap to a collector with (or without) worker processes. Never
+        # mid-scan - do_scan calls this again before the next one starts
+        if self.scanning:
+            return
+        isolate = ISOLATE if self.isolate_var.get() else ()
+        if (self.collector.runner is not None) == bool(isolate):
+            return
+        old, self.collector = self.collector, Collector(isolate=isolate)
+        old.close()
+        if self.collector.runner is not None:
+            # Workers take a moment to start, better now than on the first scan
+            threading.Thread(target=self.collector.runner.start, args=(isolate,), daemon=True).start()
     
     def setup_gui(self):
         # Top bar
@@ -93,7 +142,13 @@ class DiagTool:
                              bg=GOOD, fg='white',
                              height=2,
                              command=self.do_scan)
-        self.scan_btn.pack(fill=X, pady=(0, 15))
+        self.scan_btn.pack(fill=X, pady=(0, 10))
+        
+        self.live_btn = Button(left, text="◉ Live Monitor", 
+                               font=('Segoe UI', 10),
+                               bg=ACCENT, fg='white',
+                               command=self.toggle_live)
+        self.live_btn.pack(fill=X, pady=(0, 15))
         
         # Quick buttons frame
         quick_frame = Frame(left, bg=BG)
@@ -113,7 +168,28 @@ class DiagTool:
         # Report button
         Button(left, text="Save Report", 
                command=self.save_report,
-               bg=ACCENT, fg='white').pack(fill=X, pady=(0, 25))
+               bg=ACCENT, fg='white').pack(fill=X, pady=(0, 10))
+        
+        Button(left, text="History", 
+               command=self.show_history,
+               bg='#e0e0e0').pack(fill=X, pady=(0, 10))
+        
+        Button(left, text="Compare", 
+               command=self.show_compare,
+               bg='#e0e0e0').pack(fill=X, pady=(0, 10))
+        
+        # Diagnostics tab is opt-in
+        self.diag_var = BooleanVar(value=False)
+        Checkbutton(left, text="Show diagnostics tab",
+                    variable=self.diag_var,
+                    command=self.toggle_diagnostics,
+                    bg=BG, anchor=W).pack(fill=X)
+        
+        self.isolate_var = BooleanVar(value=True)
+        Checkbutton(left, text="Run risky checks in a separate process",
+                    variable=self.isolate_var,
+                    command=self._set_isolation,
+                    bg=BG, anchor=W).pack(fill=X, pady=(0, 15))
         
         # Info box
         info_frame = Frame(left, bg='white', relief=SOLID, borderwidth=1)
@@ -149,14 +225,20 @@ class DiagTool:
             self.tab_frames[name] = frame
             self.tabs.add(frame, text=name)
             
+            # Processes get a proper table, only the visible rows exist
+            if name == 'Running':
+                self.proc_tree = ProcessTree(frame)
+                self.proc_tree.pack(fill=BOTH, expand=True, padx=10, pady=10)
+                self.proc_tree.set_message(f"{name} info will show here")
+                continue
+            
             # Add text area to each
             text = st.ScrolledText(frame, font=('Consolas', 9),
                                  wrap=WORD, bg='white')
             text.pack(fill=BOTH, expand=True, padx=10, pady=10)
-            text.insert(END, f"{name} info will show here")
-            text.config(state=DISABLED)
             
             self.tab_frames[f"{name}_text"] = text
+            self.panes[name] = TextPane(text, f"{name} info will show here")
         
         # Bottom status
         bottom = Frame(self.master, bg='#333333', height=30)
@@ -170,21 +252,17 @@ class DiagTool:
     
     def check_admin(self):
         # Simple admin check
-        try:
-            import ctypes
-            admin = ctypes.windll.shell32.IsUserAnAdmin() != 0
-            if admin:
-                self.bottom_label.config(text="Running as Admin")
-            else:
-                self.bottom_label.config(text="User mode - some info may be limited")
-        except:
+        admin = is_admin()
+        if admin:
+            self.bottom_label.config(text="Running as Admin")
+        elif admin is False:
+            self.bottom_label.config(text="User mode - some info may be limited")
+        else:
             self.bottom_label.config(text="")
     
     def load_basic_info(self):
         # Just get OS and hostname for now
-        self.data['os'] = f"{platform.system()} {platform.release()}"
-        self.data['host'] = platform.node()
-        self.data['arch'] = platform.machine()
+        self.data.update(get_basic_info())
         
         # Show in info box
         text = f"OS: {self.data['os']}\n"
@@ -200,413 +278,461 @@ class DiagTool:
         self.info_text.config(state=DISABLED)
     
     def update_tab(self, name, text):
-        if f"{name}_text" in self.tab_frames:
-            widget = self.tab_frames[f"{name}_text"]
-            widget.config(state=NORMAL)
-            widget.delete(1.0, END)
-            widget.insert(END, text)
-            widget.config(state=DISABLED)
+        # Queued, so a burst of updates to one tab only redraws it once,
+        # and then only the lines that changed
+        if name == 'Running':
+            self.render.schedule(name, self.proc_tree.set_message, text)
+        elif name in self.panes:
+            self.render.schedule(name, self.panes[name].set_text, text)
     
     def do_scan(self):
+        # Same button cancels while a scan is running
         if self.scanning:
+            self.cancel_scan()
             return
         
+        self._set_isolation()
         self.scanning = True
-        self.scan_btn.config(state=DISABLED, text="Scanning...")
+        self.cancel_token = CancelToken()
+        self.data.pop('timings', None)
+        self.data.pop('extra', None)
+        self.data.pop('extra_errors', None)
+        self.scan_btn.config(text="■ Cancel Scan", bg=BAD)
         self.prog.start()
         self.status_label.config(text="Scanning system...")
         
         # Run in thread to keep UI responsive
-        import threading
-        t = threading.Thread(target=self._scan_thread)
+        t = threading.Thread(target=self._scan_thread, args=(self.cancel_token,))
         t.daemon = True
         t.start()
     
-    def _scan_thread(self):
+    def cancel_scan(self):
+        if self.cancel_token is not None:
+            self.cancel_token.cancel()
+            self.status_label.config(text="Cancelling...")
+    
+    def _scan_thread(self, token):
+        # Runs on a worker thread - never touch Tk from here, post events instead
         try:
-            # Get system info
-            self.status_label.config(text="Getting system details...")
-            sys_info = self.get_sys_info()
-            
-            # Hardware
-            self.status_label.config(text="Checking hardware...")
-            hw_info = self.get_hardware_info()
-            
-            # Disks
-            self.status_label.config(text="Checking disks...")
-            disk_info = self.get_disk_info()
-            
-            # Processes
-            self.status_label.config(text="Checking running programs...")
-            proc_info = self.get_proc_info()
-            
-            # Network
-            self.status_label.config(text="Checking network...")
-            net_info = self.get_net_info()
+            # All five run at once, each one shows up as soon as it's done
+            self.events.post('status', "Checking everything...")
             
-            # Update UI
-            self.master.after(0, self._update_ui, sys_info, hw_info, disk_info, proc_info, net_info)
+            start = time.perf_counter()
+            snap = self.collector.scan(on_result=lambda res: self.events.post('result', res),
+                                       cancel=token)
+            total = time.perf_counter() - start
             
-            self.status_label.config(text="Scan complete")
+            if token.cancelled:
+                self.events.post('cancelled', snap)
+            else:
+                self.events.post('finished', (snap, total))
             self.last_scan = datetime.now()
             
         except Exception as e:
-            self.master.after(0, lambda: messagebox.showerror("Error", f"Scan failed: {e}"))
-            self.status_label.config(text="Scan failed")
+            self.events.post('error', str(e))
         finally:
-            self.master.after(0, self._scan_done)
+            self.events.post('done')
+    
+    def _pump(self):
+        # Tk side of the event channel - handle whatever's piled up, then check back soon
+        for ev in self.events.drain():
+            if ev.kind == 'status':
+                self.status_label.config(text=ev.payload)
+            elif ev.kind == 'result':
+                self._show_result(ev.payload)
+            elif ev.kind == 'finished':
+                self._scan_finished(*ev.payload)
+            elif ev.kind == 'cancelled':
+                self.status_label.config(text="Scan cancelled")
+            elif ev.kind == 'error':
+                self.status_label.config(text="Scan failed")
+                messagebox.showerror("Error", f"Scan failed: {ev.payload}")
+            elif ev.kind == 'done':
+                self._scan_done()
+            elif ev.kind == 'live':
+                self._show_live(ev.payload)
+            elif ev.kind == 'answer':
+                # Something _in_background() went off to get
+                show, result = ev.payload
+                show(result)
+            elif ev.kind == 'failed':
+                what, err = ev.payload
+                self.status_label.config(text=f"Couldn't get {what}")
+                messagebox.showerror("Error", f"Couldn't get {what}: {err}")
+        self.master.after(PUMP_MS, self._pump)
+
+    def _in_background(self, what, fn, show):
+        # Anything that can wait on an isolated worker or a slow mount runs
+        # off the Tk thread; show(result) gets called back on it, via the
+        # same event channel a scan reports through
+        self.status_label.config(text=f"Getting {what}...")
+
+        def run():
+            try:
+                self.events.post('answer', (show, fn()))
+            except Exception as e:
+                self.events.post('failed', (what, str(e)))
+        threading.Thread(target=run, daemon=True).start()
     
     def _scan_done(self):
         self.scanning = False
-        self.scan_btn.config(state=NORMAL, text="▶ Run Full Scan")
+        self.cancel_token = None
+        self.scan_btn.config(state=NORMAL, text="▶ Run Full Scan", bg=GOOD)
         self.prog.stop()
     
-    def get_sys_info(self):
-        info = {}
-        
-        try:
-            # Basic stuff
-            info['OS'] = f"{platform.system()} {platform.release()}"
-            info['Version'] = platform.version()
-            
-            # Windows edition from registry
-            try:
-                import winreg
-                key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, 
-                                    r"SOFTWARE\Microsoft\Windows NT\CurrentVersion")
-                edition = winreg.QueryValueEx(key, "ProductName")[0]
-                winreg.CloseKey(key)
-                info['Edition'] = edition
-            except:
-                info['Edition'] = "Unknown"
-            
-            # Uptime
-            if has_psutil:
-                boot = datetime.fromtimestamp(psutil.boot_time())
-                uptime = datetime.now() - boot
-                days = uptime.days
-                hours = uptime.seconds // 3600
-                mins = (uptime.seconds % 3600) // 60
-                info['Uptime'] = f"{days}d {hours}h {mins}m"
-            
-            # Python version
-            info['Python'] = f"{sys.version_info.major}.{sys.version_info.minor}.{sys.version_info.micro}"
-            
-        except Exception as e:
-            info['Error'] = str(e)
-        
-        return info
+    def _show_result(self, res):
+        # One collector finished, put its bit on screen straight away
+        self.data.setdefault('timings', {})[res.name] = res.elapsed
+        
+        if res.error is not None:
+            if res.timed_out:
+                msg = f"Gave up after {res.elapsed:.1f}s"
+            elif isinstance(res.error, Cancelled):
+                msg = "Cancelled"
+            else:
+                msg = f"Failed: {res.error}"
+            tab = {'sys': 'Overview', 'hw': 'Hardware', 'disks': 'Storage',
+                   'procs': 'Running', 'net': 'Network'}.get(res.name)
+            if tab:  # disk activity failing shouldn't wipe out the drive list
+                self.update_tab(tab, msg)
+            elif res.name not in SECTIONS:
+                self.data.setdefault('extra_errors', {})[res.name] = msg
+                self._show_checks()
+        elif res.name not in SECTIONS:
+            # A plugin, they all share the Checks tab
+            self.data.setdefault('extra', {})[res.name] = res.value
+            self._show_checks()
+        else:
+            self.data[res.name] = res.value
+            if res.name in ('sys', 'hw'):
+                self._show_overview()
+            if res.name == 'hw':
+                self._show_hardware()
+            elif res.name in ('disks', 'diskio'):
+                self._show_storage()
+            elif res.name == 'procs':
+                self._show_procs()
+            elif res.name == 'net':
+                self._show_network()
+        
+        done = len(self.data['timings'])
+        total = len(self.collector.registry.defaults())
+        self.status_label.config(text=f"{res.name} done in {res.elapsed:.2f}s ({done}/{total})")
     
-    def get_hardware_info(self):
-        info = {}
-        
-        if not has_psutil:
-            info['Error'] = "Need psutil for hardware info"
-            return info
-        
-        try:
-            # CPU
-            info['CPU Cores'] = psutil.cpu_count(logical=True)
-            info['CPU Physical'] = psutil.cpu_count(logical=False)
-            
-            # CPU usage
-            usage = psutil.cpu_percent(interval=0.5)
-            info['CPU Usage'] = f"{usage:.1f}%"
-            
-            # CPU freq if available
-            freq = psutil.cpu_freq()
-            if freq:
-                info['CPU Speed'] = f"{freq.current:.0f} MHz"
-            
-            # Memory
-            mem = psutil.virtual_memory()
-            info['Total RAM'] = f"{mem.total / (1024**3):.1f} GB"
-            info['Used RAM'] = f"{mem.used / (1024**3):.1f} GB"
-            info['RAM %'] = f"{mem.percent}%"
-            
-            # Swap
-            swap = psutil.swap_memory()
-            if swap.total > 0:
-                info['Swap'] = f"{swap.used / (1024**3):.1f} / {swap.total / (1024**3):.1f} GB"
-            
-        except Exception as e:
-            info['Error'] = f"Hardware error: {e}"
-        
-        return info
+    def _show_checks(self):
+        # Tab only turns up once there's a plugin with something to say
+        if 'Checks' not in self.tab_frames:
+            frame = Frame(self.tabs, bg='white')
+            text = st.ScrolledText(frame, font=('Consolas', 9), wrap=WORD, bg='white')
+            text.pack(fill=BOTH, expand=True, padx=10, pady=10)
+            self.tabs.add(frame, text='Checks')
+            self.tab_frames['Checks'] = frame
+            self.panes['Checks'] = TextPane(text)
+        self.update_tab('Checks', formatting.extra_text(self.data.get('extra', {}),
+                                                        self.data.get('extra_errors')))
+    
+    def _show_overview(self):
+        text = formatting.overview_text(self.data.get('sys'), self.data.get('hw'),
+                                        self.data.get('timings'))
+        self.update_tab('Overview', text)
+    
+    def _show_hardware(self):
+        self.update_tab('Hardware', formatting.hardware_text(self.data.get('hw')))
+    
+    def _show_storage(self):
+        text = formatting.storage_text(self.data.get('disks', []), self.data.get('diskio'))
+        self.update_tab('Storage', text)
+    
+    def _show_procs(self):
+        self.render.schedule('Running', self.proc_tree.set_rows, self.data.get('procs', []))
     
-    def get_disk_info(self):
-        info = []
+    def _show_network(self):
+        self.update_tab('Network', formatting.network_text(self.data.get('net')))
+    
+    def _scan_finished(self, snap, total):
+        # Everything's in - timings on the overview and a summary in the info box
+        self.snapshot = snap
+        self._show_overview()
+        self._show_diagnostics()
+        
+        info_text = formatting.summary_text(snap)
+        info_text += f"Scan took: {total:.2f}s\n"
+        self.update_info(info_text)
         
-        if not has_psutil:
-            return [{"Error": "psutil needed for disk info"}]
+        # Keep it for the history view (and for comparing later)
+        threading.Thread(target=self._keep_snapshot, args=(snap,), daemon=True).start()
         
-        try:
-            for part in psutil.disk_partitions():
-                try:
-                    usage = psutil.disk_usage(part.mountpoint)
-                    disk = {
-                        'drive': part.device,
-                        'mount': part.mountpoint,
-                        'type': part.fstype,
-                        'total_gb': usage.total / (1024**3),
-                        'used_gb': usage.used / (1024**3),
-                        'free_gb': usage.free / (1024**3),
-                        'percent': usage.percent
-                    }
-                    info.append(disk)
-                except:
-                    # Can't access this drive
-                    pass
-        except Exception as e:
-            info.append({'error': str(e)})
+        self._poll_security()
         
-        return info
+        if snap.errors:
+            self.status_label.config(text=f"Scan done, {', '.join(snap.errors)} failed")
+        else:
+            self.status_label.config(text=f"Scan complete ({total:.2f}s)")
     
-    def get_proc_info(self):
-        procs = []
-        
-        if not has_psutil:
-            return [{"name": "Need psutil for process list"}]
+    def _poll_security(self):
+        # The security queries answer in the background; while any are
+        # still going, look again now and then (it's just a cache read)
+        checks = self.data.get('extra', {}).get('security')
+        if not checks or not any(c.status == 'checking' for c in checks):
+            return
+        def again():
+            if self.scanning:
+                return  # the scan brings its own
+            from diagnostats.security import get_security_info
+            self.data.setdefault('extra', {})['security'] = get_security_info()
+            self._show_checks()
+            self._poll_security()
+        self.master.after(SECURITY_POLL_MS, again)
+    
+    def toggle_live(self):
+        # Live tab: a refresh every LIVE_INTERVAL from the incremental
+        # collectors (monitor.py), on its own thread, until stopped
+        if self.monitor is not None and self.monitor.running():
+            self.monitor.stop()
+            self.live_btn.config(text="◉ Live Monitor", bg=ACCENT)
+            self.status_label.config(text="Live monitor stopped")
+            return
         
-        try:
-            # Get top 10 by memory
-            all_procs = []
-            for p in psutil.process_iter(['pid', 'name', 'memory_percent']):
+        if 'Live' not in self.tab_frames:
+            frame = Frame(self.tabs, bg='white')
+            text = st.ScrolledText(frame, font=('Consolas', 9), wrap=NONE, bg='white')
+            text.pack(fill=BOTH, expand=True, padx=10, pady=10)
+            self.tabs.add(frame, text='Live')
+            self.tab_frames['Live'] = frame
+            self.panes['Live'] = TextPane(text, "Starting...")
+        if self.monitor is None:
+            from diagnostats.monitor import Monitor
+            self.monitor = Monitor(interval=LIVE_INTERVAL, top=15)
+        self.monitor.start(lambda frame: self.events.post('live', frame))
+        self.tabs.select(self.tab_frames['Live'])
+        self.live_btn.config(text="■ Stop Live Monitor", bg=BAD)
+    
+    def _show_live(self, frame):
+        from diagnostats.monitor import monitor_lines
+        
+        start = time.perf_counter()
+        self.panes['Live'].set_lines(monitor_lines(frame, self.data.get('host', '')))
+        # Only changed lines get redrawn, this is what that cost (shown next frame)
+        self.monitor.frame_ms = (time.perf_counter() - start) * 1000
+        if not self.scanning:
+            self.status_label.config(text=f"Live - refresh {frame.cost * 1000:.0f} ms")
+    
+    def toggle_diagnostics(self):
+        # Add/remove a tab showing what the tracer saw
+        if self.diag_var.get():
+            frame = Frame(self.tabs, bg='white')
+            text = st.ScrolledText(frame, font=('Consolas', 9),
+                                 wrap=NONE, bg='white')
+            text.pack(fill=BOTH, expand=True, padx=10, pady=10)
+            self.tabs.add(frame, text='Diagnostics')
+            self.tab_frames['Diagnostics'] = frame
+            self.tab_frames['Diagnostics_text'] = text
+            self.panes['Diagnostics'] = TextPane(text)
+            self._show_diagnostics()
+            self.tabs.select(frame)
+        elif 'Diagnostics' in self.tab_frames:
+            self.tabs.forget(self.tab_frames.pop('Diagnostics'))
+            self.tab_frames.pop('Diagnostics_text')
+            self.panes.pop('Diagnostics')
+            self.render.pending.pop('Diagnostics', None)
+    
+    def _show_diagnostics(self):
+        if 'Diagnostics' in self.tab_frames:
+            self.update_tab('Diagnostics', formatting.diagnostics_text(tracer.report(), cache.stats()))
+    
+    def show_system(self):
+        # Quick system view
+        def show(info):
+            self.update_info(formatting.system_text(info))
+            self.tabs.select(0)  # Overview tab
+            self.status_label.config(text="System info loaded")
+        self._in_background("system info", self.collector.system, show)
+    
+    def show_disks(self):
+        # Quick disk view
+        def show(disks):
+            self.update_info(formatting.disks_text(disks))
+            self.tabs.select(2)  # Storage tab
+            self.status_label.config(text="Disk info loaded")
+        self._in_background("disk info", self.collector.disks, show)
+    
+    def _history(self):
+        # Opened on first use; None if the database can't be opened.
+        # Anything touching it runs off the Tk thread (it's SQLite on disk)
+        with self._history_lock:
+            if self.history is None:
                 try:
-                    all_procs.append(p.info)
-                except:
-                    pass
-            
-            # Sort by memory and take top
-            all_procs.sort(key=lambda x: x['memory_percent'] or 0, reverse=True)
-            for p in all_procs[:15]:
-                procs.append({
-                    'pid': p['pid'],
-                    'name': p['name'][:30],  # truncate long names
-                    'mem': p['memory_percent']
-                })
-        except Exception as e:
-            procs.append({'error': str(e)})
-        
-        return procs
+                    from diagnostats.history import History
+                    self.history = History()
+                except Exception as e:
+                    tracer.swallowed('history open', e)
+            return self.history
     
-    def get_net_info(self):
-        info = {}
-        
-        if not has_psutil:
-            info['Error'] = "Need psutil for network info"
-            return info
-        
-        try:
-            # Network stats
-            net = psutil.net_io_counters()
-            info['Sent'] = f"{net.bytes_sent / (1024**2):.1f} MB"
-            info['Recv'] = f"{net.bytes_recv / (1024**2):.1f} MB"
-            
-            # IP addresses
-            import socket
+    def _open_history(self):
+        store = self._history()
+        if store is None:
+            raise RuntimeError("couldn't open the history database")
+        return store
+    
+    def _keep_snapshot(self, snap):
+        # Runs on its own thread after every scan
+        store = self._history()
+        if store is not None:
             try:
-                host = socket.gethostname()
-                ip = socket.gethostbyname(host)
-                info['IP'] = ip
-            except:
-                info['IP'] = "Unknown"
-            
-        except Exception as e:
-            info['Error'] = str(e)
-        
-        return info
+                store.add_snapshot(snap)
+            except Exception as e:
+                tracer.swallowed('history add_snapshot', e)
     
-    def _update_ui(self, sys_info, hw_info, disk_info, proc_info, net_info):
-        # Store data
-        self.data.update({
-            'sys': sys_info,
-            'hw': hw_info,
-            'disks': disk_info,
-            'procs': proc_info,
-            'net': net_info
-        })
-        
-        # Update overview tab
-        overview = "=== System Overview ===\n\n"
-        for k, v in sys_info.items():
-            overview += f"{k}: {v}\n"
-        
-        overview += "\n=== Hardware ===\n"
-        for k, v in hw_info.items():
-            if k != 'Error':
-                overview += f"{k}: {v}\n"
-        
-        self.update_tab('Overview', overview)
-        
-        # Hardware tab
-        hw_text = "=== Hardware Details ===\n\n"
-        for k, v in hw_info.items():
-            hw_text += f"{k:15}: {v}\n"
-        
-        self.update_tab('Hardware', hw_text)
-        
-        # Storage tab
-        disk_text = "=== Disk Drives ===\n\n"
-        for d in disk_info:
-            if 'drive' in d:
-                disk_text += f"{d['drive']} ({d['type']})\n"
-                disk_text += f"  Mount: {d['mount']}\n"
-                disk_text += f"  Size: {d['total_gb']:.1f} GB\n"
-                disk_text += f"  Used: {d['used_gb']:.1f} GB ({d['percent']}%)\n"
-                disk_text += f"  Free: {d['free_gb']:.1f} GB\n\n"
-        
-        self.update_tab('Storage', disk_text)
-        
-        # Processes tab
-        proc_text = "=== Top Processes (by memory) ===\n\n"
-        proc_text += "PID       Name                          Memory %\n"
-        proc_text += "-" * 50 + "\n"
-        
-        for p in proc_info:
-            if 'pid' in p:
-                proc_text += f"{p['pid']:8}  {p['name']:30}  {p.get('mem', 0):6.2f}\n"
-        
-        self.update_tab('Running', proc_text)
+    def show_history(self):
+        def load():
+            store = self._open_history()
+            return store, store.metrics()
+        self._in_background("history", load, self._history_window)
+    
+    def _history_window(self, loaded):
+        store, metrics = loaded
+        if not metrics:
+            self.status_label.config(text="Ready")
+            messagebox.showinfo("History", "Nothing recorded yet - run a scan (or the sampler) first")
+            return
         
-        # Network tab
-        net_text = "=== Network ===\n\n"
-        for k, v in net_info.items():
-            net_text += f"{k:10}: {v}\n"
+        win = Toplevel(self.master)
+        win.title("History")
+        win.geometry("800x380")
+        
+        bar = Frame(win)
+        bar.pack(fill=X, padx=10, pady=10)
+        metric = StringVar(value='mem.percent' if 'mem.percent' in metrics else metrics[0])
+        span = StringVar(value=HISTORY_RANGES[1][0])
+        ttk.Combobox(bar, textvariable=metric, values=metrics, width=40,
+                     state='readonly').pack(side=LEFT)
+        ttk.Combobox(bar, textvariable=span, values=[r[0] for r in HISTORY_RANGES], width=14,
+                     state='readonly').pack(side=LEFT, padx=10)
+        
+        chart = TrendChart(win)
+        chart.pack(fill=BOTH, expand=True, padx=10, pady=(0, 10))
+        
+        asked = [0]  # only the latest answer gets drawn
+        
+        def redraw(*_):
+            seconds = dict(HISTORY_RANGES)[span.get()]
+            end = time.time()
+            # About one point per pixel, whatever the range
+            name, step = metric.get(), seconds / chart.pixels()
+            title = f"{name} - {span.get().lower()}"
+            asked[0] += 1
+            mine = asked[0]
+            
+            def draw(points):
+                self.status_label.config(text="History loaded")
+                if mine == asked[0] and win.winfo_exists():
+                    self.render.schedule('History', chart.set_points, points, title)
+            self._in_background("history", lambda: store.query(name, end - seconds, end, step=step), draw)
+        
+        metric.trace_add('write', redraw)
+        span.trace_add('write', redraw)
+        win.after(50, redraw)
+    
+    def show_compare(self):
+        # Current scan against an earlier one from the history database
+        if self.snapshot is None:
+            messagebox.showinfo("Compare", "Run a full scan first")
+            return
+        current = self.snapshot
         
-        self.update_tab('Network', net_text)
+        def load():
+            store = self._open_history()
+            return store, current, [s for s in store.snapshots(limit=200) if s[1] < current.taken]
+        self._in_background("earlier scans", load, self._compare_window)
+    
+    def _compare_window(self, loaded):
+        store, current, earlier = loaded
+        self.status_label.config(text="Ready")
+        if not earlier:
+            messagebox.showinfo("Compare", "No earlier scans to compare with yet")
+            return
         
-        # Update info box with summary
-        info_text = f"Last scan: {datetime.now().strftime('%H:%M:%S')}\n"
-        info_text += f"OS: {sys_info.get('OS', '?')}\n"
+        win = Toplevel(self.master)
+        win.title("Compare with an earlier scan")
+        win.geometry("900x500")
         
-        if 'Total RAM' in hw_info:
-            info_text += f"RAM: {hw_info['Total RAM']}\n"
+        picker = Listbox(win, width=28, font=('Consolas', 9), exportselection=False)
+        picker.pack(side=LEFT, fill=Y, padx=(10, 0), pady=10)
+        for _, ts, errors in earlier:
+            label = datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
+            picker.insert(END, label + (f"  ({errors} failed)" if errors else ""))
         
-        if disk_info and 'total_gb' in disk_info[0]:
-            total = sum(d['total_gb'] for d in disk_info if 'total_gb' in d)
-            info_text += f"Total disk: {total:.1f} GB\n"
+        text = st.ScrolledText(win, font=('Consolas', 9), wrap=NONE, bg='white')
+        text.pack(side=LEFT, fill=BOTH, expand=True, padx=10, pady=10)
         
-        self.update_info(info_text)
+        from diagnostats.diff import diff
         
-        # Show completion
-        messagebox.showinfo("Done", "System scan completed!")
-    
-    def show_system(self):
-        # Quick system view
-        info = self.get_sys_info()
-        text = "=== System Info ===\n\n"
-        for k, v in info.items():
-            text += f"{k}: {v}\n"
+        def compare(snap_id):
+            # Inflating the old scan and diffing it can take a while
+            old = store.snapshot(snap_id)
+            if old is None:
+                return "That scan has been cleaned out of the history since"
+            return formatting.diff_text(diff(old, current))
         
-        self.update_info(text)
-        self.tabs.select(0)  # Overview tab
-        self.status_label.config(text="System info loaded")
-    
-    def show_disks(self):
-        # Quick disk view
-        disks = self.get_disk_info()
-        text = "=== Disks ===\n\n"
+        asked = [0]
         
-        for d in disks:
-            if 'drive' in d:
-                text += f"{d['drive']}: {d.get('percent', 0)}% used\n"
-                text += f"  Free: {d.get('free_gb', 0):.1f} GB\n\n"
-        
-        self.update_info(text)
-        self.tabs.select(2)  # Storage tab
-        self.status_label.config(text="Disk info loaded")
+        def show(*_):
+            sel = picker.curselection()
+            if not sel:
+                return
+            asked[0] += 1
+            mine = asked[0]
+            
+            def fill(result):
+                self.status_label.config(text="Ready")
+                if mine == asked[0] and win.winfo_exists():
+                    text.delete('1.0', END)
+                    text.insert(END, result)
+            snap_id = earlier[sel[0]][0]
+            self._in_background("that scan", lambda: compare(snap_id), fill)
+        
+        picker.bind('<<ListboxSelect>>', show)
+        picker.selection_set(0)
+        show()
     
     def save_report(self):
-        if not self.data or 'sys' not in self.data:
-            messagebox.showwarning("No Data", "Run a scan first to get data")
-            return
-        
+        if self.snapshot is None:
+            # No full scan yet - the cached bits are still worth saving
+            self._in_background("system info", lambda: self.collector.scan(('sys', 'disks')),
+                                self._save_snapshot)
+        else:
+            self._save_snapshot(self.snapshot)
+
+    def _save_snapshot(self, snap):
         # Ask where to save
         default_name = f"pc_check_{datetime.now().strftime('%Y%m%d_%H%M')}.txt"
         
         fname = filedialog.asksaveasfilename(
             defaultextension=".txt",
-            filetypes=[("Text files", "*.txt")],
+            filetypes=[("Text files", "*.txt"),
+                       ("JSON", "*.json"),
+                       ("JSON Lines", "*.jsonl"),
+                       ("CSV", "*.csv"),
+                       ("Binary records", "*.bin")],
             initialfile=default_name
         )
         
         if not fname:
+            self.status_label.config(text="Ready")
             return
         
         try:
-            with open(fname, 'w', encoding='utf-8') as f:
-                f.write("PC Diagnostic Report\n")
-                f.write("=" * 50 + "\n")
-                f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Computer: {self.data.get('host', 'Unknown')}\n")
-                f.write("=" * 50 + "\n\n")
-                
-                # System
-                f.write("SYSTEM\n")
-                f.write("-" * 30 + "\n")
-                for k, v in self.data.get('sys', {}).items():
-                    f.write(f"{k}: {v}\n")
-                
-                # Hardware
-                f.write("\n\nHARDWARE\n")
-                f.write("-" * 30 + "\n")
-                for k, v in self.data.get('hw', {}).items():
-                    if k != 'Error':
-                        f.write(f"{k}: {v}\n")
-                
-                # Disks
-                f.write("\n\nSTORAGE\n")
-                f.write("-" * 30 + "\n")
-                for d in self.data.get('disks', []):
-                    if 'drive' in d:
-                        f.write(f"{d['drive']}: {d.get('percent', 0)}% used\n")
-                        f.write(f"  Free: {d.get('free_gb', 0):.1f} GB\n")
-                
-                # Recommendations
-                f.write("\n\nNOTES\n")
-                f.write("-" * 30 + "\n")
-                notes = self._get_notes()
-                for note in notes:
-                    f.write(f"• {note}\n")
+            # Format goes by the extension they picked
+            report.save_snapshot(snap, fname)
             
             self.status_label.config(text=f"Saved: {os.path.basename(fname)}")
             
             # Ask to open
             if messagebox.askyesno("Saved", f"Report saved to:\n{fname}\n\nOpen it now?"):
-                os.startfile(fname)
+                backends.current().open_file(fname)
                 
         except Exception as e:
             messagebox.showerror("Error", f"Couldn't save: {e}")
-    
-    def _get_notes(self):
-        notes = []
-        
-        # Check disk space
-        disks = self.data.get('disks', [])
-        for d in disks:
-            if 'percent' in d and d['percent'] > 90:
-                notes.append(f"Drive {d.get('drive', '?')} is almost full ({d['percent']}%)")
-            elif 'percent' in d and d['percent'] > 80:
-                notes.append(f"Drive {d.get('drive', '?')} is getting full ({d['percent']}%)")
-        
-        # Check RAM
-        hw = self.data.get('hw', {})
-        if 'RAM %' in hw:
-            try:
-                ram_pct = float(hw['RAM %'].strip('%'))
-                if ram_pct > 90:
-                    notes.append(f"High RAM usage ({ram_pct}%) - might need more memory")
-            except:
-                pass
-        
-        if not notes:
-            notes.append("System looks okay")
-        
-        notes.append("Keep Windows updated")
-        notes.append("Back up important files regularly")
-        
-        return notes
 
 def run_app():
     """Start the app"""
@@ -628,4 +754,7 @@ def run_app():
 
 # If run directly
 if __name__ == "__main__":
+    # Needed for the isolate.py workers in a frozen .exe, harmless otherwise
+    import multiprocessing
+    multiprocessing.freeze_support()
     run_app()
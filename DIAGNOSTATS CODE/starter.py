@@ -2,15 +2,14 @@
 
 import sys
 import os
+from importlib.util import find_spec
 
 # check we can run this thing
 def setup():
     print("PC Diagnostic - Setup")
     
-    # gotta be windows
-    if not sys.platform.startswith('win'):
-        print("Sorry, windows only!")
-        return False
+    # windows or linux both fine now, diagnostats/backends.py handles the differences
+    print(f"Platform: {sys.platform}")
     
     # python ok?
     if sys.version_info[0] < 3 or (sys.version_info[0] == 3 and sys.version_info[1] < 6):
@@ -18,19 +17,16 @@ def setup():
         print("You have:", sys.version)
         return False
     
-    # check for modules we need
+    # check for modules we need - find_spec just looks, it doesn't import
+    # anything, so this costs next to nothing
     needed = ['psutil', 'tkinter']
     
     print("\nChecking modules...")
     missing = []
     for mod in needed:
-        try:
-            if mod == 'tkinter':
-                import tkinter  # tkinter is special
-            else:
-                __import__(mod)
+        if find_spec(mod) is not None:
             print(f"  + {mod}")
-        except:
+        else:
             print(f"  - {mod} (missing)")
             missing.append(mod)
     
@@ -67,28 +63,12 @@ if __name__ == "__main__":
         
         # try to run the main thing
         try:
-            # look for main file
-            main_file = os.path.join(cur_dir, 'pc_check.py')
+            main_file = os.path.join(cur_dir, 'diagnostic_tool.py')
             if os.path.exists(main_file):
-                print(f"Found {main_file}")
-                
-                # import it
-                import pc_check
-                
-                # check if it has what we need
-                if hasattr(pc_check, 'main'):
-                    pc_check.main()
-                else:
-                    print("Main file doesn't have main() function")
-                    input("Press enter...")
+                import diagnostic_tool
+                diagnostic_tool.run_app()
             else:
                 print(f"Can't find main file at {main_file}")
-
-                for f in os.listdir(cur_dir):
-                    if f.endswith('.py') and 'diag' in f.lower():
-                        print(f"Trying {f}...")
-                        break
-                
                 input("Press enter...")
                 
         except Exception as e:
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from diagnostats import backends, fakes, fleet
+
+
+def fake_machine():
+    return backends.FakeBackend(fakes.FakePsutil(procs=40, mounts=3, churn=0))
+
+
+class FleetLoopbackTest(unittest.TestCase):
+    """Several agents and an aggregator on this box, over loopback."""
+
+    AGENTS = 5
+
+    def run_fleet(self, addr_for, extra=None):
+        # addr_for(server) -> the address agents and queries use
+        async def main():
+            agg = fleet.Aggregator()
+            server = await agg.start(self.listen)
+            addr = addr_for(server)
+            try:
+                sent = await asyncio.gather(*(fleet.run_agent(addr, interval=0.01, count=2, host=f"agent{i}")
+                                              for i in range(self.AGENTS)))
+                if extra:
+                    await extra(addr)
+                hosts = await fleet.ask(addr, 'hosts')
+                top = await fleet.ask(addr, 'top_procs', n=10, key='rss')
+                over = await fleet.ask(addr, 'disks_over', percent=0)
+                # Let the aggregator see every client hang up before it stops
+                for _ in range(200):
+                    if not agg.connections:
+                        break
+                    await asyncio.sleep(0.01)
+            finally:
+                server.close()
+                await server.wait_closed()
+            return agg, sent, hosts, top, over
+
+        with backends.use(fake_machine()):
+            return fleet.run(main())
+
+    def check(self, agg, sent, hosts, top, over):
+        names = [f"agent{i}" for i in range(self.AGENTS)]
+        self.assertEqual(sent, [2] * self.AGENTS)
+        self.assertEqual(agg.received, 2 * self.AGENTS)
+        self.assertEqual([h['host'] for h in hosts], names)
+        self.assertEqual(len(top), 10)
+        rss = [p['rss'] for p in top]
+        self.assertEqual(rss, sorted(rss, reverse=True))
+        self.assertEqual({d['host'] for d in over}, set(names))
+
+    def test_tcp(self):
+        self.listen = '127.0.0.1:0'
+        self.check(*self.run_fleet(lambda server: f"127.0.0.1:{server.sockets[0].getsockname()[1]}"))
+
+    @unittest.skipUnless(hasattr(asyncio, 'start_unix_server'), "no unix sockets here")
+    def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as d:
+            self.listen = os.path.join(d, 'agg.sock')
+            self.check(*self.run_fleet(lambda server: self.listen))
+
+    def test_bad_messages_are_dropped(self):
+        async def misbehave(addr):
+            reader, writer = await fleet.connect(addr)
+            for msg in ({'type': 'snapshot', 'data': {}},
+                        {'type': 'snapshot', 'host': 'bad', 'data': 'nope'},
+                        ['not', 'a', 'dict'],
+                        {'type': 'snapshot', 'host': 'liar',
+                         'data': {'disks': [{'mount': '/', 'percent': 'full'}, 'junk'],
+                                  'procs': [{'pid': 1, 'name': 'x', 'rss': 'lots'}, 7,
+                                            {'pid': 2, 'name': 'y', 'rss': 10}]}}):
+                writer.write(fleet.encode(msg))
+            # Still connected: a query on the same connection gets answered
+            writer.write(fleet.encode({'type': 'query', 'q': 'stale', 'args': {'seconds': 0}}))
+            await writer.drain()
+            reply = await fleet.read_msg(reader)
+            writer.close()
+            self.assertTrue(reply['ok'])
+
+        self.listen = '127.0.0.1:0'
+        agg, sent, hosts, top, over = self.run_fleet(
+            lambda server: f"127.0.0.1:{server.sockets[0].getsockname()[1]}", misbehave)
+        self.assertEqual(agg.rejected, 3)
+        self.assertIn('liar', [h['host'] for h in hosts])
+        liar = agg.hosts['liar'].snapshot
+        self.assertEqual(liar['disks'], [])
+        self.assertEqual(liar['procs'], [{'pid': 2, 'name': 'y', 'rss': 10}])
+        self.assertNotIn('liar', {d['host'] for d in over})
+
+
+class TopProcsTest(unittest.TestCase):
+
+    def test_skips_rows_that_are_not_numbers(self):
+        agg = fleet.Aggregator()
+        agg.update('a', {'procs': [{'pid': 1, 'rss': 5}, {'pid': 2, 'rss': 'big'}, {'pid': 3}]})
+        agg.update('b', {'procs': [{'pid': 4, 'rss': 9}]})
+        self.assertEqual([p['pid'] for p in agg.q_top_procs(n=5)], [4, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
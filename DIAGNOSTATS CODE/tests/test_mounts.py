@@ -0,0 +1,52 @@
+import time
+import unittest
+
+from diagnostats import backends, collectors, fakes
+from diagnostats.mounts import MountProber
+
+
+class HungMountTest(unittest.TestCase):
+
+    def setUp(self):
+        # The first two mounts never answer disk_usage(), like a dead share
+        self.fake = fakes.FakePsutil(procs=1, mounts=5, hung=2)
+        self.using = backends.use(backends.FakeBackend(self.fake))
+        self.using.__enter__()
+
+    def tearDown(self):
+        self.fake._never.set()  # let the stuck calls go
+        self.using.__exit__(None, None, None)
+
+    def probe(self, prober):
+        start = time.monotonic()
+        disks = prober.probe(collectors.psutil.disk_partitions())
+        return disks, time.monotonic() - start
+
+    def test_deadline_gives_an_error_row(self):
+        prober = MountProber(timeout=0.3, slow_ttl=0)
+        disks, took = self.probe(prober)
+
+        self.assertLess(took, 2.0)
+        self.assertEqual([d.mount for d in disks], [f"/mnt/fake{i}" for i in range(5)])
+        for d in disks[:2]:
+            self.assertIsNone(d.percent)
+            self.assertTrue(d.error.startswith("no answer after"), d.error)
+        for d in disks[2:]:
+            self.assertIsNone(d.error)
+            self.assertIsNotNone(d.percent)
+
+        # Still stuck next time: not asked again, so no waiting at all
+        disks, took = self.probe(prober)
+        self.assertLess(took, 0.3)
+        self.assertEqual([d.error for d in disks[:2]], ["still not answering (last check hung)"] * 2)
+
+    def test_failed_mount_is_remembered(self):
+        prober = MountProber(timeout=0.3)
+        self.probe(prober)
+        disks, took = self.probe(prober)
+        self.assertLess(took, 0.3)
+        self.assertTrue(disks[0].error.startswith("no answer after"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from diagnostats import fakes
+from diagnostats.procs import DETAIL_EVERY, ProcessTable
+
+
+class PidReuseTest(unittest.TestCase):
+
+    def test_reused_pid_is_a_new_process(self):
+        fake = fakes.FakePsutil(procs=5, mounts=0, churn=0)
+        with fakes.installed(fake):
+            table = ProcessTable()
+            table.refresh()
+            table.refresh()
+            pid = min(fake._procs)
+            old = next(e for e in table.entries.values() if e.pid == pid)
+            self.assertIsNotNone(old.cpu)
+
+            # The process exits and its pid goes to a new one between looks
+            row = fake._procs[pid]
+            row.update(name='new.exe', create_time=row['create_time'] + 60, cpu_time=0.5)
+            table.refresh()
+
+            entries = [e for e in table.entries.values() if e.pid == pid]
+            self.assertEqual(len(entries), 1)
+            self.assertEqual(entries[0].name, 'new.exe')
+            self.assertEqual(entries[0].key, (pid, row['create_time']))
+            self.assertIsNone(entries[0].cpu)  # not measured against the old process's CPU time
+            self.assertEqual((table.added, table.removed), (1, 1))
+            self.assertEqual(len(table), 5)
+
+    def test_quiet_reuse_is_caught_within_a_detail_round(self):
+        fake = fakes.FakePsutil(procs=5, mounts=0, churn=0)
+        with fakes.installed(fake):
+            table = ProcessTable()
+            table.refresh()
+            pid = min(fake._procs)
+            # Nothing odd to see: more CPU time than before, same parent
+            row = fake._procs[pid]
+            row.update(name='new.exe', create_time=row['create_time'] + 60, cpu_time=row['cpu_time'] + 100)
+            for _ in range(DETAIL_EVERY):
+                table.refresh()
+            names = [e.name for e in table.entries.values() if e.pid == pid]
+            self.assertEqual(names, ['new.exe'])
+
+    def test_same_process_is_kept(self):
+        fake = fakes.FakePsutil(procs=5, mounts=0, churn=0)
+        with fakes.installed(fake):
+            table = ProcessTable()
+            table.refresh()
+            before = dict(table.entries)
+            table.refresh()
+            self.assertEqual(table.added, 0)
+            for key, e in table.entries.items():
+                self.assertIs(before[key], e)
+
+
+if __name__ == '__main__':
+    unittest.main()
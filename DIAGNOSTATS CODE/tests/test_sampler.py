@@ -0,0 +1,32 @@
+import random
+import unittest
+
+from diagnostats.sampler import Series
+
+
+class WindowTest(unittest.TestCase):
+
+    def check(self, s, seconds):
+        # Against working it out the slow way from the ring
+        since = s.latest_time() - seconds
+        vals = [v for _, v in s.items(since)]
+        got = s.window(seconds)
+        self.assertEqual((got['count'], got['min'], got['max']), (len(vals), min(vals), max(vals)))
+        self.assertAlmostEqual(got['mean'], sum(vals) / len(vals))
+
+    def test_kept_windows_match_the_ring(self):
+        rand = random.Random(1)
+        s = Series(50, windows=(3, 30, 1000))
+        t = 0.0
+        for _ in range(500):
+            t += rand.choice((0, 0.5, 1, 2, 7))  # ties and gaps too
+            s.push(t, rand.choice((1.0, 2.0, rand.uniform(-5, 100))))
+            for seconds in (3, 30, 1000, 10):  # 10 isn't kept, so it's worked out
+                self.check(s, seconds)
+
+    def test_empty(self):
+        self.assertIsNone(Series(10, windows=(60,)).window(60))
+
+
+if __name__ == '__main__':
+    unittest.main()
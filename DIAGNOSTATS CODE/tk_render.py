@@ -0,0 +1,296 @@
+# tk_render.py - cheaper ways to get text and tables on screen
+#
+# Rewriting a whole ScrolledText on every refresh gets slow fast (and loses
+# the scroll position), so:
+#   TextPane     only touches the lines that actually changed
+#   RenderQueue  squashes bursts of updates into one redraw per frame
+#   ProcessTree  a Treeview that only ever holds the rows you can see
+#   TrendChart   a line chart of (already downsampled) history
+
+import time
+from datetime import datetime
+from operator import attrgetter
+from tkinter import *
+from tkinter import ttk
+
+from diagnostats.formatting import proc_cell
+
+FRAME_MS = 33  # ~30 redraws a second at most
+
+
+class TextPane:
+    """Wraps a (read-only) Text widget and updates it line by line."""
+
+    # If this much of the text changed it's cheaper to just redo the lot
+    REWRITE_FRACTION = 0.6
+
+    def __init__(self, widget, text=''):
+        self.widget = widget
+        widget.config(state=NORMAL)
+        widget.delete(1.0, END)
+        widget.config(state=DISABLED)
+        self.lines = ['']  # an empty Text still has one (empty) line
+        self.set_text(text)
+
+    def set_text(self, text):
+        return self.set_lines(text.rstrip('\n').split('\n'))
+
+    def set_lines(self, new):
+        """Show new (a list of lines); returns how many lines were touched."""
+        old = self.lines
+        if new == old:
+            return 0
+
+        w = self.widget
+        common = min(len(old), len(new))
+        changed = [i for i in range(common) if old[i] != new[i]]
+        touched = len(changed) + abs(len(new) - len(old))
+
+        w.config(state=NORMAL)
+        if touched > len(new) * self.REWRITE_FRACTION:
+            w.delete(1.0, END)
+            w.insert(END, '\n'.join(new))
+        else:
+            for i in changed:
+                line = i + 1
+                w.delete(f"{line}.0", f"{line}.end")
+                w.insert(f"{line}.0", new[i])
+            if len(new) > common:
+                w.insert('end-1c', '\n' + '\n'.join(new[common:]))
+            elif len(old) > common:
+                w.delete(f"{common}.end", 'end-1c')
+        w.config(state=DISABLED)
+
+        self.lines = list(new)
+        return touched
+
+
+class RenderQueue:
+    """Coalesces UI updates so each key redraws at most once per frame.
+
+    schedule() can be called as often as you like; only the latest call for
+    each key survives until the next flush. Must be used from the Tk thread.
+    """
+
+    def __init__(self, widget, interval_ms=FRAME_MS):
+        self.widget = widget
+        self.interval_ms = interval_ms
+        self.pending = {}
+        self.frames = 0
+        self.coalesced = 0
+        self.last_frame_ms = 0.0
+        self._after = None
+        self._last_flush = 0.0
+
+    def schedule(self, key, fn, *args):
+        if key in self.pending:
+            self.coalesced += 1
+        self.pending[key] = (fn, args)
+
+        if self._after is None:
+            since = (time.perf_counter() - self._last_flush) * 1000
+            delay = max(0, int(self.interval_ms - since))
+            self._after = self.widget.after(delay, self.flush)
+
+    def flush(self):
+        if self._after is not None:
+            self.widget.after_cancel(self._after)
+            self._after = None
+
+        pending, self.pending = self.pending, {}
+        start = time.perf_counter()
+        for fn, args in pending.values():
+            fn(*args)
+        self._last_flush = time.perf_counter()
+        self.last_frame_ms = (self._last_flush - start) * 1000
+        self.frames += 1
+
+
+class ProcessTree:
+    """Virtualized process table.
+
+    The Treeview only ever has as many items as fit on screen; scrolling
+    moves a window over self.rows and rewrites the values of the items
+    already there. Cells that didn't change aren't touched at all, so a
+    few thousand rows refreshing every second stays cheap.
+    """
+
+    COLUMNS = (('pid', "PID", 60, E), ('name', "Name", 220, W),
+               ('mem', "Memory %", 70, E), ('cpu', "CPU %", 60, E), ('rss', "RSS", 80, E),
+               ('uss', "USS", 80, E), ('cpu_time', "CPU time", 75, E), ('threads', "Threads", 60, E),
+               ('handles', "Handles", 65, E), ('io_bps', "I/O", 85, E), ('ppid', "Parent", 60, E))
+
+    def __init__(self, parent, columns=None):
+        self.columns = columns or self.COLUMNS
+        self.frame = Frame(parent, bg='white')
+        self.tree = ttk.Treeview(self.frame, columns=[c[0] for c in self.columns],
+                                 show='headings', selectmode='browse')
+        for key, title, width, anchor in self.columns:
+            self.tree.heading(key, text=title, command=lambda k=key: self.sort_by(k))
+            self.tree.column(key, width=width, anchor=anchor, stretch=(key == 'name'))
+
+        self.scroll = Scrollbar(self.frame, orient=VERTICAL, command=self._on_scroll)
+        self.tree.pack(side=LEFT, fill=BOTH, expand=True)
+        self.scroll.pack(side=RIGHT, fill=Y)
+
+        self.rows = []       # everything, as tuples of display strings
+        self.sort_key = 'mem'
+        self.sort_desc = True
+        self.offset = 0
+        self.visible = 20
+        self._items = []     # Treeview item ids, one per visible slot
+        self._shown = []     # what each slot currently shows
+        self._raw = []       # rows as they came in, before sorting
+
+        self.tree.bind('<Configure>', self._on_resize)
+        for seq in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.tree.bind(seq, self._on_wheel)
+
+    def pack(self, **kw):
+        self.frame.pack(**kw)
+
+    def set_rows(self, rows):
+        """rows: list of records (e.g. records.Proc) with the column fields."""
+        self._raw = rows
+        self._sort()
+        self.offset = min(self.offset, max(0, len(self.rows) - self.visible))
+        self._redraw()
+
+    def set_message(self, msg):
+        self._raw = []
+        self.rows = [('', msg) + ('',) * (len(self.columns) - 2)]
+        self.offset = 0
+        self._redraw()
+
+    def sort_by(self, key):
+        if key == self.sort_key:
+            self.sort_desc = not self.sort_desc
+        else:
+            self.sort_key, self.sort_desc = key, key != 'name'
+        self._sort()
+        self._redraw()
+
+    def _sort(self):
+        key = self.sort_key
+        if key == 'name':
+            raw = sorted(self._raw, key=lambda r: (r.name or '').lower(), reverse=self.sort_desc)
+        else:
+            # Rows with nothing to sort on go at the bottom either way
+            have = [r for r in self._raw if getattr(r, key) is not None]
+            missing = [r for r in self._raw if getattr(r, key) is None]
+            raw = sorted(have, key=attrgetter(key), reverse=self.sort_desc) + missing
+        self.rows = [self._cells(r) for r in raw]
+
+    def _cells(self, r):
+        return tuple(proc_cell(key, getattr(r, key, None)) for key, _, _, _ in self.columns)
+
+    def _redraw(self):
+        # Grow/shrink the item pool to fit the window
+        while len(self._items) < self.visible:
+            self._items.append(self.tree.insert('', END, values=()))
+            self._shown.append(None)
+        while len(self._items) > self.visible:
+            self.tree.delete(self._items.pop())
+            self._shown.pop()
+
+        for slot, iid in enumerate(self._items):
+            i = self.offset + slot
+            values = self.rows[i] if i < len(self.rows) else ()
+            if self._shown[slot] != values:
+                self.tree.item(iid, values=values)
+                self._shown[slot] = values
+
+        total = max(len(self.rows), 1)
+        self.scroll.set(self.offset / total, min(1.0, (self.offset + self.visible) / total))
+
+    def _scroll_to(self, offset):
+        offset = max(0, min(int(offset), len(self.rows) - self.visible))
+        if offset != self.offset:
+            self.offset = offset
+            self._redraw()
+
+    def _on_scroll(self, *args):
+        if args[0] == 'moveto':
+            self._scroll_to(float(args[1]) * len(self.rows))
+        elif args[0] == 'scroll':
+            step = self.visible if args[2] == 'pages' else 1
+            self._scroll_to(self.offset + int(args[1]) * step)
+
+    def _on_wheel(self, event):
+        if event.num == 4 or getattr(event, 'delta', 0) > 0:
+            self._scroll_to(self.offset - 3)
+        else:
+            self._scroll_to(self.offset + 3)
+        return 'break'
+
+    def _on_resize(self, event):
+        try:
+            row_h = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        except (TclError, ValueError):
+            row_h = 20
+        visible = max(1, (event.height - 25) // row_h)  # minus the heading
+        if visible != self.visible:
+            self.visible = visible
+            self._scroll_to(self.offset)
+            self._redraw()
+
+
+class TrendChart:
+    """Mean line over a min/max band, for History.query() output.
+
+    Ask for about one point per pixel (see pixels()) and drawing stays
+    cheap however long the range is.
+    """
+
+    PAD = 40
+
+    def __init__(self, parent, height=260):
+        self.canvas = Canvas(parent, bg='white', height=height, highlightthickness=0)
+        self.points = []
+        self.title = ''
+        self.canvas.bind('<Configure>', lambda e: self._draw())
+
+    def pack(self, **kw):
+        self.canvas.pack(**kw)
+
+    def pixels(self):
+        return max(50, self.canvas.winfo_width() - 2 * self.PAD)
+
+    def set_points(self, points, title=''):
+        self.points = points
+        self.title = title
+        self._draw()
+
+    def _draw(self):
+        c = self.canvas
+        c.delete('all')
+        w, h, pad = c.winfo_width(), c.winfo_height(), self.PAD
+        c.create_text(pad, 12, text=self.title, anchor=W, font=('Segoe UI', 10, 'bold'))
+        if len(self.points) < 2:
+            c.create_text(w // 2, h // 2, text="Not enough history yet", fill='#888888')
+            return
+
+        t0, t1 = self.points[0][0], self.points[-1][0]
+        lo = min(p[2] for p in self.points)
+        hi = max(p[3] for p in self.points)
+        if hi == lo:
+            hi = lo + 1
+
+        def x(t):
+            return pad + (t - t0) * (w - 2 * pad) / ((t1 - t0) or 1)
+
+        def y(v):
+            return h - pad - (v - lo) * (h - 2 * pad) / (hi - lo)
+
+        band = [(x(p[0]), y(p[3])) for p in self.points] + [(x(p[0]), y(p[2])) for p in reversed(self.points)]
+        c.create_polygon(*[v for xy in band for v in xy], fill='#d6e2f5', outline='')
+        c.create_line(*[v for p in self.points for v in (x(p[0]), y(p[1]))], fill='#2a5caa', width=2)
+
+        c.create_rectangle(pad, pad, w - pad, h - pad, outline='#cccccc')
+        c.create_text(pad - 4, pad, text=f"{hi:.4g}", anchor=NE, font=('Consolas', 8))
+        c.create_text(pad - 4, h - pad, text=f"{lo:.4g}", anchor=SE, font=('Consolas', 8))
+        fmt = '%d %b %H:%M' if t1 - t0 > 86400 else '%H:%M'
+        c.create_text(pad, h - pad + 4, text=datetime.fromtimestamp(t0).strftime(fmt),
+                      anchor=NW, font=('Consolas', 8))
+        c.create_text(w - pad, h - pad + 4, text=datetime.fromtimestamp(t1).strftime(fmt),
+                      anchor=NE, font=('Consolas', 8))